@@ -0,0 +1,92 @@
+from sqlalchemy import delete, func, not_, select, update
+
+from models import db, Usuario
+import arquivo
+import autenticacao
+import busca_usuarios
+
+ACOES = ('activate', 'deactivate', 'toggle', 'delete')
+
+# Usuários por transação; exclusões levam junto todo o histórico, então usam lotes menores
+LOTE_ATUALIZACAO = 1000
+LOTE_EXCLUSAO = 100
+
+
+def _filtro_prefixo(termo, campo):
+    if not termo:
+        return ()
+    coluna = busca_usuarios.CAMPOS_BUSCA[campo]
+    return (busca_usuarios.filtro_prefixo(coluna, termo),)
+
+
+def _lotes_de_ids(ids, filtro, tamanho):
+    """Gera listas de ids: da seleção explícita ou, com `ids` None, de quem casa com o filtro."""
+    if ids is not None:
+        ids = sorted(set(ids))
+        for i in range(0, len(ids), tamanho):
+            yield ids[i:i + tamanho]
+        return
+
+    ultimo = 0
+    while True:
+        lote = db.session.execute(
+            select(Usuario.id).where(Usuario.id > ultimo, *filtro).order_by(Usuario.id).limit(tamanho)
+        ).scalars().all()
+        if not lote:
+            return
+        yield lote
+        ultimo = lote[-1]
+
+
+def _tabelas_dependentes():
+    """Tabelas com chave estrangeira para usuarios, das dependentes para as principais."""
+    return [
+        tabela for tabela in reversed(db.metadata.sorted_tables)
+        if any(fk.column.table is Usuario.__table__ for fk in tabela.foreign_keys)
+    ]
+
+
+def _aplicar(acao, lote):
+    if acao == 'delete':
+        for tabela in _tabelas_dependentes():
+            db.session.execute(delete(tabela).where(tabela.c.usuario_id.in_(lote)))
+        return db.session.execute(delete(Usuario.__table__).where(Usuario.id.in_(lote))).rowcount
+
+    novo = {'activate': True, 'deactivate': False, 'toggle': not_(Usuario.ativo)}[acao]
+    return db.session.execute(
+        update(Usuario).where(Usuario.id.in_(lote)).values(ativo=novo)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def executar(acao, ids=None, termo=None, campo='nome', progresso=None):
+    """Aplica `acao` aos usuários em `ids` ou, sem ids, a todos que casam com o prefixo.
+
+    Cada lote é um punhado de UPDATE/DELETE por conjunto de ids, em transação
+    própria, para nunca segurar bloqueios na tabela inteira. Exclusões
+    removem antes as linhas dependentes por `usuario_id`, sem carregar nada
+    no ORM, e depois o histórico arquivado (arquivo.expurgar). `progresso(feitos, total)` é chamado após cada commit.
+    Retorna a quantidade de usuários afetados.
+    """
+    if acao not in ACOES:
+        raise ValueError(f'Ação desconhecida: {acao}')
+    filtro = _filtro_prefixo(termo, campo)
+    if ids is not None:
+        total = len(set(ids))
+    else:
+        total = db.session.execute(select(func.count()).select_from(Usuario).where(*filtro)).scalar()
+
+    tamanho = LOTE_EXCLUSAO if acao == 'delete' else LOTE_ATUALIZACAO
+    processados = afetados = 0
+    for lote in _lotes_de_ids(ids, filtro, tamanho):
+        afetados += _aplicar(acao, lote)
+        db.session.commit()
+        if acao == 'delete':
+            # O histórico já arquivado não tem chave estrangeira: sai à parte, depois do commit
+            arquivo.expurgar(lote)
+        # Sessões de contas desativadas ou excluídas caem já neste worker (nos demais, pela validade do cache)
+        autenticacao.invalidar(lote)
+        processados += len(lote)
+        if progresso:
+            progresso(processados, total)
+    return afetados
@@ -0,0 +1,100 @@
+"""Agenda de alertas baseada no próximo disparo pré-calculado.
+
+Cada alerta guarda em `proximo_disparo` (UTC, indexado) o instante do seu
+próximo lembrete. "O que dispara nos próximos N minutos" vira uma única
+busca por faixa no índice, sem reinterpretar dias da semana a cada ciclo.
+"""
+import os
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import update
+
+from alertas import nova_versao
+from models import db, Alerta
+
+# Fuso em que os horários dos alertas são informados pelos usuários
+FUSO = ZoneInfo(os.getenv('ALERTAS_FUSO', 'America/Sao_Paulo'))
+
+# Um alerta vencido só é avançado depois desta folga, para que o cliente
+# que agendou o lembrete localmente ainda o dispare no horário.
+FOLGA = timedelta(minutes=1)
+
+
+def _para_utc(local):
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def calcular_proximo_disparo(alerta, apos):
+    """Próximo disparo estritamente depois de `apos` (UTC ingênuo), ou None."""
+    hora, minuto = (int(p) for p in alerta.alert_time.split(':'))
+    local = apos.replace(tzinfo=timezone.utc).astimezone(FUSO)
+
+    if alerta.dias_mask:
+        for delta in range(8):
+            dia = local.date() + timedelta(days=delta)
+            if not alerta.dias_mask & (1 << dia.weekday()):
+                continue
+            candidato = datetime.combine(dia, time(hora, minuto), FUSO)
+            if candidato > local:
+                return _para_utc(candidato)
+        return None
+
+    if alerta.alert_date:
+        candidato = datetime.combine(alerta.alert_date, time(hora, minuto), FUSO)
+        return _para_utc(candidato) if candidato > local else None
+    return None
+
+
+def reagendar(alerta, agora=None):
+    """Recalcula o próximo disparo após criar ou editar um alerta."""
+    alerta.proximo_disparo = calcular_proximo_disparo(alerta, agora or datetime.utcnow())
+
+
+def devidos(ate, usuario_id=None):
+    """Alertas com disparo até `ate` (UTC): uma busca por faixa no índice."""
+    consulta = Alerta.query.filter(Alerta.proximo_disparo <= ate)
+    if usuario_id is not None:
+        consulta = consulta.filter(Alerta.usuario_id == usuario_id)
+    return consulta.order_by(Alerta.proximo_disparo).all()
+
+
+def avancar(alertas, agora):
+    """Move cada alerta para o disparo seguinte e retorna os que este processo avançou.
+
+    A atualização é condicional ao valor lido, então dois workers processando
+    a mesma faixa nunca avançam (nem disparam) o mesmo alerta duas vezes.
+    """
+    avancados = []
+    for alerta in alertas:
+        anterior = alerta.proximo_disparo
+        proximo = calcular_proximo_disparo(alerta, max(agora, anterior))
+        resultado = db.session.execute(
+            update(Alerta)
+            .where(Alerta.id == alerta.id, Alerta.proximo_disparo == anterior)
+            .values(proximo_disparo=proximo)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount:
+            avancados.append((alerta, anterior))
+    if avancados:
+        # O `next_fire` enviado ao cliente mudou
+        nova_versao({alerta.usuario_id for alerta, _ in avancados})
+    db.session.commit()
+    return avancados
+
+
+def avancar_vencidos(agora=None, usuario_id=None):
+    """Avança alertas cujo disparo já passou há mais que FOLGA."""
+    agora = agora or datetime.utcnow()
+    vencidos = devidos(agora - FOLGA, usuario_id)
+    return avancar(vencidos, agora) if vencidos else []
+
+
+def recalcular_todos(agora=None):
+    """Recompila o próximo disparo de todos os alertas (ex.: após mudar o fuso)."""
+    agora = agora or datetime.utcnow()
+    for alerta in Alerta.query.yield_per(1000):
+        reagendar(alerta, agora)
+    nova_versao()
+    db.session.commit()
@@ -0,0 +1,73 @@
+from sqlalchemy import func, select, update
+
+import serializacao
+from models import db, Alerta, Usuario
+
+# Intervalos do fluxo SSE de alertas (segundos)
+INTERVALO_VERIFICACAO = 5
+INTERVALO_KEEPALIVE = 15
+# O fluxo é encerrado periodicamente para liberar a thread; o EventSource
+# reconecta sozinho após RETRY_MS enviando o Last-Event-ID recebido.
+DURACAO_MAXIMA_FLUXO = 600
+RETRY_MS = 3000
+
+# Chamadas, neste processo, depois de gravar alertas de um usuário (ver asgi.VigiaDeAlertas)
+_ouvintes = []
+
+
+def consulta_versao(usuario_id):
+    """Contador de versão dos alertas do usuário (ver `versao_alertas`)."""
+    return select(Usuario.alertas_versao).where(Usuario.id == usuario_id)
+
+
+def consulta_proximo_disparo(usuario_id):
+    """Disparo mais próximo dos alertas de `usuario_id` (coluna correlacionável com `usuarios`)."""
+    return select(func.min(Alerta.proximo_disparo)).where(Alerta.usuario_id == usuario_id).scalar_subquery()
+
+
+def marca_versao(versao):
+    return str(versao or 0)
+
+
+def versao_alertas(usuario_id):
+    """Identificador barato da versão dos alertas do usuário (usado como ETag).
+
+    É `Usuario.alertas_versao`, que `nova_versao` incrementa na mesma
+    transação de toda gravação em alertas. Um contador muda mesmo com duas
+    edições no mesmo segundo, o que o maior `atualizado_em` não garante no
+    MySQL (DATETIME sem frações de segundo).
+    """
+    return marca_versao(db.session.execute(consulta_versao(usuario_id)).scalar())
+
+
+def nova_versao(usuario_ids=None):
+    """Incrementa a versão dos alertas de `usuario_ids` (todos, se None); sem commit."""
+    stmt = update(Usuario).values(alertas_versao=Usuario.alertas_versao + 1)
+    if usuario_ids is not None:
+        stmt = stmt.where(Usuario.id.in_(list(usuario_ids)))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def alertas_do_usuario(usuario_id):
+    return Alerta.query.filter_by(usuario_id=usuario_id).order_by(Alerta.alert_time, Alerta.id).all()
+
+
+def evento_sse(evento, dados, id=None):
+    """Formata um evento no padrão text/event-stream (datas e Decimal como em serializacao)."""
+    linhas = []
+    if id is not None:
+        linhas.append(f'id: {id}')
+    linhas.append(f'event: {evento}')
+    linhas.append(f'data: {serializacao.dumps_json(dados).decode()}')
+    return '\n'.join(linhas) + '\n\n'
+
+
+def ouvir(funcao):
+    """Registra `funcao(usuario_id)` para ser chamada a cada `notificar`."""
+    _ouvintes.append(funcao)
+
+
+def notificar(usuario_id):
+    """Avisa, neste worker, que os alertas do usuário mudaram (chamar depois do commit)."""
+    for funcao in _ouvintes:
+        funcao(usuario_id)
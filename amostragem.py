@@ -0,0 +1,102 @@
+"""Redução de séries longas de glicemia para os gráficos (LTTB).
+
+O gráfico recebe no máximo `pontos` leituras escolhidas pelo algoritmo
+Largest-Triangle-Three-Buckets, que preserva picos e vales melhor do que
+médias por intervalo. As séries reduzidas ficam num cache LRU por worker,
+identificadas pela janela, pelo orçamento de pontos e por uma versão
+barata dos dados da janela (quantidade e maior id).
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, select
+
+from models import db, Medicao
+
+# Janela (em dias) do gráfico de tendência do dashboard e orçamento padrão de pontos
+DIAS_TENDENCIA = 90
+PONTOS_PADRAO = 300
+PONTOS_MAXIMO = 2000
+
+TAMANHO_CACHE = 256
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def lttb(x, y, limite):
+    """Índices dos `limite` pontos escolhidos pelo LTTB (x crescente)."""
+    import numpy as np
+
+    n = len(x)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bordas dos baldes intermediários; o primeiro e o último ponto são sempre mantidos
+    bordas = np.floor(np.linspace(1, n - 1, limite - 1)).astype(int)
+    escolhidos = np.empty(limite, dtype=int)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+
+    a = 0
+    for i in range(limite - 2):
+        inicio, fim = bordas[i], bordas[i + 1]
+        prox_inicio = fim
+        prox_fim = bordas[i + 2] if i + 2 < len(bordas) else n
+        cx = x[prox_inicio:prox_fim].mean()
+        cy = y[prox_inicio:prox_fim].mean()
+        # Área (dobrada) do triângulo formado com o ponto anterior e a média do próximo balde
+        areas = np.abs((x[a] - cx) * (y[inicio:fim] - y[a]) - (x[a] - x[inicio:fim]) * (cy - y[a]))
+        a = inicio + int(areas.argmax())
+        escolhidos[i + 1] = a
+    return escolhidos
+
+
+def _versao(usuario_id, inicio, fim):
+    return tuple(db.session.execute(
+        select(func.count(Medicao.id), func.max(Medicao.id))
+        .where(Medicao.usuario_id == usuario_id, Medicao.measured_at >= inicio, Medicao.measured_at < fim)
+    ).one())
+
+
+def _reduzir(usuario_id, inicio, fim, pontos):
+    import numpy as np
+
+    linhas = db.session.execute(
+        select(Medicao.measured_at, Medicao.glucose_level)
+        .where(Medicao.usuario_id == usuario_id, Medicao.measured_at >= inicio, Medicao.measured_at < fim)
+        .order_by(Medicao.measured_at, Medicao.id)
+    ).all()
+    if not linhas:
+        return {'labels': [], 'values': [], 'total': 0}
+
+    datas = [l.measured_at for l in linhas]
+    x = np.array(datas, dtype='datetime64[s]').astype(np.int64)
+    y = np.array([float(l.glucose_level) for l in linhas])
+    indices = lttb(x, y, pontos)
+    return {
+        'labels': [datas[i].strftime('%Y-%m-%d %H:%M') for i in indices],
+        'values': [round(float(y[i]), 1) for i in indices],
+        'total': len(linhas),
+    }
+
+
+def serie_glicemia(usuario_id, inicio, fim, pontos=PONTOS_PADRAO):
+    """Leituras de `inicio` a `fim` (datas, inclusive) reduzidas a no máximo `pontos`."""
+    pontos = max(3, min(pontos, PONTOS_MAXIMO))
+    de = datetime.combine(inicio, time.min)
+    ate = datetime.combine(fim + timedelta(days=1), time.min)
+    chave = (usuario_id, inicio, fim, pontos, _versao(usuario_id, de, ate))
+
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+
+    serie = _reduzir(usuario_id, de, ate, pontos)
+    with _cache_lock:
+        _cache[chave] = serie
+        while len(_cache) > TAMANHO_CACHE:
+            _cache.popitem(last=False)
+    return serie
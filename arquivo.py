@@ -0,0 +1,445 @@
+"""Arquivo frio do histórico: meses fechados saem do banco para arquivos Parquet.
+
+A tabela quente (registros_imc) guarda só os últimos ARQUIVO_MESES_QUENTES
+meses, o que a maioria das leituras usa, e cabe no cache do banco. O
+comando `flask --app app historico-arquivar` move cada mês anterior a isso
+para ARQUIVO_DIR/<tabela>/AAAA-MM.parquet (colunar, zstd), ordenado por
+(usuario_id, data, id) em row groups pequenos: o histórico de um usuário
+num mês é lido só dos row groups cujo intervalo de usuario_id o contém.
+
+No modo ASGI, com ARQUIVO_INTERVALO_HORAS > 0, cada worker agenda o mesmo
+arquivamento numa thread (Agendamento), fora do boot; uma trava de arquivo
+em ARQUIVO_DIR deixa um só processo arquivar por vez.
+
+Histórico paginado, NDJSON, último registro e exportação unem a tabela
+quente ao arquivo pela chave (data, id), então a API não muda. Leituras com
+data antiga que chegam depois (importações) ficam na tabela quente até o
+próximo arquivamento, que regrava o mês delas.
+
+Ordem que dispensa trava entre o arquivamento e as leituras: o job grava o
+arquivo do mês (os.replace) antes de apagar as linhas da tabela quente, e
+quem lê consulta a tabela quente antes de listar os arquivos. Uma linha
+pode então aparecer nos dois lugares, nunca em nenhum; a união descarta a
+repetida pela chave.
+
+Ler ou gravar o arquivo exige o pacote opcional `pyarrow`; sem meses
+arquivados, nada aqui toca o disco nem precisa dele.
+"""
+import fcntl
+import heapq
+import logging
+import os
+import threading
+from array import array
+from collections import namedtuple
+from datetime import datetime
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, islice
+
+from flask import current_app
+from sqlalchemy import DateTime, Integer, Numeric, delete, func, select
+
+import paginacao
+from models import db, RegistroIMC
+
+logger = logging.getLogger(__name__)
+
+# tabela -> (modelo, coluna de data que define o mês)
+ARQUIVAVEIS = {
+    'registros_imc': (RegistroIMC, RegistroIMC.data_registro),
+}
+
+# Row groups pequenos: cada um cobre poucos usuários, e a leitura de um usuário descarta o resto
+LINHAS_POR_ROW_GROUP = 10000
+IDS_POR_DELETE = 1000
+# Segundos entre o boot do worker e a primeira rodada agendada
+ESPERA_INICIAL = 60
+_SUFIXO = '.parquet'
+_FIM = object()
+
+
+class ParquetIndisponivel(RuntimeError):
+    """O pacote opcional pyarrow não está instalado."""
+
+
+class ArquivamentoEmAndamento(RuntimeError):
+    """Outro processo já está arquivando (trava em ARQUIVO_DIR)."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ParquetIndisponivel('Instale pyarrow para ler ou gravar o arquivo do histórico.')
+    return pa, pq
+
+
+def _pasta(tabela):
+    return os.path.join(current_app.config['ARQUIVO_DIR'], tabela)
+
+
+def _caminho(tabela, mes):
+    return os.path.join(_pasta(tabela), mes + _SUFIXO)
+
+
+def _mes(data):
+    return data.strftime('%Y-%m')
+
+
+def _inicio(mes):
+    return datetime.strptime(mes, '%Y-%m')
+
+
+def _mes_seguinte(data):
+    return datetime(data.year + data.month // 12, data.month % 12 + 1, 1)
+
+
+def corte(agora, meses_quentes):
+    """Início do mais antigo dos `meses_quentes` meses mantidos na tabela (o atual incluído)."""
+    indice = agora.year * 12 + agora.month - 1 - (meses_quentes - 1)
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+
+def meses(tabela):
+    """Meses ('AAAA-MM') já arquivados de `tabela`, em ordem."""
+    try:
+        nomes = os.listdir(_pasta(tabela))
+    except FileNotFoundError:
+        return []
+    return sorted(n[:-len(_SUFIXO)] for n in nomes if n.endswith(_SUFIXO))
+
+
+# -----------------------
+# LEITURA
+# -----------------------
+@lru_cache(maxsize=32)
+def _tipo_linha(nomes):
+    return namedtuple('LinhaArquivada', nomes)
+
+
+@lru_cache(maxsize=512)
+def _faixas_de_usuarios(caminho, versao):
+    """(menor, maior) usuario_id de cada row group do arquivo; `versao` invalida o cache ao regravar."""
+    _, pq = _pyarrow()
+    metadados = pq.ParquetFile(caminho).metadata
+    coluna = metadados.schema.names.index('usuario_id')
+    faixas = []
+    for i in range(metadados.num_row_groups):
+        estatisticas = metadados.row_group(i).column(coluna).statistics
+        faixas.append((estatisticas.min, estatisticas.max))
+    return tuple(faixas)
+
+
+def _ler_mes(tabela, mes, usuario_id, nomes):
+    """Linhas do usuário num mês arquivado, em ordem de (data, id)."""
+    _, pq = _pyarrow()
+    import pyarrow.compute as pc
+
+    caminho = _caminho(tabela, mes)
+    try:
+        estado = os.stat(caminho)
+        faixas = _faixas_de_usuarios(caminho, (estado.st_mtime_ns, estado.st_size))
+        grupos = [i for i, (menor, maior) in enumerate(faixas) if menor <= usuario_id <= maior]
+        if not grupos:
+            return []
+        dados = pq.ParquetFile(caminho).read_row_groups(grupos, columns=list(dict.fromkeys(nomes + ('usuario_id',))))
+    except FileNotFoundError:
+        return []
+    dados = dados.filter(pc.equal(dados['usuario_id'], usuario_id))
+    tipo = _tipo_linha(nomes)
+    return [tipo(*valores) for valores in zip(*(dados.column(n).to_pylist() for n in nomes))]
+
+
+def _chave(tabela):
+    data = ARQUIVAVEIS[tabela][1].key
+    return lambda linha: (getattr(linha, data), linha.id)
+
+
+def ler(tabela, usuario_id, colunas, apos=None, lista=None):
+    """Linhas arquivadas do usuário com as `colunas` dadas, em ordem de (data, id), após a chave `apos`."""
+    nomes = tuple(c.key for c in colunas)
+    chave = _chave(tabela)
+    for mes in meses(tabela) if lista is None else lista:
+        if apos is not None and _mes_seguinte(_inicio(mes)) <= apos[0]:
+            continue
+        for linha in _ler_mes(tabela, mes, usuario_id, nomes):
+            if apos is None or chave(linha) > tuple(apos):
+                yield linha
+
+
+def em_ordem(tabela, usuario_id, quentes, colunas, apos=None):
+    """As linhas `quentes` (já em ordem de (data, id)) unidas às arquivadas do usuário.
+
+    `colunas` são as colunas de cada linha quente e devem incluir a data e o
+    id; as arquivadas vêm como namedtuples com os mesmos nomes.
+    """
+    quentes = iter(quentes)
+    primeira = next(quentes, _FIM)
+    # Só depois de a consulta da tabela quente começar (ver a nota no início do módulo)
+    lista = meses(tabela)
+    if primeira is not _FIM:
+        quentes = chain([primeira], quentes)
+    if not lista:
+        yield from quentes
+        return
+
+    chave = _chave(tabela)
+    anterior = None
+    for linha in heapq.merge(quentes, ler(tabela, usuario_id, colunas, apos, lista), key=chave):
+        atual = chave(linha)
+        if atual != anterior:
+            yield linha
+        anterior = atual
+
+
+def completar_pagina(tabela, usuario_id, linhas, colunas, apos, limite):
+    """Resultado de paginacao.consulta_keyset unido ao arquivo, pronto para paginacao.fatiar_pagina."""
+    return list(islice(em_ordem(tabela, usuario_id, linhas, colunas, apos), limite + 1))
+
+
+def mais_recente(tabela, usuario_id, linha, colunas):
+    """A mais recente entre `linha` (a última da tabela quente, ou None) e as arquivadas do usuário."""
+    lista = meses(tabela)
+    if not lista:
+        return linha
+    chave = _chave(tabela)
+    if linha is not None and chave(linha)[0] >= _mes_seguinte(_inicio(lista[-1])):
+        return linha
+
+    nomes = tuple(c.key for c in colunas)
+    for mes in reversed(lista):
+        arquivadas = _ler_mes(tabela, mes, usuario_id, nomes)
+        if arquivadas:
+            return max([arquivadas[-1]] + ([linha] if linha is not None else []), key=chave)
+    return linha
+
+
+def datas_arquivadas(tabela, usuario_id, datas):
+    """Quais de `datas` já têm linha arquivada do usuário (deduplicação das importações)."""
+    lista = set(meses(tabela))
+    data = ARQUIVAVEIS[tabela][1].key
+    encontradas = set()
+    for mes in {_mes(d) for d in datas} & lista:
+        encontradas.update(getattr(l, data) for l in _ler_mes(tabela, mes, usuario_id, (data,)))
+    return encontradas & set(datas)
+
+
+# -----------------------
+# ARQUIVAMENTO
+# -----------------------
+def _esquema(pa, colunas):
+    tipos = []
+    for coluna in colunas:
+        if isinstance(coluna.type, Integer):
+            tipo = pa.int64()
+        elif isinstance(coluna.type, DateTime):
+            tipo = pa.timestamp('us')
+        elif isinstance(coluna.type, Numeric):
+            # Decimal como no banco: as linhas arquivadas voltam idênticas às da tabela
+            tipo = pa.decimal128(coluna.type.precision, coluna.type.scale)
+        else:
+            tipo = pa.string()
+        tipos.append((coluna.key, tipo))
+    return pa.schema(tipos)
+
+
+def _sincronizar(caminho):
+    descritor = os.open(caminho, os.O_RDONLY)
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
+
+
+class _MesEmGravacao:
+    """Arquivo temporário de um mês, escrito em row groups à medida que as linhas chegam."""
+
+    def __init__(self, pa, pq, esquema, caminho):
+        self.pa = pa
+        self.esquema = esquema
+        self.temporario = caminho + '.tmp'
+        self.escritor = pq.ParquetWriter(self.temporario, esquema, compression='zstd')
+        self.valores = [[] for _ in esquema.names]
+        self.ids = array('q')
+
+    def adicionar(self, linha):
+        for lista, valor in zip(self.valores, linha):
+            lista.append(valor)
+        self.ids.append(linha.id)
+        if len(self.valores[0]) >= LINHAS_POR_ROW_GROUP:
+            self.descarregar()
+
+    def descarregar(self):
+        if self.valores[0]:
+            self.escritor.write_table(self.pa.table(self.valores, schema=self.esquema),
+                                      row_group_size=LINHAS_POR_ROW_GROUP)
+            for lista in self.valores:
+                lista.clear()
+
+
+def _concluir(pq, gravacao, caminho, data):
+    """Fecha o temporário e o põe no lugar do mês, somado ao arquivo anterior se ele existir."""
+    gravacao.descarregar()
+    gravacao.escritor.close()
+    if os.path.exists(caminho):
+        # Linhas atrasadas de um mês já arquivado: o mês inteiro é regravado em ordem
+        juntas = gravacao.pa.concat_tables([pq.read_table(caminho), pq.read_table(gravacao.temporario)])
+        juntas = juntas.sort_by([('usuario_id', 'ascending'), (data, 'ascending'), ('id', 'ascending')])
+        pq.write_table(juntas, gravacao.temporario, compression='zstd', row_group_size=LINHAS_POR_ROW_GROUP)
+    _trocar(gravacao.temporario, caminho)
+
+
+def _trocar(temporario, caminho):
+    """Põe o temporário, já completo em disco, no lugar do arquivo do mês."""
+    _sincronizar(temporario)
+    os.replace(temporario, caminho)
+    _sincronizar(os.path.dirname(caminho))
+
+
+def arquivar(tabela, ate):
+    """Move para o arquivo as linhas de `tabela` com data anterior a `ate` e retorna {mes: linhas}.
+
+    Uma só passada pela tabela, em ordem de (usuario_id, data, id), alimenta
+    o arquivo de cada mês; as linhas só são apagadas (numa transação) depois
+    de todos os arquivos estarem no lugar.
+    """
+    pa, pq = _pyarrow()
+    modelo, coluna_data = ARQUIVAVEIS[tabela]
+    colunas = list(modelo.__table__.columns)
+    esquema = _esquema(pa, colunas)
+    posicao_data = [c.key for c in colunas].index(coluna_data.key)
+
+    # Sem AUTOINCREMENT o SQLite reaproveitaria o maior id apagado: a última linha nunca sai da tabela
+    maior_id = db.session.execute(select(func.max(modelo.id))).scalar()
+    if maior_id is None:
+        return {}
+    stmt = (select(*colunas)
+            .where(coluna_data < ate, modelo.id < maior_id)
+            .order_by(modelo.usuario_id, coluna_data, modelo.id))
+
+    os.makedirs(_pasta(tabela), exist_ok=True)
+    gravacoes = {}
+    for linha in paginacao.iterar_em_fluxo(stmt, lote=LINHAS_POR_ROW_GROUP):
+        mes = _mes(linha[posicao_data])
+        if mes not in gravacoes:
+            gravacoes[mes] = _MesEmGravacao(pa, pq, esquema, _caminho(tabela, mes))
+        gravacoes[mes].adicionar(linha)
+
+    for mes, gravacao in sorted(gravacoes.items()):
+        _concluir(pq, gravacao, _caminho(tabela, mes), coluna_data.key)
+    for gravacao in gravacoes.values():
+        for i in range(0, len(gravacao.ids), IDS_POR_DELETE):
+            db.session.execute(delete(modelo).where(modelo.id.in_(gravacao.ids[i:i + IDS_POR_DELETE].tolist())))
+    db.session.commit()
+    return {mes: len(g.ids) for mes, g in sorted(gravacoes.items())}
+
+
+
+def expurgar(usuario_ids):
+    """Apaga do arquivo as linhas de `usuario_ids` (usuários excluídos) e retorna quantas eram.
+
+    Sem isso, um id reaproveitado herdaria o histórico arquivado do usuário
+    excluído. Chamada depois do commit da exclusão e com a trava: um
+    arquivamento em curso termina antes, e o que ele gravou também sai.
+    """
+    listas = {tabela: meses(tabela) for tabela in ARQUIVAVEIS}
+    if not usuario_ids or not any(listas.values()):
+        return 0
+    pa, pq = _pyarrow()
+    import pyarrow.compute as pc
+
+    ids = sorted(set(usuario_ids))
+    removidas = 0
+    with _trava(esperar=True):
+        for tabela, lista in listas.items():
+            for mes in lista:
+                caminho = _caminho(tabela, mes)
+                estado = os.stat(caminho)
+                faixas = _faixas_de_usuarios(caminho, (estado.st_mtime_ns, estado.st_size))
+                if not any(menor <= u <= maior for menor, maior in faixas for u in ids):
+                    continue
+                dados = pq.read_table(caminho)
+                restantes = dados.filter(pc.invert(pc.is_in(dados['usuario_id'], value_set=pa.array(ids))))
+                if restantes.num_rows == dados.num_rows:
+                    continue
+                removidas += dados.num_rows - restantes.num_rows
+                if restantes.num_rows:
+                    pq.write_table(restantes, caminho + '.tmp', compression='zstd',
+                                   row_group_size=LINHAS_POR_ROW_GROUP)
+                    _trocar(caminho + '.tmp', caminho)
+                else:
+                    os.remove(caminho)
+                    _sincronizar(os.path.dirname(caminho))
+    return removidas
+
+
+# -----------------------
+# AGENDAMENTO
+# -----------------------
+@contextmanager
+def _trava(esperar=False):
+    """Trava exclusiva entre processos (workers e comando): quem regrava o arquivo, um por vez."""
+    pasta = current_app.config['ARQUIVO_DIR']
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, '.arquivar.lock'), 'w') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if esperar else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ArquivamentoEmAndamento('Outro arquivamento está em andamento.')
+        yield
+
+
+def arquivar_historico(meses_quentes, agora=None):
+    """Arquiva o que for anterior aos `meses_quentes` meses em cada tabela de ARQUIVAVEIS.
+
+    Retorna (corte, {tabela: {mes: linhas}}).
+    """
+    limite = corte(agora or datetime.utcnow(), meses_quentes)
+    with _trava():
+        return limite, {tabela: arquivar(tabela, limite) for tabela in ARQUIVAVEIS}
+
+
+class Agendamento:
+    """Roda arquivar_historico a cada `intervalo_horas` numa thread do worker."""
+
+    def __init__(self, app, intervalo_horas):
+        self.app = app
+        self.intervalo = intervalo_horas * 3600
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._laco, name='arquivamento', daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def parar(self):
+        # Uma rodada em curso termina sozinha: o arquivo do mês é trocado antes de apagar as linhas
+        self._parar.set()
+
+    def _laco(self):
+        espera = min(ESPERA_INICIAL, self.intervalo)
+        while not self._parar.wait(espera):
+            espera = self.intervalo
+            with self.app.app_context():
+                try:
+                    _, movidas = arquivar_historico(self.app.config['ARQUIVO_MESES_QUENTES'])
+                except ArquivamentoEmAndamento:
+                    continue
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Falha no arquivamento agendado do histórico')
+                    continue
+            for tabela, por_mes in movidas.items():
+                if por_mes:
+                    logger.info('%s: %d linha(s) arquivadas em %d mês(es)',
+                                tabela, sum(por_mes.values()), len(por_mes))
+
+
+def agendar(app):
+    """Agenda o arquivamento do app se ARQUIVO_INTERVALO_HORAS > 0; retorna o Agendamento ou None."""
+    intervalo = app.config.get('ARQUIVO_INTERVALO_HORAS', 0)
+    if intervalo <= 0:
+        return None
+    return Agendamento(app, intervalo).iniciar()
@@ -0,0 +1,555 @@
+"""Modo ASGI: rotas de leitura e fluxos no laço de eventos, com driver de banco assíncrono.
+
+Com workers síncronos, cada fluxo SSE aberto ou consulta lenta prende uma
+thread do gunicorn. Neste modo as rotas de JSON e de fluxo mais acessadas
+(GET /alerts/data, /alerts/stream, /imc/<id>, /imc/<id>/ultimo,
+/metas/<id> e /exportar/<tipo> em CSV) rodam no asyncio com um engine
+assíncrono (aiosqlite ou aiomysql, ver banco.url_assincrona). Um cliente
+parado custa um socket e um pouco de memória, não uma thread, e a conexão
+do banco só sai do pool durante as consultas: milhares de fluxos abertos
+cabem num worker pequeno. Os fluxos SSE não consultam o banco cada um: a
+VigiaDeAlertas faz uma consulta agrupada por worker a cada
+INTERVALO_VERIFICACAO e acorda só os fluxos cujos alertas mudaram (na
+hora, se a gravação foi neste worker).
+
+Todas as outras rotas (e a exportação em Parquet ou os fluxos que passam
+por meses arquivados, que são CPU) seguem para as views Flask de sempre,
+atendidas por ASGI_WSGI_THREADS threads via a2wsgi.
+As respostas das rotas assíncronas são as das views Flask correspondentes:
+mesmas consultas (paginacao, alertas, exportacao e serializacao são
+compartilhados), mesmos cabeçalhos, a mesma sessão (cookie assinado do
+Flask, conferido pelo cache de autenticacao.py) e as mesmas métricas.
+
+Uso:
+    uvicorn --factory asgi:criar_app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+from werkzeug.sansio.request import Request
+from werkzeug.sansio.response import Response
+
+import agenda
+import alertas
+import arquivo
+import autenticacao
+import banco
+import escrita_agrupada
+import exportacao
+import metricas
+import paginacao
+import serializacao
+from app import ALERT_TYPE_LABELS, create_app
+from models import Alerta, Meta, RegistroIMC, Usuario
+
+logger = logging.getLogger(__name__)
+
+# Usuários por consulta da vigia dos fluxos SSE
+USUARIOS_POR_VERIFICACAO = 1000
+
+# Linhas lidas do cursor do servidor por pedaço enviado no NDJSON do histórico
+LINHAS_POR_ENVIO = 1000
+
+
+def _criar_engine(url, opcoes, app):
+    url = banco.url_assincrona(url)
+    opcoes = dict(opcoes)
+    if url.get_backend_name() == 'sqlite':
+        # O journal_mode=WAL já fica gravado no arquivo; o busy_timeout é por conexão
+        opcoes['connect_args'] = {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+    return create_async_engine(url, **opcoes)
+
+
+class AppAsgi:
+    """Aplicação ASGI que atende algumas rotas em asyncio e repassa o resto ao app Flask."""
+
+    def __init__(self, flask_app):
+        self.flask = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+        self.engine = _criar_engine(flask_app.config['SQLALCHEMY_DATABASE_URI'],
+                                    flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'], flask_app)
+        # Leituras das rotas somente-leitura vão para a réplica, se houver (como banco.SessaoRoteada)
+        replica = flask_app.config.get('SQLALCHEMY_BINDS', {}).get('replica')
+        self.engine_leitura = self.engine
+        if replica:
+            opcoes = {k: v for k, v in replica.items() if k != 'url'}
+            self.engine_leitura = _criar_engine(replica['url'], opcoes, flask_app)
+        self.limite_lento = flask_app.config.get('SLOW_REQUEST_MS', 0)
+        self.agendamento = None
+        self.vigia = VigiaDeAlertas(self)
+        alertas.ouvir(self.vigia.avisar)
+        self.rotas = Map([
+            Rule('/alerts/data', endpoint=self.alertas_dados, methods=['GET']),
+            Rule('/alerts/stream', endpoint=self.alertas_fluxo, methods=['GET']),
+            Rule('/metas/<int:usuario_id>', endpoint=self.metas, methods=['GET']),
+            Rule('/imc/<int:usuario_id>', endpoint=self.registros_imc, methods=['GET']),
+            Rule('/imc/<int:usuario_id>/ultimo', endpoint=self.ultimo_imc, methods=['GET']),
+            Rule('/exportar/<tipo>', endpoint=self.exportar, methods=['GET']),
+        ])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._ciclo_de_vida(receive, send)
+        if scope['type'] != 'http':
+            return await self.wsgi(scope, receive, send)
+
+        adaptador = self.rotas.bind('', script_name=scope.get('root_path') or '/')
+        try:
+            regra, argumentos = adaptador.match(scope['path'], method=scope['method'], return_rule=True)
+        except HTTPException:
+            # 404, 405 e redirecionamentos de barra ficam com o Flask, como qualquer outra rota
+            return await self.wsgi(scope, receive, send)
+
+        req = Request(
+            scope['method'], scope.get('scheme', 'http'), scope.get('server'), scope.get('root_path', ''),
+            scope['path'], scope['query_string'],
+            Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']]),
+            (scope.get('client') or (None,))[0],
+        )
+        medicao = metricas.iniciar()
+        try:
+            resultado = await regra.endpoint(req, medicao, **argumentos)
+        except Exception:
+            # Como no Flask: o erro vai para o log e o 500 entra nas métricas
+            self.flask.logger.exception('Exception on %s [%s]', req.path, req.method)
+            resultado = _dados({'erro': 'Erro interno do servidor.'}, 500)
+        if resultado is None:
+            return await self.wsgi(scope, receive, send)
+
+        resposta, corpo = resultado
+        # Como no Flask, onde o gancho de autenticacao lê a sessão em toda requisição
+        resposta.vary.add('Cookie')
+        metricas.finalizar(medicao, regra.rule, req.method, resposta.status_code, req.full_path,
+                           self.limite_lento)
+        if callable(corpo):
+            await self._transmitir(receive, send, resposta, corpo)
+        else:
+            resposta.content_length = len(corpo)
+            await send({'type': 'http.response.start', 'status': resposta.status_code,
+                        'headers': _cabecalhos(resposta)})
+            await send({'type': 'http.response.body', 'body': corpo})
+
+    async def _transmitir(self, receive, send, resposta, gerador):
+        """Envia os pedaços de `gerador(desconectado)` e para assim que o cliente desconecta."""
+        desconectado = asyncio.Event()
+
+        async def vigiar():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            desconectado.set()
+
+        vigia = asyncio.create_task(vigiar())
+        partes = gerador(desconectado)
+        try:
+            await send({'type': 'http.response.start', 'status': resposta.status_code,
+                        'headers': _cabecalhos(resposta)})
+            async for parte in partes:
+                if desconectado.is_set():
+                    break
+                if parte:
+                    await send({'type': 'http.response.body', 'body': parte, 'more_body': True})
+            else:
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            vigia.cancel()
+            await partes.aclose()
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                self.agendamento = arquivo.agendar(self.flask)
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                await self.encerrar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def encerrar(self):
+        self.vigia.encerrar()
+        if self.agendamento is not None:
+            self.agendamento.parar()
+        # Grava o que ainda estiver na fila de escrita agrupada (o worker_exit do gunicorn não roda aqui)
+        await asyncio.to_thread(escrita_agrupada.drenar_todas)
+        await self.engine.dispose()
+        if self.engine_leitura is not self.engine:
+            await self.engine_leitura.dispose()
+
+    # -----------------------
+    # BANCO E SESSÃO
+    # -----------------------
+    @asynccontextmanager
+    async def _conexao(self, engine, medicao):
+        """Conexão do pool; as consultas entram nas `medicao` da requisição (se dadas)."""
+        async with engine.connect() as conn:
+            if medicao is not None:
+                conn.info['metricas'] = medicao
+            try:
+                yield conn
+            finally:
+                conn.info.pop('metricas', None)
+
+    def _sessao(self, req):
+        nome = self.flask.config['SESSION_COOKIE_NAME']
+        serializador = self.flask.session_interface.get_signing_serializer(self.flask)
+        if nome not in req.cookies or serializador is None:
+            return {}
+        try:
+            return serializador.loads(req.cookies[nome],
+                                      max_age=int(self.flask.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+
+    async def _sessao_valida(self, req, medicao):
+        """A sessão Flask da requisição, ou {} se ela não vale mais (regra de autenticacao.init_app).
+
+        O cookie não é limpo aqui: a próxima requisição atendida pelo Flask faz isso.
+        """
+        sessao = self._sessao(req)
+        usuario_id = sessao.get('user_id')
+        if usuario_id is None:
+            return sessao
+        estado = autenticacao.estado_em_cache(usuario_id)
+        if estado is autenticacao.AUSENTE:
+            async with self._conexao(self.engine, medicao) as conn:
+                linha = (await conn.execute(autenticacao.consulta_estado(usuario_id))).first()
+            estado = autenticacao.guardar_estado(usuario_id, linha)
+        return sessao if autenticacao.sessao_valida(sessao, estado) else {}
+
+    def _no_app(self, funcao, *args):
+        with self.flask.app_context():
+            return funcao(*args)
+
+    async def _tem_arquivo(self, tabela):
+        """Se `tabela` tem meses arquivados (arquivo.py), cuja leitura é Parquet: CPU e disco.
+
+        Completar uma página roda numa thread; fluxos inteiros ficam com as views Flask.
+        A listagem da pasta também vai para uma thread (disco lento não trava o laço) e
+        não é guardada: outro worker ou o comando pode ter arquivado um mês há pouco.
+        """
+        if tabela not in arquivo.ARQUIVAVEIS:
+            return False
+        return bool(await asyncio.to_thread(self._no_app, arquivo.meses, tabela))
+
+    # -----------------------
+    # ROTAS DE ALERTAS
+    # -----------------------
+    def _avancar_vencidos(self, usuario_id, agora):
+        with self.flask.app_context():
+            agenda.avancar_vencidos(agora, usuario_id=usuario_id)
+
+    async def _versao_alertas(self, engine, medicao, usuario_id):
+        """alertas.versao_alertas numa só consulta, que também diz se há alerta vencido.
+
+        Só quando há (raro) o avanço de agenda.py roda numa thread, como na view Flask.
+        """
+        consulta = alertas.consulta_versao(usuario_id).add_columns(alertas.consulta_proximo_disparo(usuario_id))
+        async with self._conexao(engine, medicao) as conn:
+            versao, proximo = (await conn.execute(consulta)).first() or (0, None)
+        agora = datetime.utcnow()
+        if proximo is not None and proximo <= agora - agenda.FOLGA:
+            await asyncio.to_thread(self._avancar_vencidos, usuario_id, agora)
+            async with self._conexao(engine, medicao) as conn:
+                versao, _ = (await conn.execute(consulta)).first() or (0, None)
+        return alertas.marca_versao(versao)
+
+    async def _alertas_do_usuario(self, medicao, usuario_id):
+        async with self._conexao(self.engine, medicao) as conn:
+            linhas = (await conn.execute(
+                select(*serializacao.COLUNAS_ALERTA)
+                .where(Alerta.usuario_id == usuario_id)
+                .order_by(Alerta.alert_time, Alerta.id)
+            )).all()
+        return {'alerts': [serializacao.alerta(l, ALERT_TYPE_LABELS) for l in linhas]}
+
+    async def alertas_dados(self, req, medicao):
+        """Mesma resposta de app.alerts_data (ETag, 304 e MessagePack)."""
+        sessao = await self._sessao_valida(req, medicao)
+        if 'user_id' not in sessao:
+            return _dados({'alerts': []}, 401)
+
+        usuario_id = sessao['user_id']
+        formato = serializacao.formato_preferido(req.accept_mimetypes)
+        etag = await self._versao_alertas(self.engine, medicao, usuario_id)
+        if formato != serializacao.JSON:
+            etag += '-msgpack'
+        if req.if_none_match.contains(etag):
+            resposta, corpo = Response(status=304), b''
+            del resposta.headers['Content-Type']
+            resposta.vary.add('Accept')
+        else:
+            resposta, corpo = _dados(await self._alertas_do_usuario(medicao, usuario_id), formato=formato)
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        return resposta, corpo
+
+    async def alertas_fluxo(self, req, medicao):
+        """Mesmo fluxo SSE de app.alerts_stream, sem prender thread nem conexão enquanto espera."""
+        sessao = await self._sessao_valida(req, medicao)
+        if 'user_id' not in sessao:
+            return _dados({'alerts': []}, 401)
+
+        usuario_id = sessao['user_id']
+        versao_cliente = req.headers.get('Last-Event-ID')
+
+        async def gerar(desconectado):
+            versao = versao_cliente
+            inicio = ultimo_envio = time.monotonic()
+            sinal = self.vigia.inscrever(usuario_id)
+            try:
+                yield f'retry: {alertas.RETRY_MS}\n\n'.encode()
+                verificar = True
+                while time.monotonic() - inicio < alertas.DURACAO_MAXIMA_FLUXO:
+                    if verificar:
+                        # Limpo antes da consulta: um aviso que chegue durante ela não se perde
+                        sinal.clear()
+                        atual = await self._versao_alertas(self.engine, None, usuario_id)
+                        self.vigia.conhecer(usuario_id, atual)
+                        if atual != versao:
+                            versao = atual
+                            dados = await self._alertas_do_usuario(None, usuario_id)
+                            yield alertas.evento_sse('alerts', dados, id=versao).encode()
+                            ultimo_envio = time.monotonic()
+                    if time.monotonic() - ultimo_envio >= alertas.INTERVALO_KEEPALIVE:
+                        yield b': keepalive\n\n'
+                        ultimo_envio = time.monotonic()
+                    agora = time.monotonic()
+                    espera = min(alertas.INTERVALO_KEEPALIVE - (agora - ultimo_envio),
+                                 alertas.DURACAO_MAXIMA_FLUXO - (agora - inicio))
+                    verificar = await _esperar(sinal, desconectado, espera)
+                    if desconectado.is_set():
+                        return
+            finally:
+                self.vigia.cancelar(usuario_id, sinal)
+
+        resposta = Response(mimetype='text/event-stream')
+        resposta.headers['Cache-Control'] = 'no-cache'
+        resposta.headers['X-Accel-Buffering'] = 'no'
+        return resposta, gerar
+
+    # -----------------------
+    # ROTAS DE METAS E IMC
+    # -----------------------
+    async def metas(self, req, medicao, usuario_id):
+        async with self._conexao(self.engine_leitura, medicao) as conn:
+            linhas = (await conn.execute(
+                select(*serializacao.COLUNAS_META)
+                .where(Meta.usuario_id == usuario_id)
+                .order_by(Meta.data_meta, Meta.id)
+            )).all()
+        return _dados([serializacao.meta(m) for m in linhas],
+                      formato=serializacao.formato_preferido(req.accept_mimetypes))
+
+    async def ultimo_imc(self, req, medicao, usuario_id):
+        async with self._conexao(self.engine_leitura, medicao) as conn:
+            registro = (await conn.execute(
+                select(*serializacao.COLUNAS_REGISTRO_IMC)
+                .where(RegistroIMC.id == RegistroIMC.ultimo_id(usuario_id))
+            )).first()
+        if await self._tem_arquivo('registros_imc'):
+            registro = await asyncio.to_thread(self._no_app, arquivo.mais_recente, 'registros_imc', usuario_id,
+                                               registro, serializacao.COLUNAS_REGISTRO_IMC)
+        if registro is None:
+            return _dados({'erro': 'Nenhum registro de IMC encontrado.'}, 404)
+        return _dados(serializacao.registro_imc(registro),
+                      formato=serializacao.formato_preferido(req.accept_mimetypes))
+
+    async def registros_imc(self, req, medicao, usuario_id):
+        """Mesma paginação por cursor e mesmo NDJSON de app.listar_registros_imc."""
+        stmt = select(*serializacao.COLUNAS_REGISTRO_IMC).where(RegistroIMC.usuario_id == usuario_id)
+        chave = (RegistroIMC.data_registro, RegistroIMC.id)
+
+        if req.args.get('format') == 'ndjson' or req.accept_mimetypes.best == 'application/x-ndjson':
+            if await self._tem_arquivo('registros_imc'):
+                return None
+
+            async def gerar(desconectado):
+                async with self._conexao(self.engine_leitura, None) as conn:
+                    resultado = await conn.stream(
+                        stmt.order_by(*chave).execution_options(yield_per=LINHAS_POR_ENVIO))
+                    async for bloco in resultado.partitions():
+                        yield b''.join(serializacao.dumps_json(serializacao.registro_imc(r)) + b'\n'
+                                       for r in bloco)
+            return Response(mimetype='application/x-ndjson'), gerar
+
+        apos = None
+        if req.args.get('cursor'):
+            try:
+                apos = paginacao.decodificar_cursor(req.args['cursor'], datetime, int)
+            except paginacao.CursorInvalido:
+                return _dados({'erro': 'Cursor inválido.'}, 400)
+        limite = paginacao.ler_limite(req.args.get('limit'))
+
+        async with self._conexao(self.engine_leitura, medicao) as conn:
+            linhas = (await conn.execute(paginacao.consulta_keyset(stmt, chave, apos, limite))).all()
+        if await self._tem_arquivo('registros_imc'):
+            linhas = await asyncio.to_thread(self._no_app, arquivo.completar_pagina, 'registros_imc', usuario_id,
+                                             linhas, serializacao.COLUNAS_REGISTRO_IMC, apos, limite)
+        registros, proxima = paginacao.fatiar_pagina(linhas, chave, limite)
+        resposta, corpo = _dados([serializacao.registro_imc(r) for r in registros],
+                                 formato=serializacao.formato_preferido(req.accept_mimetypes))
+        if proxima is not None:
+            cursor = paginacao.codificar_cursor(*proxima)
+            resposta.headers['X-Next-Cursor'] = cursor
+            adaptador = self.rotas.bind('', script_name=req.root_path or '/')
+            resposta.headers['Link'] = '<{}>; rel="next"'.format(adaptador.build(
+                self.registros_imc, {'usuario_id': usuario_id, 'cursor': cursor, 'limit': limite}))
+        return resposta, corpo
+
+    # -----------------------
+    # EXPORTAÇÃO DO HISTÓRICO
+    # -----------------------
+    async def exportar(self, req, medicao, tipo):
+        """CSV de app.exportar_historico em fluxo; Parquet, formatos inválidos e tabelas com
+        meses arquivados ficam com o Flask.
+        """
+        if req.args.get('formato', 'csv') != 'csv':
+            return None
+
+        sessao = await self._sessao_valida(req, medicao)
+        if sessao.get('is_admin'):
+            usuario_id = req.args.get('usuario_id', type=int)
+        else:
+            usuario_id = sessao.get('user_id')
+        if usuario_id is None:
+            return _dados({'erro': 'Faça login para exportar.'}, 403)
+        if tipo not in exportacao.FONTES:
+            return _dados({'erro': 'Tipo de exportação inválido.'}, 404)
+        if await self._tem_arquivo(exportacao.FONTES[tipo][2][0].class_.__tablename__):
+            return None
+
+        async def gerar(desconectado):
+            yield exportacao.cabecalho_csv(tipo).encode()
+            async with self._conexao(self.engine_leitura, None) as conn:
+                resultado = await conn.stream(exportacao.consulta(tipo, usuario_id).execution_options(
+                    yield_per=exportacao.LINHAS_POR_BLOCO_CSV))
+                async for bloco in resultado.partitions():
+                    yield exportacao.linhas_csv(bloco).encode()
+
+        resposta = Response(mimetype='text/csv')
+        resposta.headers['Content-Disposition'] = f'attachment; filename="cuidabem_{tipo}_{usuario_id}.csv"'
+        return resposta, gerar
+
+
+class VigiaDeAlertas:
+    """Verifica os alertas de todos os fluxos SSE abertos no worker numa só consulta.
+
+    A cada INTERVALO_VERIFICACAO, uma só consulta (por lote de
+    USUARIOS_POR_VERIFICACAO usuários) traz a versão de cada usuário com
+    fluxo aberto; só os fluxos cuja versão mudou, ou que têm alerta vencido
+    a avançar, são acordados e consultam a lista. Gravações feitas neste
+    worker acordam os fluxos na hora (alertas.notificar); as dos outros
+    workers chegam na próxima verificação.
+    """
+
+    def __init__(self, app_asgi):
+        self.app = app_asgi
+        self.sinais = {}
+        self.versoes = {}
+        self._laco_tarefa = None
+        self._loop = None
+
+    def inscrever(self, usuario_id):
+        """Registra um fluxo do usuário; o asyncio.Event devolvido é ligado quando há o que ver."""
+        if self._laco_tarefa is None:
+            self._loop = asyncio.get_running_loop()
+            self._laco_tarefa = asyncio.create_task(self._laco())
+        sinal = asyncio.Event()
+        self.sinais.setdefault(usuario_id, set()).add(sinal)
+        return sinal
+
+    def cancelar(self, usuario_id, sinal):
+        sinais = self.sinais.get(usuario_id)
+        if sinais is not None:
+            sinais.discard(sinal)
+            if not sinais:
+                del self.sinais[usuario_id]
+                self.versoes.pop(usuario_id, None)
+
+    def conhecer(self, usuario_id, versao):
+        """Versão que um fluxo acabou de ler: a vigia só acorda quando ela mudar."""
+        if usuario_id in self.sinais:
+            self.versoes[usuario_id] = versao
+
+    def acordar(self, usuario_id):
+        for sinal in self.sinais.get(usuario_id, ()):
+            sinal.set()
+
+    def avisar(self, usuario_id):
+        """Ouvinte de alertas.notificar: chamado nas threads das views Flask."""
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self.acordar, usuario_id)
+            except RuntimeError:
+                # Laço já encerrado (desligamento do worker)
+                pass
+
+    def encerrar(self):
+        if self._laco_tarefa is not None:
+            self._laco_tarefa.cancel()
+
+    async def _laco(self):
+        while True:
+            await asyncio.sleep(alertas.INTERVALO_VERIFICACAO)
+            try:
+                await self.verificar()
+            except Exception:
+                logger.exception('Falha na verificação dos fluxos de alertas')
+
+    async def verificar(self):
+        usuarios = list(self.sinais)
+        for i in range(0, len(usuarios), USUARIOS_POR_VERIFICACAO):
+            lote = usuarios[i:i + USUARIOS_POR_VERIFICACAO]
+            async with self.app._conexao(self.app.engine, None) as conn:
+                linhas = (await conn.execute(
+                    select(Usuario.id, Usuario.alertas_versao, alertas.consulta_proximo_disparo(Usuario.id))
+                    .where(Usuario.id.in_(lote))
+                )).all()
+            por_usuario = {u: (versao, proximo) for u, versao, proximo in linhas}
+            limite = datetime.utcnow() - agenda.FOLGA
+            for usuario_id in lote:
+                if usuario_id not in self.sinais:
+                    continue
+                versao, proximo = por_usuario.get(usuario_id, (0, None))
+                vencido = proximo is not None and proximo <= limite
+                # O fluxo acordado avança os vencidos (AppAsgi._versao_alertas) e envia a lista nova
+                if vencido or self.versoes.get(usuario_id) != alertas.marca_versao(versao):
+                    self.acordar(usuario_id)
+
+
+async def _esperar(sinal, desconectado, timeout):
+    """Espera `sinal` ou `desconectado` por até `timeout` segundos; diz se `sinal` chegou."""
+    tarefas = [asyncio.ensure_future(sinal.wait()), asyncio.ensure_future(desconectado.wait())]
+    try:
+        await asyncio.wait(tarefas, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+    return sinal.is_set()
+
+
+def _dados(dados, status=200, formato=None):
+    """(Response, corpo) como serializacao.responder, com `formato` negociado; sem ele, como jsonify."""
+    resposta = Response(status=status, mimetype=formato or serializacao.JSON)
+    if formato is not None:
+        resposta.vary.add('Accept')
+    return resposta, serializacao.codificar(dados, formato)
+
+
+def _cabecalhos(resposta):
+    return [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in resposta.headers.items()]
+
+
+def criar_app(config=None):
+    """Factory do modo ASGI: `uvicorn --factory asgi:criar_app`."""
+    return AppAsgi(create_app(config))
@@ -0,0 +1,157 @@
+"""Arquivos estáticos versionados pelo conteúdo, pré-comprimidos e com cache imutável.
+
+`flask --app app ativos-construir` copia cada arquivo de ATIVOS para
+static/dist/ com um hash do conteúdo no nome (styles.3f9c1a2b4d5e.css),
+grava ao lado as variantes .gz e .br (esta só com o pacote opcional
+`brotli`) e escreve static/dist/manifesto.json (nome -> nome versionado).
+O service worker em static/service-worker.js também é gerado ali, com o
+nome do cache e a lista de pré-cache tirados do manifesto.
+
+Nos templates, `ativo('styles.css')` aponta para a versão com hash, servida
+em /ativos/ com Cache-Control imutável de um ano, na melhor codificação que
+o navegador aceita. Sem o build (ex.: em desenvolvimento) cai no arquivo
+original em /static/, como antes.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import abort, current_app, request, send_from_directory, url_for
+
+# Caminhos relativos a static/
+ATIVOS = ('styles.css', 'logo-cuidaBem.svg', 'logoimc.svg', 'vendor/chart.umd.min.js')
+
+# Páginas que o service worker guarda para abrir offline (não versionadas)
+PAGINAS_OFFLINE = ('/', '/features')
+
+PASTA_DIST = 'dist'
+MANIFESTO = 'manifesto.json'
+SERVICE_WORKER = 'service-worker.js'
+
+# Um ano: o nome muda quando o conteúdo muda, então a cópia do navegador nunca fica velha
+MAX_AGE_IMUTAVEL = 365 * 24 * 3600
+
+# (valor de Content-Encoding, extensão da variante), na ordem de preferência
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _comprimir(conteudo):
+    variantes = {'.gz': gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variantes['.br'] = brotli.compress(conteudo, quality=11)
+    # Arquivos que não encolhem vão sem variante
+    return {ext: dados for ext, dados in variantes.items() if len(dados) < len(conteudo)}
+
+
+def _gravar(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'wb') as f:
+        f.write(conteudo)
+
+
+def _gerar_service_worker(pasta_static, manifesto):
+    with open(os.path.join(pasta_static, SERVICE_WORKER), encoding='utf-8') as f:
+        fonte = f.read()
+    versao = hashlib.sha256(json.dumps(manifesto, sort_keys=True).encode()).hexdigest()[:12]
+    precache = list(PAGINAS_OFFLINE) + [f'/ativos/{arquivo}' for arquivo in manifesto.values()]
+    fonte, n_versao = re.subn(r"^const VERSAO = .*;$", f"const VERSAO = '{versao}';", fonte, flags=re.M)
+    fonte, n_precache = re.subn(r"^const PRECACHE = .*;$", f'const PRECACHE = {json.dumps(precache)};',
+                                fonte, flags=re.M)
+    if n_versao != 1 or n_precache != 1:
+        raise RuntimeError(f'{SERVICE_WORKER} sem as linhas `const VERSAO` e `const PRECACHE`.')
+    return fonte.encode()
+
+
+def construir(pasta_static):
+    """Gera static/dist/ do zero e retorna o manifesto."""
+    destino = os.path.join(pasta_static, PASTA_DIST)
+    shutil.rmtree(destino, ignore_errors=True)
+
+    manifesto = {}
+    for nome in ATIVOS:
+        with open(os.path.join(pasta_static, nome), 'rb') as f:
+            conteudo = f.read()
+        base, ext = os.path.splitext(nome)
+        versionado = f'{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{ext}'
+        _gravar(os.path.join(destino, versionado), conteudo)
+        for ext_variante, dados in _comprimir(conteudo).items():
+            _gravar(os.path.join(destino, versionado + ext_variante), dados)
+        manifesto[nome] = versionado
+
+    _gravar(os.path.join(destino, SERVICE_WORKER), _gerar_service_worker(pasta_static, manifesto))
+    _gravar(os.path.join(destino, MANIFESTO), json.dumps(manifesto, indent=2, sort_keys=True).encode())
+    return manifesto
+
+
+def init_app(app):
+    """Carrega o manifesto (se o build foi feito) e expõe `ativo()` aos templates."""
+    pasta = os.path.join(app.static_folder, PASTA_DIST)
+    try:
+        with open(os.path.join(pasta, MANIFESTO), encoding='utf-8') as f:
+            manifesto = json.load(f)
+        disponiveis = {
+            os.path.relpath(os.path.join(raiz, nome), pasta).replace(os.sep, '/')
+            for raiz, _, nomes in os.walk(pasta) for nome in nomes
+        }
+    except FileNotFoundError:
+        manifesto, disponiveis = {}, set()
+    app.extensions['ativos'] = {
+        'manifesto': manifesto,
+        'disponiveis': disponiveis,
+        # Só os nomes com hash podem ir com cache imutável: os demais não mudam de nome no deploy
+        'versionados': set(manifesto.values()),
+    }
+
+    def ativo(nome):
+        versionado = manifesto.get(nome)
+        if versionado is None:
+            return url_for('static', filename=nome)
+        return url_for('ativo_versionado', arquivo=versionado)
+
+    app.jinja_env.globals['ativo'] = ativo
+
+
+def servir(arquivo):
+    """Arquivo versionado de static/dist/ na melhor codificação aceita, com cache imutável.
+
+    Só atende nomes do manifesto; o próprio manifesto, o service worker e as
+    variantes .gz/.br pedidas diretamente dão 404.
+    """
+    estado = current_app.extensions['ativos']
+    if arquivo not in estado['versionados']:
+        abort(404)
+    pasta = os.path.join(current_app.static_folder, PASTA_DIST)
+    enviado, codificacao = arquivo, None
+    for nome, ext in CODIFICACOES:
+        if nome in request.accept_encodings and arquivo + ext in estado['disponiveis']:
+            enviado, codificacao = arquivo + ext, nome
+            break
+
+    resposta = send_from_directory(pasta, enviado, mimetype=mimetypes.guess_type(arquivo)[0],
+                                   max_age=MAX_AGE_IMUTAVEL)
+    if codificacao:
+        resposta.content_encoding = codificacao
+    resposta.vary.add('Accept-Encoding')
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    return resposta
+
+
+def service_worker():
+    """O service worker gerado pelo build (ou o original), sempre revalidado."""
+    estado = current_app.extensions['ativos']
+    if SERVICE_WORKER in estado['disponiveis']:
+        pasta = os.path.join(current_app.static_folder, PASTA_DIST)
+    else:
+        pasta = current_app.static_folder
+    resposta = send_from_directory(pasta, SERVICE_WORKER, mimetype='text/javascript', max_age=0)
+    resposta.cache_control.no_cache = True
+    return resposta
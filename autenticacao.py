@@ -0,0 +1,204 @@
+"""Login e cadastro: senhas em scrypt, hash fora da thread da requisição e cache de sessão.
+
+As senhas são guardadas com scrypt (werkzeug.security), de custo ajustável
+por SENHA_SCRYPT_N/R/P. Calcular ou conferir um hash roda num pool pequeno
+de threads por worker (SENHA_HASH_THREADS); hashlib.scrypt libera o GIL,
+então as outras threads do gunicorn seguem atendendo. No máximo
+SENHA_HASH_PENDENTES requisições esperam por esse pool: acima disso o
+login responde 503 na hora, em vez de prender todas as threads do worker
+numa rajada de logins.
+
+A sessão (cookie assinado) leva o id do usuário e uma impressão do hash
+da senha. A cada requisição autenticada essa impressão e o flag `ativo`
+são conferidos num cache por worker de validade curta, sem ler a linha do
+usuário toda vez: trocar a senha ou desativar a conta derruba as sessões
+abertas em até VALIDADE_CACHE segundos (na hora, no worker que fez a
+mudança).
+"""
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, session
+from sqlalchemy import select, update
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from models import db, Usuario
+
+VALIDADE_CACHE = 60
+TAMANHO_CACHE = 10000
+SENHA_MINIMA = 6
+
+_pool = None
+_vagas = None
+_pool_lock = threading.Lock()
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_hashes_ficticios = {}
+
+
+class Sobrecarregado(RuntimeError):
+    """Há logins demais esperando pelo pool de hash deste worker."""
+
+
+def _obter_pool(app):
+    global _pool, _vagas
+    with _pool_lock:
+        if _pool is None:
+            _vagas = threading.BoundedSemaphore(app.config['SENHA_HASH_PENDENTES'])
+            _pool = ThreadPoolExecutor(max_workers=app.config['SENHA_HASH_THREADS'],
+                                       thread_name_prefix='senha')
+        return _pool, _vagas
+
+
+def _no_pool(funcao, *args):
+    pool, vagas = _obter_pool(current_app)
+    if not vagas.acquire(blocking=False):
+        raise Sobrecarregado('Muitas tentativas de login ao mesmo tempo. Tente novamente.')
+
+    def executar():
+        try:
+            return funcao(*args)
+        finally:
+            vagas.release()
+
+    try:
+        futuro = pool.submit(executar)
+    except BaseException:
+        vagas.release()
+        raise
+    return futuro.result()
+
+
+def metodo():
+    c = current_app.config
+    return f"scrypt:{c['SENHA_SCRYPT_N']}:{c['SENHA_SCRYPT_R']}:{c['SENHA_SCRYPT_P']}"
+
+
+def _conferir(guardada, senha):
+    if guardada.startswith(('scrypt:', 'pbkdf2:')):
+        return check_password_hash(guardada, senha)
+    # Senhas gravadas em texto antes do hash: aceitas uma vez e regravadas em autenticar()
+    return hmac.compare_digest(guardada.encode(), senha.encode())
+
+
+def gerar_hash(senha):
+    """Hash da senha com o custo configurado, calculado no pool."""
+    return _no_pool(generate_password_hash, senha, metodo())
+
+
+def _hash_ficticio():
+    # Login inexistente também paga um scrypt inteiro: o tempo de resposta não revela quem existe
+    atual = metodo()
+    if atual not in _hashes_ficticios:
+        _hashes_ficticios[atual] = _no_pool(generate_password_hash, '-', atual)
+    return _hashes_ficticios[atual]
+
+
+def impressao(hash_senha):
+    return hashlib.sha256(hash_senha.encode()).hexdigest()[:16]
+
+
+def autenticar(login, senha):
+    """(id, nome, hash da senha) se login e senha conferem e a conta está ativa; senão None.
+
+    Hashes em texto ou com custo diferente do atual são regravados aqui.
+    """
+    usuario = db.session.execute(
+        select(Usuario.id, Usuario.nome, Usuario.senha, Usuario.ativo).where(Usuario.login == login)
+    ).first()
+    guardada = usuario.senha if usuario else _hash_ficticio()
+    if not _no_pool(_conferir, guardada, senha) or usuario is None or not usuario.ativo:
+        return None
+
+    if not guardada.startswith(metodo() + '$'):
+        guardada = gerar_hash(senha)
+        db.session.execute(update(Usuario).where(Usuario.id == usuario.id).values(senha=guardada))
+        db.session.commit()
+        invalidar([usuario.id])
+    return usuario.id, usuario.nome, guardada
+
+
+def autenticar_admin(login, senha):
+    """Confere o administrador configurado em ADMIN_LOGIN / ADMIN_SENHA_HASH."""
+    guardada = current_app.config.get('ADMIN_SENHA_HASH')
+    if not guardada or login != current_app.config['ADMIN_LOGIN']:
+        return False
+    return _no_pool(check_password_hash, guardada, senha)
+
+
+def iniciar_sessao(usuario_id, nome, hash_senha):
+    session.clear()
+    session['user_id'] = usuario_id
+    session['user_name'] = nome
+    session['auth'] = impressao(hash_senha)
+
+
+# -----------------------
+# CACHE DE SESSÃO
+# -----------------------
+AUSENTE = object()
+
+
+def consulta_estado(usuario_id):
+    return select(Usuario.ativo, Usuario.senha).where(Usuario.id == usuario_id)
+
+
+def estado_em_cache(usuario_id):
+    """Estado guardado e ainda válido, ou AUSENTE (ler com `consulta_estado` e `guardar_estado`)."""
+    with _cache_lock:
+        item = _cache.get(usuario_id)
+        if item is not None and time.monotonic() - item[0] < VALIDADE_CACHE:
+            _cache.move_to_end(usuario_id)
+            return item[1]
+    return AUSENTE
+
+
+def guardar_estado(usuario_id, linha):
+    """Guarda no cache o estado a partir da linha de `consulta_estado` (ou None) e o retorna."""
+    estado = (linha.ativo, impressao(linha.senha)) if linha else None
+    with _cache_lock:
+        _cache[usuario_id] = (time.monotonic(), estado)
+        _cache.move_to_end(usuario_id)
+        while len(_cache) > TAMANHO_CACHE:
+            _cache.popitem(last=False)
+    return estado
+
+
+def _estado(usuario_id):
+    """(ativo, impressão do hash) do usuário, ou None se ele não existe mais."""
+    estado = estado_em_cache(usuario_id)
+    if estado is AUSENTE:
+        estado = guardar_estado(usuario_id, db.session.execute(consulta_estado(usuario_id)).first())
+    return estado
+
+
+def sessao_valida(sessao, estado):
+    """Se a sessão (dict) ainda corresponde ao estado atual do usuário."""
+    return estado is not None and estado[0] and estado[1] == sessao.get('auth')
+
+
+def invalidar(usuario_ids=None):
+    """Descarta do cache deste worker os usuários dados (ou todos)."""
+    with _cache_lock:
+        if usuario_ids is None:
+            _cache.clear()
+        else:
+            for usuario_id in usuario_ids:
+                _cache.pop(usuario_id, None)
+
+
+def init_app(app):
+    """Confere, antes de cada requisição, se a sessão do usuário ainda vale."""
+
+    @app.before_request
+    def _conferir_sessao():
+        usuario_id = session.get('user_id')
+        if usuario_id is None:
+            return
+        if not sessao_valida(session, _estado(usuario_id)):
+            session.clear()
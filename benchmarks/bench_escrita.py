@@ -0,0 +1,104 @@
+"""Benchmark de vazão dos POSTs de leituras com e sem escrita agrupada.
+
+Várias threads (simulando o gthread do gunicorn) enviam medições de
+glicemia ao mesmo tempo para um banco novo; mede requisições por segundo e
+latência com commit por requisição e com group commit (ESCRITA_AGRUPADA).
+
+Uso:
+    python benchmarks/bench_escrita.py --threads 16 --requisicoes 200
+    python benchmarks/bench_escrita.py --url mysql+pymysql://... --saida escrita.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def medir(url, agrupada, threads, requisicoes):
+    from app import create_app
+    from models import db, Medicao, Usuario
+    from werkzeug.security import generate_password_hash
+    import autenticacao
+    import escrita_agrupada
+
+    config = {'SQLALCHEMY_DATABASE_URI': url, 'ESCRITA_AGRUPADA': agrupada}
+    if url.startswith('sqlite'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app = create_app(config)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Usuario(id=1, nome='Bench', email='bench@bench', login='bench',
+                               senha=generate_password_hash('bench')))
+        db.session.commit()
+    # O usuário 1 da rodada anterior tinha outro hash: a sessão em cache não vale mais
+    autenticacao.invalidar()
+
+    tempos = []
+    lock = threading.Lock()
+
+    def cliente(n):
+        c = app.test_client()
+        c.post('/', data={'username': 'bench', 'password': 'bench'})
+        for i in range(requisicoes):
+            inicio = time.perf_counter()
+            resposta = c.post('/measurements', data={
+                'date': '2024-01-01', 'time': f'{n % 24:02d}:{i % 60:02d}',
+                'level': str(80 + i % 100), 'measurement_context': 'em_jejum',
+            })
+            decorrido = (time.perf_counter() - inicio) * 1000
+            if resposta.status_code != 302 or not resposta.location.endswith('/measurements'):
+                raise RuntimeError(f'POST falhou: {resposta.status_code}')
+            with lock:
+                tempos.append(decorrido)
+
+    inicio = time.perf_counter()
+    trabalhadores = [threading.Thread(target=cliente, args=(n,)) for n in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    escrita_agrupada.drenar_todas()
+
+    with app.app_context():
+        gravadas = db.session.query(Medicao).count()
+    if gravadas != threads * requisicoes:
+        raise RuntimeError(f'esperava {threads * requisicoes} medições, encontrei {gravadas}')
+    tempos.sort()
+    return {
+        'n': len(tempos),
+        'rps': round(len(tempos) / duracao, 1),
+        'p50_ms': round(statistics.median(tempos), 3),
+        'p99_ms': round(tempos[int(len(tempos) * 0.99) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requisicoes', type=int, default=100, help='POSTs por thread')
+    parser.add_argument('--url', help='URL do banco (padrão: SQLite temporário)')
+    parser.add_argument('--saida', help='Arquivo JSON para gravar o resultado')
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_escrita.db')}"
+    resultados = {
+        'por_requisicao': medir(url, False, args.threads, args.requisicoes),
+        'agrupada': medir(url, True, args.threads, args.requisicoes),
+    }
+    print(json.dumps(resultados, indent=2))
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark de conexões ociosas no modo ASGI (asgi.py).
+
+Sobe um worker do uvicorn sobre um SQLite temporário, abre `--fluxos`
+conexões em /alerts/stream (cada uma espera a primeira lista de alertas e
+fica aberta) e, com todas abertas, mede a latência de `--pedidos` GETs em
+/imc/<id> e de uma página atendida pelo Flask. Relata também a memória
+e as threads do worker.
+
+Uso:
+    python benchmarks/bench_fluxos.py --fluxos 3000
+    python benchmarks/bench_fluxos.py --fluxos 1000 --porta 8800 --saida fluxos.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def preparar_banco(caminho):
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db, Alerta, RegistroIMC, Usuario
+    import agenda
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'SQLALCHEMY_ENGINE_OPTIONS': {}})
+    with app.app_context():
+        db.create_all()
+        senha = generate_password_hash('bench', f"scrypt:{app.config['SENHA_SCRYPT_N']}:8:1")
+        db.session.add(Usuario(id=1, nome='Bench', email='bench@bench', login='bench', senha=senha))
+        inicio = datetime(2025, 1, 1)
+        for i in range(1000):
+            registro = RegistroIMC(usuario_id=1, peso_atual=70 + i % 10, altura=1.7,
+                                   data_registro=inicio + timedelta(hours=i))
+            registro.calcular_imc()
+            db.session.add(registro)
+        alerta = Alerta(usuario_id=1, alert_type='medicacao', alert_time='08:00', dias_mask=127)
+        agenda.reagendar(alerta)
+        db.session.add(alerta)
+        db.session.commit()
+
+
+def estado_do_processo(pid):
+    with open(f'/proc/{pid}/status') as f:
+        rss = int(f.read().split('VmRSS:')[1].split()[0]) // 1024
+    return rss, len(os.listdir(f'/proc/{pid}/task'))
+
+
+async def medir(args, pid):
+    # O login passa pelo Flask; o cookie de sessão vale também nas rotas assíncronas
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', args.porta)
+    corpo = b'username=bench&password=bench'
+    escritor.write(b'POST / HTTP/1.1\r\nHost: bench\r\nContent-Type: application/x-www-form-urlencoded\r\n'
+                   b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(corpo), corpo))
+    cabecalhos = (await leitor.read()).decode('latin-1').split('\r\n\r\n', 1)[0].split('\r\n')
+    escritor.close()
+    cookie = next(c.split(':', 1)[1].strip().split(';', 1)[0]
+                  for c in cabecalhos if c.lower().startswith('set-cookie:'))
+
+    async def pedir(caminho, ate=b'\r\n\r\n'):
+        leitor, escritor = await asyncio.open_connection('127.0.0.1', args.porta)
+        escritor.write(f'GET {caminho} HTTP/1.1\r\nHost: bench\r\nCookie: {cookie}\r\n\r\n'.encode())
+        await leitor.readuntil(ate)
+        return leitor, escritor
+
+    fluxos = []
+    inicio = time.perf_counter()
+    for i in range(0, args.fluxos, 500):
+        fluxos += await asyncio.gather(*(pedir('/alerts/stream', b'event: alerts')
+                                         for _ in range(min(500, args.fluxos - i))))
+    abertura = time.perf_counter() - inicio
+    rss, threads = estado_do_processo(pid)
+
+    async def cronometrar(caminho):
+        t0 = time.perf_counter()
+        leitor, escritor = await pedir(caminho)
+        escritor.close()
+        return (time.perf_counter() - t0) * 1000
+
+    tempos = sorted(await asyncio.gather(*(cronometrar('/imc/1?limit=100') for _ in range(args.pedidos))))
+    flask_ms = await cronometrar('/features')
+    for _, escritor in fluxos:
+        escritor.close()
+    return {
+        'fluxos': len(fluxos),
+        'abertura_s': round(abertura, 1),
+        'rss_mib': rss,
+        'threads': threads,
+        'imc_p50_ms': round(statistics.median(tempos), 1),
+        'imc_p95_ms': round(tempos[max(int(len(tempos) * 0.95) - 1, 0)], 1),
+        'flask_ms': round(flask_ms, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fluxos', type=int, default=2000, help='Conexões SSE abertas ao mesmo tempo')
+    parser.add_argument('--pedidos', type=int, default=50, help='GETs simultâneos em /imc/<id> com os fluxos abertos')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--saida', help='Arquivo JSON para gravar o resultado')
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'bench_fluxos.db')
+    preparar_banco(caminho)
+    env = dict(os.environ, DB_PATH=caminho, PYTHONPATH=RAIZ)
+    servidor = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:criar_app', '--port', str(args.porta),
+         '--log-level', 'warning', '--backlog', '4096'], cwd=RAIZ, env=env)
+    try:
+        time.sleep(3)
+        resultado = asyncio.run(medir(args, servidor.pid))
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    for chave, valor in resultado.items():
+        print(f'{chave:<12}{valor:>10}')
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark de inicialização a frio do app.
+
+Cada repetição roda num processo Python novo e mede, em separado, o import
+do módulo app, a chamada a create_app() e a primeira requisição (que abre a
+primeira conexão com o banco). Também mede `flask --app app criar-banco`,
+que é onde o esquema passou a ser criado.
+
+Uso:
+    python benchmarks/bench_inicializacao.py --repeticoes 20 --saida inicio.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado num processo novo; imprime os tempos (ms) em JSON
+SONDA = r'''
+import json, time
+t0 = time.perf_counter()
+import app as modulo
+t1 = time.perf_counter()
+aplicacao = modulo.create_app()
+t2 = time.perf_counter()
+status = aplicacao.test_client().get('/').status_code
+t3 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000,
+                  'primeira_requisicao_ms': (t3 - t2) * 1000, 'status': status}))
+'''
+
+
+def medir_processo(env):
+    inicio = time.perf_counter()
+    saida = subprocess.check_output([sys.executable, '-c', SONDA], cwd=RAIZ, env=env, text=True)
+    resultado = json.loads(saida.strip().splitlines()[-1])
+    resultado['processo_ms'] = (time.perf_counter() - inicio) * 1000
+    return resultado
+
+
+def medir_criar_banco(env):
+    inicio = time.perf_counter()
+    subprocess.check_call([sys.executable, '-m', 'flask', '--app', 'app', 'criar-banco'],
+                          cwd=RAIZ, env=env, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def resumir(valores):
+    return {
+        'mediana_ms': round(statistics.median(valores), 2),
+        'min_ms': round(min(valores), 2),
+        'max_ms': round(max(valores), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--url', help='URL do banco (padrão: SQLite temporário)')
+    parser.add_argument('--saida', help='Arquivo JSON para gravar o resultado')
+    args = parser.parse_args()
+
+    caminho = None
+    if args.url:
+        url = args.url
+    else:
+        caminho = os.path.join(tempfile.mkdtemp(), 'bench_inicio.db')
+        url = f'sqlite:///{caminho}'
+    env = dict(os.environ, DATABASE_URL=url)
+
+    criar_banco = [medir_criar_banco(env) for _ in range(args.repeticoes)]
+    amostras = [medir_processo(env) for _ in range(args.repeticoes)]
+    if any(a['status'] >= 500 for a in amostras):
+        raise RuntimeError('a primeira requisição falhou')
+
+    resultados = {
+        etapa: resumir([a[etapa] for a in amostras])
+        for etapa in ('import_ms', 'create_app_ms', 'primeira_requisicao_ms', 'processo_ms')
+    }
+    resultados['criar_banco_ms'] = resumir(criar_banco)
+
+    print(f"{'etapa':<26}{'mediana':>10}{'min':>10}{'max':>10}")
+    for etapa, r in resultados.items():
+        print(f"{etapa:<26}{r['mediana_ms']:>10.2f}{r['min_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({'repeticoes': args.repeticoes, 'resultados': resultados}, f, indent=2)
+    if caminho:
+        os.remove(caminho)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark de vazão do login para calibrar o custo do scrypt.
+
+Para cada custo (N = 2**k) mede o tempo de um hash isolado e a vazão de
+logins de um worker com `--concorrencia` threads disparando ao mesmo tempo
+(como o gthread do gunicorn), usando o pool de hash com SENHA_HASH_THREADS
+threads. Estima a vazão com `--workers` workers, limitada pelos núcleos da
+máquina, e conta quantos logins foram recusados com 503 pelo limite de
+SENHA_HASH_PENDENTES.
+
+Uso:
+    python benchmarks/bench_login.py --custos 14,15,16 --workers 2 --threads-hash 2
+    python benchmarks/bench_login.py --concorrencia 32 --saida login.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def medir(expoente, args, url):
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db, Usuario
+    import autenticacao
+
+    config = {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SENHA_SCRYPT_N': 2 ** expoente,
+        'SENHA_HASH_THREADS': args.threads_hash,
+        'SENHA_HASH_PENDENTES': args.pendentes,
+    }
+    if url.startswith('sqlite'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    app = create_app(config)
+    # O pool é criado uma vez por processo: recomeça com a configuração deste custo
+    autenticacao._pool = None
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        metodo = autenticacao.metodo()
+        inicio = time.perf_counter()
+        senha = generate_password_hash('bench', metodo)
+        hash_ms = (time.perf_counter() - inicio) * 1000
+        db.session.add(Usuario(id=1, nome='Bench', email='bench@bench', login='bench', senha=senha))
+        db.session.commit()
+
+    tempos, recusados = [], []
+    lock = threading.Lock()
+
+    def cliente():
+        c = app.test_client()
+        locais, recusas = [], 0
+        for _ in range(args.logins):
+            t0 = time.perf_counter()
+            resposta = c.post('/', data={'username': 'bench', 'password': 'bench'})
+            if resposta.status_code == 503:
+                recusas += 1
+            elif resposta.status_code != 302:
+                raise RuntimeError(f'login falhou: HTTP {resposta.status_code}')
+            else:
+                locais.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            tempos.extend(locais)
+            recusados.append(recusas)
+
+    threads = [threading.Thread(target=cliente) for _ in range(args.concorrencia)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    autenticacao._pool.shutdown()
+
+    tempos.sort()
+    por_worker = len(tempos) / duracao
+    nucleos = os.cpu_count() or 1
+    return {
+        'metodo': metodo,
+        'memoria_mib': round(128 * 2 ** expoente * app.config['SENHA_SCRYPT_R'] / 2 ** 20, 1),
+        'hash_ms': round(hash_ms, 1),
+        'logins': len(tempos),
+        'recusados_503': sum(recusados),
+        'logins_s_worker': round(por_worker, 1),
+        'logins_s_estimado': round(por_worker * min(args.workers, max(nucleos // args.threads_hash, 1)), 1),
+        'p50_ms': round(statistics.median(tempos), 1) if tempos else None,
+        'p95_ms': round(tempos[max(int(len(tempos) * 0.95) - 1, 0)], 1) if tempos else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--custos', default='14,15,16', help='Expoentes k de N = 2**k')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn a estimar')
+    parser.add_argument('--threads-hash', type=int, default=2, help='SENHA_HASH_THREADS')
+    parser.add_argument('--pendentes', type=int, default=16, help='SENHA_HASH_PENDENTES')
+    parser.add_argument('--concorrencia', type=int, default=16, help='Logins simultâneos (threads do worker)')
+    parser.add_argument('--logins', type=int, default=10, help='Logins por thread')
+    parser.add_argument('--url', help='URL do banco (padrão: SQLite temporário)')
+    parser.add_argument('--saida', help='Arquivo JSON para gravar o resultado')
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_login.db')}"
+    resultados = {}
+    for k in (int(c) for c in args.custos.split(',')):
+        print(f'Medindo N=2**{k}...', file=sys.stderr)
+        resultados[f'2**{k}'] = medir(k, args, url)
+
+    print(f"{'N':<8}{'MiB':>6}{'hash ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'login/s':>9}"
+          f"{f'x{args.workers} wk':>9}{'503':>6}")
+    for n, r in resultados.items():
+        print(f"{n:<8}{r['memoria_mib']:>6}{r['hash_ms']:>9}{r['p50_ms'] or 0:>9}{r['p95_ms'] or 0:>9}"
+              f"{r['logins_s_worker']:>9}{r['logins_s_estimado']:>9}{r['recusados_503']:>6}")
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""Benchmark de latência e vazão das rotas principais.
+
+Popula um SQLite temporário em vários tamanhos de histórico e mede cada
+rota com o test client do Flask (ou, com --uvicorn ou --gunicorn, contra
+um servidor local via HTTP; --uvicorn é o modo ASGI de produção, ver
+render.yaml). Reporta p50/p95/p99 e requisições por segundo e grava o
+resultado em JSON para comparar commits.
+
+Uso:
+    python benchmarks/bench_rotas.py --tamanhos 1000,10000,100000 --saida bench.json
+    python benchmarks/bench_rotas.py --uvicorn --concorrencia 8
+    python benchmarks/bench_rotas.py --gunicorn --concorrencia 8
+    python benchmarks/bench_rotas.py --comparar antes.json depois.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# (nome, método, caminho, corpo, status esperado); o usuário medido é sempre o id 1
+ROTAS = [
+    ('login', 'POST', '/', {'username': 'bench', 'password': 'bench'}, 302),
+    ('dashboard', 'GET', '/dashboard', None, 200),
+    ('glicemia_estatisticas', 'GET', '/glicemia/estatisticas', None, 200),
+    ('alerts_data', 'GET', '/alerts/data', None, 200),
+    ('measurements', 'GET', '/measurements', None, 200),
+    ('activities_dashboard', 'GET', '/activities_dashboard', None, 200),
+    ('usuarios', 'GET', '/usuarios', None, 200),
+    ('imc_historico', 'GET', '/imc/1', None, 200),
+    ('imc_registrar', 'POST_JSON', '/imc', {'usuario_id': 1, 'peso_atual': 80.5, 'altura': 1.75}, 201),
+    ('metas_listar', 'GET', '/metas/1', None, 200),
+    ('metas_criar', 'POST_JSON', '/metas', {'usuario_id': 1, 'peso_desejado': 75, 'data_meta': '2030-01-01'}, 201),
+]
+ROTAS_ADMIN = {'usuarios'}
+
+
+class StatusInesperado(RuntimeError):
+    """Uma rota respondeu com outro status: as medidas daquele tamanho não valem."""
+
+
+def conferir(nome, esperado, status):
+    if status != esperado:
+        raise StatusInesperado(f'{nome}: HTTP {status}, esperado {esperado}')
+
+
+def percentil(valores, p):
+    return float(np.percentile(valores, p)) if valores else None
+
+
+def resumir(tempos, duracao_total):
+    return {
+        'n': len(tempos),
+        'p50_ms': round(percentil(tempos, 50), 3),
+        'p95_ms': round(percentil(tempos, 95), 3),
+        'p99_ms': round(percentil(tempos, 99), 3),
+        'media_ms': round(statistics.fmean(tempos), 3),
+        'rps': round(len(tempos) / duracao_total, 1),
+    }
+
+
+# -----------------------
+# DADOS
+# -----------------------
+def popular(db, tamanho, seed=42):
+    """Recria o esquema e insere `tamanho` linhas de histórico para o usuário 1."""
+    from sqlalchemy import insert, text
+    from models import (Usuario, Meta, RegistroIMC, Medicao, Atividade, Alerta,
+                        mascara_de_dias)
+    import agenda
+    import estatisticas
+
+    rng = np.random.default_rng(seed)
+    db.drop_all()
+    db.create_all()
+
+    usuarios = max(tamanho // 10, 10)
+    db.session.execute(insert(Usuario), [
+        {'id': i, 'nome': f'Usuário {i}', 'email': f'u{i}@bench', 'login': f'u{i}', 'senha': 'x'}
+        for i in range(2, usuarios + 1)
+    ] + [{'id': 1, 'nome': 'Bench', 'email': 'bench@bench', 'login': 'bench',
+          'senha': generate_password_hash('bench')}])
+
+    fim = datetime.now()
+    offsets = np.sort(rng.integers(0, 3 * 365 * 86400, tamanho))[::-1]
+    datas = [fim - timedelta(seconds=int(s)) for s in offsets]
+    contextos = ['em_jejum', 'antes_refeicao', '2h_pos_refeicao', 'antes_dormir']
+    categorias = ['caminhada', 'natacao', 'ciclismo', 'musculacao', 'pilates']
+
+    db.session.execute(insert(Medicao), [
+        {'usuario_id': 1, 'glucose_level': round(float(v), 1), 'measurement_context': contextos[i % 4],
+         'measured_at': d}
+        for i, (v, d) in enumerate(zip(rng.normal(120, 30, tamanho).clip(40, 400), datas))
+    ])
+    db.session.execute(insert(RegistroIMC), [
+        {'usuario_id': 1, 'peso_atual': round(float(p), 2), 'altura': 1.75,
+         'imc': round(float(p) / 1.75 ** 2, 2), 'data_registro': d}
+        for p, d in zip(rng.normal(80, 5, tamanho), datas)
+    ])
+    db.session.execute(insert(Atividade), [
+        {'usuario_id': 1, 'category': categorias[i % 5], 'duration_minutes': int(m), 'performed_at': d}
+        for i, (m, d) in enumerate(zip(rng.integers(10, 90, tamanho), datas))
+    ])
+    db.session.execute(insert(Meta), [
+        {'usuario_id': 1, 'peso_desejado': 75, 'data_meta': (fim + timedelta(days=30 * i)).date()}
+        for i in range(1, 6)
+    ])
+    for i in range(10):
+        alerta = Alerta(usuario_id=1, alert_type='medicacao', alert_time=f'{8 + i:02d}:00',
+                        dias_mask=mascara_de_dias(['mon', 'wed', 'fri']))
+        agenda.reagendar(alerta)
+        db.session.add(alerta)
+
+    # Agregados de glicemia montados direto no banco, como se cada medição
+    # tivesse passado por rollups.registrar_medicao
+    for tabela, chave in (('glicemia_diaria', 'date(measured_at)'),
+                          ('glicemia_mensal', "strftime('%Y-%m', measured_at)")):
+        db.session.execute(text(
+            f'INSERT INTO {tabela} SELECT usuario_id, {chave}, count(*), sum(glucose_level), '
+            f'min(glucose_level), max(glucose_level) FROM medicoes GROUP BY usuario_id, {chave}'
+        ))
+    db.session.execute(text(
+        "INSERT INTO glicemia_contexto SELECT usuario_id, strftime('%Y-%m', measured_at), measurement_context, "
+        'count(*), sum(glucose_level), min(glucose_level), max(glucose_level) '
+        "FROM medicoes GROUP BY usuario_id, strftime('%Y-%m', measured_at), measurement_context"
+    ))
+    db.session.commit()
+    estatisticas.recalcular()
+
+
+# -----------------------
+# EXECUÇÃO VIA TEST CLIENT
+# -----------------------
+def medir_test_client(app, repeticoes, aquecimento):
+    resultados = {}
+    usuario = app.test_client()
+    usuario.post('/', data={'username': 'bench', 'password': 'bench'})
+    admin = app.test_client()
+    admin.post('/', data={'username': 'adm', 'password': 'adm'})
+
+    for nome, metodo, caminho, corpo, esperado in ROTAS:
+        cliente = admin if nome in ROTAS_ADMIN else usuario
+        if metodo == 'GET':
+            chamar = lambda: cliente.get(caminho)
+        elif metodo == 'POST':
+            chamar = lambda: app.test_client().post(caminho, data=corpo)
+        else:
+            chamar = lambda: cliente.post(caminho, json=corpo)
+
+        for _ in range(aquecimento):
+            conferir(nome, esperado, chamar().status_code)
+        tempos = []
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            t0 = time.perf_counter()
+            resposta = chamar()
+            tempos.append((time.perf_counter() - t0) * 1000)
+            conferir(nome, esperado, resposta.status_code)
+        resultados[nome] = resumir(tempos, time.perf_counter() - inicio)
+    return resultados
+
+
+# -----------------------
+# EXECUÇÃO VIA SERVIDOR LOCAL (UVICORN OU GUNICORN)
+# -----------------------
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _login(porta, usuario, senha):
+    conn = http.client.HTTPConnection('127.0.0.1', porta)
+    conn.request('POST', '/', body=f'username={usuario}&password={senha}',
+                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    resposta = conn.getresponse()
+    resposta.read()
+    return resposta.getheader('Set-Cookie', '').split(';')[0]
+
+
+def comando_servidor(servidor, porta, workers):
+    if servidor == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:criar_app', '--workers', str(workers),
+                '--host', '127.0.0.1', '--port', str(porta), '--log-level', 'warning']
+    return [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', '8',
+            '-b', f'127.0.0.1:{porta}', 'app:create_app()']
+
+
+def medir_servidor(servidor, url_banco, repeticoes, concorrencia, workers):
+    porta = _porta_livre()
+    env = dict(os.environ, DATABASE_URL=url_banco)
+    processo = subprocess.Popen(
+        comando_servidor(servidor, porta, workers),
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', porta), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        cookie_usuario = _login(porta, 'bench', 'bench')
+        cookie_admin = _login(porta, 'adm', 'adm')
+
+        resultados = {}
+        for nome, metodo, caminho, corpo, esperado in ROTAS:
+            headers = {'Cookie': cookie_admin if nome in ROTAS_ADMIN else cookie_usuario}
+            if metodo == 'POST':
+                headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+                dados = '&'.join(f'{k}={v}' for k, v in corpo.items())
+            elif metodo == 'POST_JSON':
+                headers['Content-Type'] = 'application/json'
+                dados = json.dumps(corpo)
+            else:
+                dados = None
+            verbo = 'GET' if metodo == 'GET' else 'POST'
+
+            tempos, vistos = [], set()
+            lock = threading.Lock()
+            por_thread = max(repeticoes // concorrencia, 1)
+
+            def trabalhador():
+                conn = http.client.HTTPConnection('127.0.0.1', porta)
+                locais, status = [], set()
+                for _ in range(por_thread):
+                    t0 = time.perf_counter()
+                    conn.request(verbo, caminho, body=dados, headers=headers)
+                    resposta = conn.getresponse()
+                    resposta.read()
+                    locais.append((time.perf_counter() - t0) * 1000)
+                    status.add(resposta.status)
+                conn.close()
+                with lock:
+                    tempos.extend(locais)
+                    vistos.update(status)
+
+            threads = [threading.Thread(target=trabalhador) for _ in range(concorrencia)]
+            inicio = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            for status in vistos:
+                conferir(nome, esperado, status)
+            resultados[nome] = resumir(tempos, time.perf_counter() - inicio)
+        return resultados
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+# -----------------------
+# RELATÓRIO
+# -----------------------
+def imprimir(resultados):
+    for tamanho, rotas in resultados.items():
+        print(f'\n== histórico de {tamanho} linhas ==')
+        print(f"{'rota':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        for nome, r in rotas.items():
+            print(f"{nome:<22}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.1f}")
+
+
+def comparar(arquivo_antes, arquivo_depois):
+    with open(arquivo_antes) as f:
+        antes = json.load(f)
+    with open(arquivo_depois) as f:
+        depois = json.load(f)
+    print(f"{antes.get('commit', '?')[:10]} -> {depois.get('commit', '?')[:10]} (p95, ms)")
+    for tamanho, rotas in depois['resultados'].items():
+        print(f'\n== histórico de {tamanho} linhas ==')
+        for nome, r in rotas.items():
+            anterior = antes['resultados'].get(tamanho, {}).get(nome)
+            if not anterior:
+                print(f"{nome:<22}{'—':>10}{r['p95_ms']:>10.2f}")
+                continue
+            variacao = (r['p95_ms'] / anterior['p95_ms'] - 1) * 100 if anterior['p95_ms'] else 0
+            print(f"{nome:<22}{anterior['p95_ms']:>10.2f}{r['p95_ms']:>10.2f}{variacao:>+9.1f}%")
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', default='1000,10000,100000',
+                        help='Linhas de histórico do usuário medido, separadas por vírgula')
+    parser.add_argument('--repeticoes', type=int, default=200)
+    parser.add_argument('--aquecimento', type=int, default=10)
+    servidor = parser.add_mutually_exclusive_group()
+    servidor.add_argument('--uvicorn', dest='servidor', action='store_const', const='uvicorn',
+                          help='Medir via HTTP contra um uvicorn local no modo ASGI (como em produção)')
+    servidor.add_argument('--gunicorn', dest='servidor', action='store_const', const='gunicorn',
+                          help='Medir via HTTP contra um gunicorn local (workers gthread)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concorrencia', type=int, default=4)
+    parser.add_argument('--saida', help='Arquivo JSON para gravar o resultado')
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'),
+                        help='Compara dois arquivos JSON gerados por este script')
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    caminho = os.path.join(tempfile.mkdtemp(), 'bench_rotas.db')
+    url_banco = f'sqlite:///{caminho}'
+    os.environ['DATABASE_URL'] = url_banco
+    os.environ['ADMIN_SENHA_HASH'] = generate_password_hash('adm')
+    from app import create_app
+    from models import db
+    import autenticacao
+    app = create_app()
+
+    resultados = {}
+    for tamanho in (int(t) for t in args.tamanhos.split(',')):
+        print(f'Populando histórico de {tamanho} linhas...', file=sys.stderr)
+        with app.app_context():
+            popular(db, tamanho)
+            db.engine.dispose()
+        # Os usuários foram recriados com outros hashes: as sessões do tamanho anterior não valem mais
+        autenticacao.invalidar()
+        try:
+            if args.servidor:
+                resultados[tamanho] = medir_servidor(args.servidor, url_banco, args.repeticoes,
+                                                     args.concorrencia, args.workers)
+            else:
+                resultados[tamanho] = medir_test_client(app, args.repeticoes, args.aquecimento)
+        except StatusInesperado as e:
+            print(f'Histórico de {tamanho} linhas descartado: {e}', file=sys.stderr)
+
+    imprimir(resultados)
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'commit': commit_atual(),
+                'data': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'modo': args.servidor or 'test_client',
+                'repeticoes': args.repeticoes,
+                'resultados': {str(k): v for k, v in resultados.items()},
+            }, f, indent=2)
+    os.remove(caminho)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import time
+
+from sqlalchemy import func, select, text
+
+import paginacao
+from models import db, Usuario
+
+# Colunas com índice aceitas na busca por prefixo (e usadas na ordenação)
+CAMPOS_BUSCA = {
+    'nome': Usuario.nome,
+    'email': Usuario.email,
+    'login': Usuario.login,
+}
+
+# Só as colunas exibidas são carregadas (nunca `senha`)
+COLUNAS_LISTAGEM = (Usuario.id, Usuario.nome, Usuario.email, Usuario.login,
+                    Usuario.sexo, Usuario.data_cadastro, Usuario.ativo)
+
+# O total aproximado é reaproveitado por este tempo (segundos) em cada worker
+VALIDADE_TOTAL = 60
+_total_cache = (0.0, None)
+
+
+def filtro_prefixo(coluna, termo):
+    """`coluna LIKE 'termo%'`, com `%`, `_` e o caractere de escape do termo escapados.
+
+    O padrão vai pronto (não `termo || '%'` no SQL), então o MySQL o vê
+    constante e ancorado à esquerda e usa o índice da coluna numa busca por
+    faixa. A comparação segue a collation da coluna (utf8mb4_*_ci: sem
+    distinção de maiúsculas nem de acentos), o que um intervalo montado por
+    código de caractere em Python não acompanha.
+    """
+    escapado = termo.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return coluna.like(escapado + '%', escape='/')
+
+
+def pagina_usuarios(termo=None, campo='nome', apos=None, limite=paginacao.LIMITE_PADRAO):
+    """Página de usuários ordenada por (campo, id), opcionalmente filtrada por prefixo."""
+    coluna = CAMPOS_BUSCA[campo]
+    stmt = select(*COLUNAS_LISTAGEM)
+    if termo:
+        stmt = stmt.where(filtro_prefixo(coluna, termo))
+    return paginacao.pagina_keyset(stmt, (coluna, Usuario.id), apos, limite)
+
+
+def _contar_aproximado():
+    if db.session.get_bind(Usuario).dialect.name == 'mysql':
+        # Estimativa mantida pelo InnoDB; não varre a tabela como COUNT(*)
+        total = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'usuarios'"
+        )).scalar()
+        if total is not None:
+            return int(total)
+    # Maior id: lido direto do fim do índice da chave primária
+    return db.session.execute(select(func.max(Usuario.id))).scalar() or 0
+
+
+def total_aproximado():
+    """Total aproximado de usuários cadastrados, sem COUNT(*) a cada página."""
+    global _total_cache
+    lido_em, total = _total_cache
+    if total is None or time.monotonic() - lido_em > VALIDADE_TOTAL:
+        total = _contar_aproximado()
+        _total_cache = (time.monotonic(), total)
+    return total
@@ -0,0 +1,109 @@
+"""Comandos de linha de comando (`flask --app app <comando>`)."""
+import click
+from flask import current_app
+
+from models import db, adicionar_colunas, criar_indices
+
+
+@click.command('criar-banco')
+def criar_banco():
+    """Cria as tabelas, colunas e índices que ainda não existem."""
+    db.create_all()
+    adicionar_colunas(db.engine)
+    criar_indices(db.engine)
+    click.echo('Esquema criado/atualizado.')
+
+
+@click.command('alertas-recalcular')
+def alertas_recalcular():
+    """Recalcula o próximo disparo de todos os alertas (ex.: após mudar ALERTAS_FUSO)."""
+    import agenda
+    agenda.recalcular_todos()
+    click.echo('Próximos disparos recalculados.')
+
+
+@click.command('usuarios-acao')
+@click.argument('acao', type=click.Choice(['activate', 'deactivate', 'toggle', 'delete']))
+@click.option('--ids', help='Ids separados por vírgula')
+@click.option('--prefixo', help='Aplica a todos cujo --campo começa com este texto')
+@click.option('--campo', type=click.Choice(['nome', 'email', 'login']), default='nome')
+@click.option('--todos', is_flag=True, help='Aplica a todos os usuários (sem --ids nem --prefixo)')
+def usuarios_acao(acao, ids, prefixo, campo, todos):
+    """Ativa, desativa, inverte ou exclui usuários em lotes, com progresso."""
+    import acoes_usuarios
+    if not (ids or prefixo or todos):
+        raise click.UsageError('Informe --ids, --prefixo ou --todos.')
+    lista = [int(i) for i in ids.split(',')] if ids else None
+
+    with click.progressbar(length=0, label=f'{acao}') as barra:
+        def progresso(feitos, total):
+            barra.length = total
+            barra.update(feitos - barra.pos)
+        afetados = acoes_usuarios.executar(acao, ids=lista, termo=prefixo, campo=campo, progresso=progresso)
+    click.echo(f'{afetados} usuário(s) afetados.')
+
+
+@click.command('importacoes-retomar')
+def importacoes_retomar():
+    """Processa, neste processo, as importações que ficaram pela metade."""
+    import importacao
+    from app import MEASUREMENT_CONTEXT_LABELS
+    for job_id in importacao.pendentes():
+        importacao.processar(job_id, MEASUREMENT_CONTEXT_LABELS)
+        click.echo(f'Importação {job_id}: processada.')
+
+
+@click.command('estatisticas-recalcular')
+@click.option('--usuario', type=int, help='Só este usuário (padrão: todos)')
+def estatisticas_recalcular(usuario):
+    """Reconstrói a base das janelas de variabilidade e tempo na faixa a partir das medições."""
+    import estatisticas
+    estatisticas.recalcular(usuario)
+    click.echo('Estatísticas de glicemia recalculadas.')
+
+
+@click.command('tendencias-atualizar')
+def tendencias_atualizar():
+    """Ajusta, em lote, a tendência de peso de todos os usuários sem tendência em cache."""
+    import tendencias
+    click.echo(f'{tendencias.atualizar()} tendência(s) calculadas.')
+
+
+@click.command('ativos-construir')
+def ativos_construir():
+    """Gera static/dist/: arquivos com hash no nome, variantes .gz/.br e o service worker."""
+    import ativos
+    manifesto = ativos.construir(current_app.static_folder)
+    for nome, versionado in sorted(manifesto.items()):
+        click.echo(f'{nome} -> {versionado}')
+
+
+@click.command('senha-hash')
+@click.password_option('--senha', prompt='Senha')
+def senha_hash(senha):
+    """Imprime o hash scrypt de uma senha (ex.: para ADMIN_SENHA_HASH), com o custo configurado."""
+    import autenticacao
+    click.echo(autenticacao.gerar_hash(senha))
+
+
+@click.command('historico-arquivar')
+@click.option('--meses-quentes', type=int, help='Meses mantidos na tabela (padrão: ARQUIVO_MESES_QUENTES)')
+def historico_arquivar(meses_quentes):
+    """Move para arquivos Parquet mensais as linhas do histórico mais antigas que os meses quentes."""
+    import arquivo
+    try:
+        limite, por_tabela = arquivo.arquivar_historico(meses_quentes or current_app.config['ARQUIVO_MESES_QUENTES'])
+    except arquivo.ArquivamentoEmAndamento as e:
+        raise click.ClickException(str(e))
+    for tabela, movidas in por_tabela.items():
+        for mes, linhas in movidas.items():
+            click.echo(f'{tabela} {mes}: {linhas} linha(s) arquivadas.')
+        if not movidas:
+            click.echo(f'{tabela}: nada anterior a {limite:%Y-%m} para arquivar.')
+
+
+def registrar(app):
+    for comando in (criar_banco, alertas_recalcular, usuarios_acao, importacoes_retomar,
+                    estatisticas_recalcular, tendencias_atualizar, ativos_construir, senha_hash,
+                    historico_arquivar):
+        app.cli.add_command(comando)
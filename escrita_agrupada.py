@@ -0,0 +1,169 @@
+"""Escrita agrupada (group commit) para os POSTs de leituras.
+
+Com ESCRITA_AGRUPADA ligado, as rotas não fazem commit por requisição:
+entregam uma função de gravação a uma fila do worker e esperam. Uma thread
+por worker junta as gravações pendentes por até ESCRITA_ESPERA_MS (ou até
+ESCRITA_LOTE_MAX itens) e as grava numa única transação. A requisição só
+responde depois do commit do lote que a contém, então a confirmação ao
+cliente continua significando dado gravado.
+
+Se o commit do lote falhar, as gravações são refeitas uma a uma para que
+só a defeituosa receba o erro. Desligado, `gravar` executa e faz commit na
+hora, como antes.
+
+Se a espera estourar ESPERA_RESPOSTA, a gravação que ainda não entrou num
+lote é cancelada e feita na própria requisição; a que já entrou vai ser
+gravada pela thread, e `gravar` retorna False ("recebida, em gravação")
+em vez de um erro que levaria o usuário a reenviar e duplicar.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo que uma requisição espera pela gravação do seu lote (segundos)
+ESPERA_RESPOSTA = 30
+
+_filas = []
+
+
+class FilaDeEscrita:
+    def __init__(self, app, lote_max, espera_ms):
+        self.app = app
+        self.lote_max = lote_max
+        self.espera = espera_ms / 1000
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._encerrada = False
+
+    def enviar(self, gravacao):
+        """Agenda `gravacao` (função sem argumentos que usa db.session) e devolve um Future."""
+        futuro = Future()
+        with self._lock:
+            if self._encerrada:
+                raise RuntimeError('Fila de escrita encerrada.')
+            if self._thread is None:
+                # Criada sob demanda: com --preload, só nos workers, nunca no mestre
+                self._thread = threading.Thread(target=self._laco, name='escrita-agrupada', daemon=True)
+                self._thread.start()
+            self._fila.put((gravacao, futuro))
+        return futuro
+
+    def _proximo_lote(self):
+        item = self._fila.get()
+        if item is None:
+            return None
+        lote = [item]
+        limite = time.monotonic() + self.espera
+        while len(lote) < self.lote_max:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                item = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            if item is None:
+                # Encerramento: grava o que já chegou e devolve o sinal para a próxima volta
+                self._fila.put(None)
+                break
+            lote.append(item)
+        # Daqui em diante a requisição não cancela mais; as já canceladas (ver `gravar`) ficam de fora
+        return [(gravacao, futuro) for gravacao, futuro in lote if futuro.set_running_or_notify_cancel()]
+
+    def _laco(self):
+        while True:
+            lote = self._proximo_lote()
+            if lote is None:
+                return
+            if lote:
+                with self.app.app_context():
+                    self._gravar(lote)
+
+    def _gravar(self, lote):
+        try:
+            for gravacao, _ in lote:
+                gravacao()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(lote) > 1:
+                logger.warning('Lote de %d gravações falhou; refazendo uma a uma', len(lote))
+                for item in lote:
+                    self._gravar([item])
+                return
+            gravacao, futuro = lote[0]
+            if isinstance(e, IntegrityError):
+                # Repassada como veio: a rota pode tratá-la (ex.: client_id já gravado)
+                futuro.set_exception(e)
+                return
+            logger.exception('Falha na gravação agrupada')
+            futuro.set_exception(RuntimeError('Não foi possível gravar.'))
+            return
+        for _, futuro in lote:
+            futuro.set_result(True)
+
+    def drenar(self, timeout=None):
+        """Recusa novas gravações, grava as pendentes e encerra a thread."""
+        with self._lock:
+            self._encerrada = True
+            thread = self._thread
+        if thread is not None:
+            self._fila.put(None)
+            thread.join(timeout)
+
+
+def init_app(app):
+    """Cria a fila do app se ESCRITA_AGRUPADA estiver ligado."""
+    if not app.config.get('ESCRITA_AGRUPADA'):
+        return
+    fila = FilaDeEscrita(app, app.config.get('ESCRITA_LOTE_MAX', 200), app.config.get('ESCRITA_ESPERA_MS', 5))
+    app.extensions['escrita_agrupada'] = fila
+    _filas.append(fila)
+
+
+def gravar(app, gravacao):
+    """Executa `gravacao` e faz commit: em lote, se a fila estiver ativa, ou na hora.
+
+    Retorna True depois de o dado estar gravado; erros de gravação são
+    propagados. Retorna False se a espera estourou com a gravação já num lote:
+    ela foi recebida e ainda vai ser gravada, e a rota deve dizer isso ao
+    usuário (um reenvio duplicaria a leitura).
+    """
+    fila = app.extensions.get('escrita_agrupada')
+    if fila is None:
+        gravacao()
+        db.session.commit()
+        return True
+    futuro = fila.enviar(gravacao)
+    try:
+        return futuro.result(timeout=ESPERA_RESPOSTA)
+    except TimeoutError:
+        pass
+    if futuro.cancel():
+        # Cancelada antes de entrar num lote: nada foi gravado, grava na própria requisição
+        gravacao()
+        db.session.commit()
+        return True
+    try:
+        # O lote pode ter terminado entre a espera e o cancelamento
+        return futuro.result(timeout=0)
+    except TimeoutError:
+        logger.warning('Gravação agrupada ainda em andamento após %ss', ESPERA_RESPOSTA)
+        return False
+
+
+@atexit.register
+def drenar_todas(timeout=ESPERA_RESPOSTA):
+    """Chamado no worker_exit do gunicorn (ver gunicorn.conf.py) e na saída do processo."""
+    for fila in _filas:
+        fila.drenar(timeout)
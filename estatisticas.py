@@ -0,0 +1,131 @@
+"""Janelas móveis de 7/14/30 dias: média, desvio-padrão, CV e tempo na faixa.
+
+A base é a tabela glicemia_dia_faixa, mantida incrementalmente por
+rollups.registrar_medicao: por dia e contexto ela guarda quantidade, soma,
+soma dos quadrados e quantas leituras ficaram abaixo, dentro e acima da
+faixa alvo. Uma janela de 30 dias lê no máximo 30 linhas por contexto,
+qualquer que seja o tamanho do histórico, e todas as janelas e contextos
+são calculados de uma vez com NumPy.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import case, delete, func, insert, literal, select
+
+from models import db, GlicemiaDiaFaixa, Medicao
+
+JANELAS = (7, 14, 30)
+
+# Linha que reúne todas as leituras do dia, com ou sem contexto
+CONTEXTO_GERAL = 'geral'
+
+# Faixas alvo (mg/dL, inclusive) por momento da medição; leituras sem contexto e a linha geral usam FAIXA_GERAL
+FAIXA_GERAL = (70, 180)
+FAIXAS = {
+    'em_jejum': (80, 130),
+    'antes_refeicao': (80, 130),
+    '2h_pos_refeicao': (70, 180),
+    'antes_dormir': (90, 150),
+}
+
+
+def faixa(contexto):
+    return FAIXAS.get(contexto, FAIXA_GERAL)
+
+
+def classificar(valor, contexto):
+    """(abaixo, dentro, acima) como 0/1 para uma leitura."""
+    minimo, maximo = faixa(contexto)
+    return int(valor < minimo), int(minimo <= valor <= maximo), int(valor > maximo)
+
+
+def janelas(usuario_id, hoje=None):
+    """Estatísticas de cada janela terminando em `hoje`, por contexto.
+
+    Retorna {contexto: {dias: {...}}}; métricas sem leituras suficientes ficam None.
+    """
+    import numpy as np
+
+    hoje = hoje or date.today()
+    maior = max(JANELAS)
+    linhas = db.session.execute(
+        select(GlicemiaDiaFaixa.measurement_context, GlicemiaDiaFaixa.dia, GlicemiaDiaFaixa.quantidade,
+               GlicemiaDiaFaixa.soma, GlicemiaDiaFaixa.soma_quadrados, GlicemiaDiaFaixa.abaixo,
+               GlicemiaDiaFaixa.dentro, GlicemiaDiaFaixa.acima)
+        .where(GlicemiaDiaFaixa.usuario_id == usuario_id,
+               GlicemiaDiaFaixa.dia > hoje - timedelta(days=maior),
+               GlicemiaDiaFaixa.dia <= hoje)
+    ).all()
+    if not linhas:
+        return {}
+
+    contextos = sorted({l.measurement_context for l in linhas}, key=lambda c: (c != CONTEXTO_GERAL, c))
+    posicao = {c: i for i, c in enumerate(contextos)}
+    # dias[c, d, m]: métrica m do contexto c, d dias antes de hoje
+    dias = np.zeros((len(contextos), maior, 6))
+    np.add.at(
+        dias,
+        (np.array([posicao[l.measurement_context] for l in linhas]),
+         np.array([(hoje - l.dia).days for l in linhas])),
+        np.array([l[2:] for l in linhas], dtype=float),
+    )
+    # Soma acumulada a partir de hoje: o índice J-1 é o total da janela de J dias
+    totais = dias.cumsum(axis=1)[:, [j - 1 for j in JANELAS], :]
+    quantidade, soma, quadrados, abaixo, dentro, acima = np.moveaxis(totais, 2, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = soma / quantidade
+        variancia = np.clip((quadrados - quantidade * media ** 2) / (quantidade - 1), 0, None)
+        desvio = np.where(quantidade > 1, np.sqrt(variancia), np.nan)
+        metricas = {
+            'quantidade': quantidade,
+            'media': media,
+            'desvio': desvio,
+            'cv': desvio / media * 100,
+            'abaixo_pct': abaixo / quantidade * 100,
+            'dentro_pct': dentro / quantidade * 100,
+            'acima_pct': acima / quantidade * 100,
+        }
+
+    def valor(v):
+        return None if np.isnan(v) else round(float(v), 1)
+
+    return {
+        contexto: {
+            j: {nome: int(m[c, k]) if nome == 'quantidade' else valor(m[c, k]) for nome, m in metricas.items()}
+            for k, j in enumerate(JANELAS)
+        }
+        for c, contexto in enumerate(contextos)
+    }
+
+
+def recalcular(usuario_id=None):
+    """Reconstrói glicemia_dia_faixa a partir de medicoes com INSERT ... SELECT agrupado.
+
+    Necessário uma vez para o histórico anterior a esta tabela (ou após mudar FAIXAS).
+    """
+    filtro = [Medicao.usuario_id == usuario_id] if usuario_id is not None else []
+    tabela = GlicemiaDiaFaixa.__table__
+    db.session.execute(delete(tabela).where(*(
+        [tabela.c.usuario_id == usuario_id] if usuario_id is not None else [])))
+
+    nivel = Medicao.glucose_level
+    dia = func.date(Medicao.measured_at)
+    minimo_ctx = case({c: f[0] for c, f in FAIXAS.items()}, value=Medicao.measurement_context, else_=FAIXA_GERAL[0])
+    maximo_ctx = case({c: f[1] for c, f in FAIXAS.items()}, value=Medicao.measurement_context, else_=FAIXA_GERAL[1])
+
+    variantes = (
+        (Medicao.measurement_context, minimo_ctx, maximo_ctx, [Medicao.measurement_context.isnot(None)],
+         [Medicao.measurement_context]),
+        (literal(CONTEXTO_GERAL), FAIXA_GERAL[0], FAIXA_GERAL[1], [], []),
+    )
+    colunas = ['usuario_id', 'dia', 'measurement_context', 'quantidade', 'soma', 'minimo', 'maximo',
+               'soma_quadrados', 'abaixo', 'dentro', 'acima']
+    for contexto, minimo, maximo, onde, agrupar in variantes:
+        db.session.execute(insert(tabela).from_select(colunas, select(
+            Medicao.usuario_id, dia, contexto, func.count(), func.sum(nivel), func.min(nivel), func.max(nivel),
+            func.sum(nivel * nivel),
+            func.sum(case((nivel < minimo, 1), else_=0)),
+            func.sum(case((nivel.between(minimo, maximo), 1), else_=0)),
+            func.sum(case((nivel > maximo, 1), else_=0)),
+        ).where(*filtro, *onde).group_by(Medicao.usuario_id, dia, *agrupar)))
+    db.session.commit()
@@ -0,0 +1,146 @@
+"""Exportação do histórico de um usuário em CSV ou Parquet, em fluxo.
+
+As linhas saem de um cursor do lado do servidor (paginacao.iterar_em_fluxo),
+unidas aos meses já arquivados (arquivo.py), e são convertidas em pedaços
+pequenos; nada do histórico fica inteiro na memória do worker. Parquet
+exige o pacote opcional `pyarrow`.
+"""
+import csv
+import io
+from decimal import Decimal
+from itertools import islice
+
+from sqlalchemy import select
+
+import arquivo
+import paginacao
+from arquivo import ParquetIndisponivel
+from models import Atividade, Medicao, RegistroIMC
+
+# Linhas por pedaço de CSV enviado e por row group do Parquet
+LINHAS_POR_BLOCO_CSV = 1000
+LINHAS_POR_ROW_GROUP = 50000
+
+# tipo -> (colunas exportadas, tipo Parquet de cada coluna, chave de ordenação)
+FONTES = {
+    'imc': (
+        (RegistroIMC.data_registro, RegistroIMC.peso_atual, RegistroIMC.altura, RegistroIMC.imc),
+        ('timestamp', 'float', 'float', 'float'),
+        (RegistroIMC.data_registro, RegistroIMC.id),
+    ),
+    'glicemia': (
+        (Medicao.measured_at, Medicao.glucose_level, Medicao.measurement_context, Medicao.notes),
+        ('timestamp', 'float', 'string', 'string'),
+        (Medicao.measured_at, Medicao.id),
+    ),
+    'atividades': (
+        (Atividade.performed_at, Atividade.category, Atividade.duration_minutes),
+        ('timestamp', 'string', 'int'),
+        (Atividade.performed_at, Atividade.id),
+    ),
+}
+
+
+def consulta(tipo, usuario_id):
+    colunas, _, chave = FONTES[tipo]
+    modelo = chave[0].class_
+    return select(*colunas).where(modelo.usuario_id == usuario_id).order_by(*chave)
+
+
+def em_fluxo(tipo, usuario_id):
+    """Linhas de `consulta` em fluxo, somadas às já arquivadas (arquivo.py) quando a tabela tem arquivo."""
+    colunas, _, chave = FONTES[tipo]
+    tabela = chave[0].class_.__tablename__
+    if tabela not in arquivo.ARQUIVAVEIS:
+        return paginacao.iterar_em_fluxo(consulta(tipo, usuario_id))
+    # A união com o arquivo ordena pela chave inteira, que nem sempre é exportada
+    exportadas = {c.key for c in colunas}
+    extras = [c for c in chave if c.key not in exportadas]
+    quentes = paginacao.iterar_em_fluxo(consulta(tipo, usuario_id).add_columns(*extras))
+    unidas = arquivo.em_ordem(tabela, usuario_id, quentes, list(colunas) + extras)
+    return (linha[:len(colunas)] for linha in unidas)
+
+
+def _valor(v):
+    return float(v) if isinstance(v, Decimal) else v
+
+
+def linhas_csv(linhas):
+    """Texto CSV de uma sequência de linhas."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(linhas)
+    return buffer.getvalue()
+
+
+def cabecalho_csv(tipo):
+    return linhas_csv([[c.key for c in FONTES[tipo][0]]])
+
+
+def gerar_csv(tipo, usuario_id):
+    """Gera o CSV em pedaços de texto de até LINHAS_POR_BLOCO_CSV linhas."""
+    yield cabecalho_csv(tipo)
+    fluxo = em_fluxo(tipo, usuario_id)
+    while bloco := list(islice(fluxo, LINHAS_POR_BLOCO_CSV)):
+        yield linhas_csv(bloco)
+
+
+class _SaidaEmPedacos(io.RawIOBase):
+    """Arquivo só-escrita cujo conteúdo é recolhido (e descartado) a cada row group."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def drenar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def gerar_parquet(tipo, usuario_id):
+    """Gera o arquivo Parquet em pedaços de bytes, um row group por vez."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ParquetIndisponivel('Instale pyarrow para exportar em Parquet.')
+
+    colunas, tipos, _ = FONTES[tipo]
+    tipos_arrow = {'timestamp': pa.timestamp('us'), 'float': pa.float64(),
+                   'string': pa.string(), 'int': pa.int64()}
+    esquema = pa.schema([(c.key, tipos_arrow[t]) for c, t in zip(colunas, tipos)])
+
+    def gerar():
+        saida = _SaidaEmPedacos()
+        escritor = pq.ParquetWriter(saida, esquema)
+        valores = [[] for _ in colunas]
+
+        def gravar_row_group():
+            escritor.write_table(pa.table(valores, schema=esquema))
+            for lista in valores:
+                lista.clear()
+
+        for linha in em_fluxo(tipo, usuario_id):
+            for lista, v in zip(valores, linha):
+                lista.append(_valor(v))
+            if len(valores[0]) >= LINHAS_POR_ROW_GROUP:
+                gravar_row_group()
+                yield saida.drenar()
+        if valores[0]:
+            gravar_row_group()
+        escritor.close()
+        yield saida.drenar()
+
+    # A importação é verificada antes de a resposta começar a ser enviada
+    return gerar()
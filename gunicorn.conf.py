@@ -0,0 +1,14 @@
+"""Ganchos do gunicorn (lido automaticamente do diretório de trabalho).
+
+A produção roda no modo ASGI (uvicorn, ver asgi.py e render.yaml), que
+drena a escrita agrupada no lifespan. O gunicorn continua suportado para
+servir só o Flask (`gunicorn 'app:create_app()'`, como em
+benchmarks/bench_rotas.py --gunicorn); este gancho vale só para ele.
+"""
+
+
+def worker_exit(server, worker):
+    # Grava o que ainda estiver na fila de escrita agrupada antes de o worker sair
+    import escrita_agrupada
+
+    escrita_agrupada.drenar_todas()
@@ -0,0 +1,221 @@
+"""Importação de histórico (glicemia ou IMC) a partir de CSV, em segundo plano.
+
+O upload é salvo em disco e vira um job em ImportacaoHistorico; um pool de
+threads do próprio worker lê o arquivo em lotes, descarta leituras que o
+usuário já tem no mesmo horário e insere o restante. Cada lote é gravado na
+mesma transação que o progresso do job, então um job interrompido (ex.:
+worker reiniciado) pode ser retomado com `flask importacoes-retomar`.
+"""
+import csv
+import itertools
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+import arquivo
+import ingestao
+import rollups
+import tendencias
+from models import db, ImportacaoHistorico, Medicao, RegistroIMC
+
+logger = logging.getLogger(__name__)
+
+# Linhas do CSV por transação
+LINHAS_POR_LOTE = 5000
+
+# Formatos de data aceitos além de ISO 8601 (exportações comuns de glicosímetros)
+FORMATOS_DATA = ('%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y')
+
+# Faixa aceita para glicemia, a mesma do formulário de medições
+GLICEMIA_MIN, GLICEMIA_MAX = 20, 600
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ArquivoInvalido(ValueError):
+    """O CSV enviado não tem as colunas esperadas para o tipo de importação."""
+
+
+def _ler_data(valor):
+    valor = (valor or '').strip()
+    try:
+        # ISO com deslocamento vira UTC, como em /imc/batch: a mesma leitura deduplica pelas duas entradas
+        data = ingestao.data_utc(valor)
+    except ValueError:
+        for formato in FORMATOS_DATA:
+            try:
+                data = datetime.strptime(valor, formato)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(valor)
+    # O MySQL não guarda frações de segundo: a deduplicação compara no mesmo grão
+    return data.replace(microsecond=0)
+
+
+def _ler_glicemia(linha, contextos):
+    nivel = float(linha['glucose_level'].replace(',', '.'))
+    if not GLICEMIA_MIN <= nivel <= GLICEMIA_MAX:
+        raise ValueError(nivel)
+    contexto = (linha.get('measurement_context') or '').strip() or None
+    if contexto is not None and contextos and contexto not in contextos:
+        raise ValueError(contexto)
+    notas = (linha.get('notes') or '').strip() or None
+    return {'glucose_level': round(nivel, 1), 'measurement_context': contexto, 'notes': notas}
+
+
+def _ler_imc(linha, contextos):
+    peso = float(linha['peso_atual'].replace(',', '.'))
+    altura = float(linha['altura'].replace(',', '.'))
+    if not (ingestao.PESO_MIN <= peso <= ingestao.PESO_MAX
+            and ingestao.ALTURA_MIN <= altura <= ingestao.ALTURA_MAX):
+        raise ValueError(peso, altura)
+    return {'peso_atual': round(peso, 2), 'altura': round(altura, 2), 'imc': round(peso / altura ** 2, 2)}
+
+
+def _rollups_glicemia(usuario_id, linhas):
+    rollups.registrar_medicoes(usuario_id, [
+        (l['glucose_level'], l['measured_at'], l['measurement_context']) for l in linhas
+    ])
+
+
+def _invalidar_tendencia(usuario_id, linhas):
+    tendencias.invalidar([usuario_id])
+
+
+# tipo -> (modelo, coluna de data, colunas obrigatórias no CSV, leitor de linha, ação após inserir)
+TIPOS = {
+    'glicemia': (Medicao, Medicao.measured_at, {'measured_at', 'glucose_level'}, _ler_glicemia, _rollups_glicemia),
+    'imc': (RegistroIMC, RegistroIMC.data_registro, {'data_registro', 'peso_atual', 'altura'}, _ler_imc,
+            _invalidar_tendencia),
+}
+
+
+def _importar_lote(job, linhas, contextos):
+    """Valida, deduplica e insere um lote; atualiza os contadores do job (sem commit)."""
+    modelo, coluna_data, _, ler, depois = TIPOS[job.tipo]
+    novas = {}
+    invalidas = 0
+    for linha in linhas:
+        try:
+            quando = _ler_data(linha[coluna_data.key])
+            valores = ler(linha, contextos)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            invalidas += 1
+            continue
+        # A primeira leitura de cada horário vence, inclusive dentro do próprio arquivo
+        novas.setdefault(quando, dict(valores, usuario_id=job.usuario_id, **{coluna_data.key: quando}))
+
+    if novas:
+        existentes = set(db.session.execute(
+            select(coluna_data).where(modelo.usuario_id == job.usuario_id, coluna_data.in_(list(novas)))
+        ).scalars())
+        if modelo.__tablename__ in arquivo.ARQUIVAVEIS:
+            existentes |= arquivo.datas_arquivadas(modelo.__tablename__, job.usuario_id, list(novas))
+        for quando in existentes:
+            novas.pop(quando, None)
+    if novas:
+        db.session.execute(insert(modelo), list(novas.values()))
+        if depois:
+            depois(job.usuario_id, novas.values())
+
+    job.linhas_lidas += len(linhas)
+    job.inseridas += len(novas)
+    job.invalidas += invalidas
+    job.duplicadas += len(linhas) - invalidas - len(novas)
+
+
+def processar(job_id, contextos=()):
+    """Executa (ou retoma a partir de `linhas_lidas`) o job de importação.
+
+    `contextos` são os slugs de measurement_context aceitos (vazio aceita qualquer um).
+    """
+    job = db.session.get(ImportacaoHistorico, job_id)
+    if job is None or job.status == 'concluida':
+        return
+    job.status = 'processando'
+    db.session.commit()
+
+    try:
+        with open(job.arquivo, newline='', encoding='utf-8-sig') as arquivo:
+            leitor = csv.DictReader(arquivo)
+            faltando = TIPOS[job.tipo][2] - set(leitor.fieldnames or ())
+            if faltando:
+                raise ArquivoInvalido('Colunas ausentes no CSV: ' + ', '.join(sorted(faltando)))
+            restantes = itertools.islice(leitor, job.linhas_lidas, None)
+            while True:
+                lote = list(itertools.islice(restantes, LINHAS_POR_LOTE))
+                if not lote:
+                    break
+                _importar_lote(job, lote, contextos)
+                db.session.commit()
+        job.status = 'concluida'
+        db.session.commit()
+        os.remove(job.arquivo)
+    except Exception as e:
+        if not isinstance(e, ArquivoInvalido):
+            logger.exception('Falha na importação %s', job_id)
+        db.session.rollback()
+        job = db.session.get(ImportacaoHistorico, job_id)
+        job.status = 'falhou'
+        job.erro = str(e)
+        db.session.commit()
+
+
+def _executar_no_app(app, job_id, contextos):
+    with app.app_context():
+        processar(job_id, contextos)
+
+
+def _obter_pool(app):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=app.config['IMPORTACAO_WORKERS'],
+                                       thread_name_prefix='importacao')
+        return _pool
+
+
+def iniciar(app, usuario_id, tipo, arquivo_enviado, contextos=()):
+    """Salva o upload, cria o job e o agenda no pool; retorna o job sem esperar."""
+    if tipo not in TIPOS:
+        raise ArquivoInvalido(f'Tipo de importação desconhecido: {tipo}')
+    pasta = app.config['IMPORTACAO_DIR']
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f'{uuid.uuid4().hex}.csv')
+    arquivo_enviado.save(caminho)
+
+    job = ImportacaoHistorico(usuario_id=usuario_id, tipo=tipo, arquivo=caminho)
+    db.session.add(job)
+    db.session.commit()
+    _obter_pool(app).submit(_executar_no_app, app, job.id, contextos)
+    return job
+
+
+def situacao(job):
+    return {
+        'id': job.id,
+        'tipo': job.tipo,
+        'status': job.status,
+        'linhas_lidas': job.linhas_lidas,
+        'inseridas': job.inseridas,
+        'duplicadas': job.duplicadas,
+        'invalidas': job.invalidas,
+        'erro': job.erro,
+    }
+
+
+def pendentes():
+    """Jobs que não terminaram (ex.: o worker foi reiniciado no meio)."""
+    return db.session.execute(
+        select(ImportacaoHistorico.id)
+        .where(ImportacaoHistorico.status.in_(('pendente', 'processando')))
+        .order_by(ImportacaoHistorico.id)
+    ).scalars().all()
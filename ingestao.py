@@ -0,0 +1,128 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+
+import tendencias
+from models import db, Usuario, RegistroIMC
+
+# Quantidade máxima de leituras aceitas por requisição e tamanho de cada INSERT (todos na mesma transação)
+MAX_LOTE = 10000
+TAMANHO_CHUNK = 1000
+
+# Faixas plausíveis (também respeitam Numeric(5, 2) das colunas)
+PESO_MIN, PESO_MAX = 1, 500
+ALTURA_MIN, ALTURA_MAX = 0.3, 2.8
+
+
+class LoteInvalido(ValueError):
+    """O corpo da requisição não pôde ser lido como lote de leituras."""
+
+
+def ler_lote(corpo, content_type):
+    """Converte o corpo (JSON array ou CSV com cabeçalho) em lista de dicts."""
+    if content_type.startswith('text/csv'):
+        try:
+            texto = corpo.decode('utf-8-sig') if isinstance(corpo, bytes) else corpo
+            leitor = csv.DictReader(io.StringIO(texto))
+            if not leitor.fieldnames or not {'usuario_id', 'peso_atual', 'altura'} <= set(leitor.fieldnames):
+                raise LoteInvalido('O CSV deve ter as colunas usuario_id, peso_atual e altura.')
+            linhas = list(leitor)
+        except UnicodeDecodeError:
+            # Ex.: exportação do Excel em Latin-1
+            raise LoteInvalido('O CSV deve estar em UTF-8.')
+        except csv.Error as e:
+            raise LoteInvalido(f'CSV malformado: {e}')
+    else:
+        linhas = corpo
+        if not isinstance(linhas, list):
+            raise LoteInvalido('Envie um array JSON de leituras ou um CSV.')
+    if len(linhas) > MAX_LOTE:
+        raise LoteInvalido(f'O lote aceita no máximo {MAX_LOTE} leituras.')
+    return linhas
+
+
+def data_utc(valor):
+    """ISO 8601 em UTC sem fuso, como data_registro; um deslocamento informado é convertido.
+
+    Levanta ValueError se `valor` não for ISO 8601. Também usada pela importação
+    de CSV, para que as duas entradas gravem a mesma leitura no mesmo horário.
+    """
+    data = datetime.fromisoformat(str(valor).strip().replace('Z', '+00:00'))
+    if data.tzinfo is not None:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return data
+
+
+def _ler_data(valor):
+    return data_utc(valor) if valor else datetime.utcnow()
+
+
+def registrar_lote_imc(linhas):
+    """Valida, calcula o IMC em uma única passada vetorizada e insere por chunks.
+
+    Linhas inválidas são relatadas em `erros` sem interromper o restante do
+    lote. Toda a validação acontece antes do primeiro INSERT e os chunks vão
+    numa só transação: ou o lote válido inteiro é gravado, ou nada.
+    """
+    # Importado aqui para não pesar no import do app (só esta rota usa numpy)
+    import numpy as np
+
+    erros = []
+    indices, usuarios, pesos, alturas, datas = [], [], [], [], []
+
+    for i, linha in enumerate(linhas):
+        try:
+            campos = (int(linha['usuario_id']), float(linha['peso_atual']),
+                      float(linha['altura']), _ler_data(linha.get('data_registro')))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            erros.append({'linha': i, 'erro': 'Campos usuario_id, peso_atual e altura são obrigatórios e numéricos.'})
+            continue
+        indices.append(i)
+        usuarios.append(campos[0])
+        pesos.append(campos[1])
+        alturas.append(campos[2])
+        datas.append(campos[3])
+
+    peso = np.asarray(pesos, dtype=float)
+    altura = np.asarray(alturas, dtype=float)
+    usuario = np.asarray(usuarios, dtype=np.int64)
+
+    validos = (peso >= PESO_MIN) & (peso <= PESO_MAX) & (altura >= ALTURA_MIN) & (altura <= ALTURA_MAX)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        imc = np.round(peso / (altura * altura), 2)
+
+    existentes = set()
+    if usuario.size:
+        ids = [int(u) for u in np.unique(usuario)]
+        existentes = set(db.session.scalars(select(Usuario.id).where(Usuario.id.in_(ids))))
+    validos &= np.isin(usuario, list(existentes))
+
+    linhas_ok = []
+    for pos in range(len(indices)):
+        if not validos[pos]:
+            motivo = ('Usuário inexistente.' if int(usuario[pos]) not in existentes
+                      else 'Peso ou altura fora da faixa permitida.')
+            erros.append({'linha': indices[pos], 'erro': motivo})
+            continue
+        linhas_ok.append({
+            'usuario_id': int(usuario[pos]),
+            'peso_atual': round(float(peso[pos]), 2),
+            'altura': round(float(altura[pos]), 2),
+            'imc': float(imc[pos]),
+            'data_registro': datas[pos],
+        })
+
+    if linhas_ok:
+        try:
+            for inicio in range(0, len(linhas_ok), TAMANHO_CHUNK):
+                db.session.execute(insert(RegistroIMC), linhas_ok[inicio:inicio + TAMANHO_CHUNK])
+            tendencias.invalidar({l['usuario_id'] for l in linhas_ok})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    erros.sort(key=lambda e: e['linha'])
+    return {'inseridos': len(linhas_ok), 'erros': erros}
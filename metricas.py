@@ -0,0 +1,174 @@
+"""Instrumentação por requisição: latência, SQL e renderização de templates.
+
+As métricas ficam na memória de cada worker do gunicorn e são expostas no
+formato texto do Prometheus por /admin/metrics (cada coleta vê o worker que
+atendeu a requisição; o label `pid` permite separar os workers).
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Limites (segundos) dos buckets de latência e contagens de consultas por requisição
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, labels):
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{labels},le="{limite}"}} {acumulado}'
+        yield f'{nome}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f'{nome}_sum{{{labels}}} {self.soma:.6f}'
+        yield f'{nome}_count{{{labels}}} {self.total}'
+
+
+class Registro:
+    """Métricas acumuladas do processo, protegidas por lock (workers gthread)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencia = {}
+        self.consultas = {}
+        self.tempo_sql = {}
+        self.templates = {}
+        self.respostas = {}
+
+    def registrar_requisicao(self, rota, metodo, status, duracao, consultas, tempo_sql):
+        chave = (rota, metodo)
+        with self._lock:
+            self.latencia.setdefault(chave, Histograma(BUCKETS_LATENCIA)).observar(duracao)
+            self.consultas.setdefault(chave, Histograma(BUCKETS_CONSULTAS)).observar(consultas)
+            self.tempo_sql[chave] = self.tempo_sql.get(chave, 0.0) + tempo_sql
+            self.respostas[chave + (status,)] = self.respostas.get(chave + (status,), 0) + 1
+
+    def registrar_template(self, nome, duracao):
+        with self._lock:
+            self.templates.setdefault(nome, Histograma(BUCKETS_LATENCIA)).observar(duracao)
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        pid = os.getpid()
+        saida = []
+        with self._lock:
+            saida.append('# HELP cuidabem_request_duration_seconds Latência das requisições por rota.')
+            saida.append('# TYPE cuidabem_request_duration_seconds histogram')
+            for (rota, metodo), h in sorted(self.latencia.items()):
+                saida.extend(h.linhas('cuidabem_request_duration_seconds',
+                                      f'pid="{pid}",route="{rota}",method="{metodo}"'))
+
+            saida.append('# HELP cuidabem_requests_total Requisições atendidas por rota e status.')
+            saida.append('# TYPE cuidabem_requests_total counter')
+            for (rota, metodo, status), total in sorted(self.respostas.items()):
+                saida.append(f'cuidabem_requests_total{{pid="{pid}",route="{rota}",method="{metodo}",'
+                             f'status="{status}"}} {total}')
+
+            saida.append('# HELP cuidabem_sql_queries_per_request Consultas SQL executadas por requisição.')
+            saida.append('# TYPE cuidabem_sql_queries_per_request histogram')
+            for (rota, metodo), h in sorted(self.consultas.items()):
+                saida.extend(h.linhas('cuidabem_sql_queries_per_request',
+                                      f'pid="{pid}",route="{rota}",method="{metodo}"'))
+
+            saida.append('# HELP cuidabem_sql_duration_seconds_total Tempo total gasto em SQL por rota.')
+            saida.append('# TYPE cuidabem_sql_duration_seconds_total counter')
+            for (rota, metodo), total in sorted(self.tempo_sql.items()):
+                saida.append(f'cuidabem_sql_duration_seconds_total{{pid="{pid}",route="{rota}",'
+                             f'method="{metodo}"}} {total:.6f}')
+
+            saida.append('# HELP cuidabem_template_render_seconds Tempo de renderização por template.')
+            saida.append('# TYPE cuidabem_template_render_seconds histogram')
+            for nome, h in sorted(self.templates.items()):
+                saida.extend(h.linhas('cuidabem_template_render_seconds', f'pid="{pid}",template="{nome}"'))
+        return '\n'.join(saida) + '\n'
+
+
+registro = Registro()
+
+
+# -----------------------
+# GANCHOS DO SQLALCHEMY E DO FLASK
+# -----------------------
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('inicio_sql', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    duracao = time.perf_counter() - conn.info['inicio_sql'].pop()
+    if has_request_context() and 'metricas' in g:
+        dados = g.metricas
+    else:
+        # Rotas assíncronas (asgi.py) associam as métricas à conexão enquanto a usam
+        dados = conn.info.get('metricas')
+    if dados is not None:
+        dados['tempo_sql'] += duracao
+        dados['consultas'].append((statement, duracao))
+
+
+def _antes_template(app, template, context, **extra):
+    if has_request_context() and 'metricas' in g:
+        g.metricas['inicio_template'] = time.perf_counter()
+
+
+def _depois_template(app, template, context, **extra):
+    if has_request_context() and 'metricas' in g and 'inicio_template' in g.metricas:
+        registro.registrar_template(template.name, time.perf_counter() - g.metricas.pop('inicio_template'))
+
+
+def iniciar():
+    """Métricas de uma requisição que começa agora."""
+    return {'inicio': time.perf_counter(), 'tempo_sql': 0.0, 'consultas': []}
+
+
+def finalizar(dados, rota, metodo, status, caminho, limite_lento=0):
+    """Registra a requisição medida por `dados` e, acima de `limite_lento` ms, loga as consultas."""
+    duracao = time.perf_counter() - dados['inicio']
+    registro.registrar_requisicao(rota, metodo, status, duracao, len(dados['consultas']), dados['tempo_sql'])
+
+    if limite_lento and duracao * 1000 >= limite_lento:
+        consultas = '\n'.join(f'  {d * 1000:8.2f} ms  {sql}' for sql, d in dados['consultas'])
+        logger.warning('Requisição lenta: %s %s %.1f ms, %d consultas (%.1f ms em SQL)\n%s',
+                       metodo, caminho, duracao * 1000, len(dados['consultas']),
+                       dados['tempo_sql'] * 1000, consultas)
+
+
+def init_app(app):
+    """Liga a instrumentação ao app. SLOW_REQUEST_MS > 0 ativa o log de requisições lentas."""
+    limite_lento = app.config.get('SLOW_REQUEST_MS', 0)
+
+    @app.before_request
+    def _iniciar():
+        g.metricas = iniciar()
+
+    @app.after_request
+    def _finalizar(resposta):
+        dados = g.pop('metricas', None)
+        if dados is None:
+            return resposta
+        rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+        finalizar(dados, rota, request.method, resposta.status_code, request.full_path, limite_lento)
+        return resposta
+
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_depois_template, app)
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
-db = SQLAlchemy()
+from banco import SessaoRoteada
+
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 # -----------------------
 # TABELA DE USUÁRIOS
@@ -20,10 +22,18 @@ class Usuario(db.Model):
     data_nascimento = db.Column(db.Date)
     sexo = db.Column(db.Enum('Masculino', 'Feminino', 'Outro'))
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    ativo = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    # Incrementada a cada gravação nos alertas do usuário: ETag e id do fluxo SSE (ver alertas.py)
+    alertas_versao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     metas = db.relationship('Meta', back_populates='usuario', cascade='all, delete')
     registros_imc = db.relationship('RegistroIMC', back_populates='usuario', cascade='all, delete')
 
+    # email e login já têm índice pela restrição unique; nome é usado na busca por prefixo
+    __table_args__ = (
+        db.Index('ix_usuarios_nome', 'nome'),
+    )
+
     def __repr__(self):
         return f'<Usuario {self.nome}>'
 
@@ -41,6 +51,10 @@ class Meta(db.Model):
 
     usuario = db.relationship('Usuario', back_populates='metas')
 
+    __table_args__ = (
+        db.Index('ix_metas_usuario_data', 'usuario_id', 'data_meta'),
+    )
+
     def __repr__(self):
         return f'<Meta Usuario={self.usuario_id} PesoDesejado={self.peso_desejado}>'
 
@@ -59,10 +73,276 @@ class RegistroIMC(db.Model):
 
     usuario = db.relationship('Usuario', back_populates='registros_imc')
 
+    # O id no fim do índice torna a ordenação (data_registro, id) totalmente
+    # resolvida pelo índice, tanto no histórico paginado quanto no "último registro".
+    __table_args__ = (
+        db.Index('ix_registros_imc_usuario_data', 'usuario_id', 'data_registro', 'id'),
+    )
+
     def calcular_imc(self):
         """Calcula o IMC com base no peso e altura"""
         if self.altura and self.peso_atual:
             self.imc = round(float(self.peso_atual) / (float(self.altura) * float(self.altura)), 2)
 
+    @classmethod
+    def ultimo_id(cls, usuario_id):
+        """Subconsulta com o id do registro mais recente (recebe valor ou Usuario.id)."""
+        return (db.select(cls.id)
+                .where(cls.usuario_id == usuario_id)
+                .order_by(cls.data_registro.desc(), cls.id.desc())
+                .limit(1)
+                .correlate(Usuario)
+                .scalar_subquery())
+
+    @classmethod
+    def ultimo_de(cls, usuario_id):
+        """Registro mais recente do usuário, lido pelo índice (usuario_id, data_registro, id)."""
+        return cls.query.filter(cls.id == cls.ultimo_id(usuario_id)).first()
+
+    @classmethod
+    def ultimos_por_usuario(cls, usuario_ids):
+        """Registro mais recente de cada usuário: uma busca no índice por usuário."""
+        ultimos = db.select(cls.ultimo_id(Usuario.id)).where(Usuario.id.in_(usuario_ids))
+        return cls.query.filter(cls.id.in_(ultimos)).all()
+
     def __repr__(self):
         return f'<RegistroIMC Usuario={self.usuario_id} IMC={self.imc}>'
+
+# -----------------------
+# TABELA DE MEDIÇÕES DE GLICEMIA
+# -----------------------
+class Medicao(db.Model):
+    __tablename__ = 'medicoes'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    glucose_level = db.Column(db.Numeric(5, 1), nullable=False)
+    measurement_context = db.Column(db.String(20))
+    notes = db.Column(db.Text)
+    measured_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Id gerado no aparelho (fila offline do service worker): reenviar não duplica a leitura
+    client_id = db.Column(db.String(36))
+
+    __table_args__ = (
+        db.Index('ix_medicoes_usuario_data', 'usuario_id', 'measured_at'),
+        db.Index('ux_medicoes_usuario_cliente', 'usuario_id', 'client_id', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<Medicao Usuario={self.usuario_id} Nivel={self.glucose_level}>'
+
+# -----------------------
+# TABELA DE ALERTAS (lembretes)
+# -----------------------
+SLUGS_DIAS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')  # mesma ordem de datetime.weekday()
+DIAS_POR_MASCARA = tuple(
+    tuple(slug for bit, slug in enumerate(SLUGS_DIAS) if mascara & (1 << bit)) for mascara in range(128)
+)
+
+
+def mascara_de_dias(slugs):
+    return sum(1 << bit for bit, slug in enumerate(SLUGS_DIAS) if slug in slugs)
+
+
+class Alerta(db.Model):
+    __tablename__ = 'alertas'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    alert_type = db.Column(db.String(20), nullable=False)
+    alert_time = db.Column(db.String(5), nullable=False)  # HH:MM, no fuso do usuário
+    dias_mask = db.Column(db.SmallInteger, nullable=False, default=0)  # bit 0 = segunda ... bit 6 = domingo
+    alert_date = db.Column(db.Date)
+    # Próximo disparo em UTC, mantido por agenda.py; nulo quando não há mais disparos
+    proximo_disparo = db.Column(db.DateTime, index=True)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def dias(self):
+        """Slugs dos dias da semana (ex.: ('mon', 'wed'))."""
+        return DIAS_POR_MASCARA[self.dias_mask or 0]
+
+    @property
+    def days(self):
+        """Dias no formato 'mon,wed' usado pelos templates."""
+        return ','.join(self.dias)
+
+    def __repr__(self):
+        return f'<Alerta Usuario={self.usuario_id} Tipo={self.alert_type} Hora={self.alert_time}>'
+
+# -----------------------
+# TABELA DE ATIVIDADES FÍSICAS
+# -----------------------
+class Atividade(db.Model):
+    __tablename__ = 'atividades'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    category = db.Column(db.String(20), nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    performed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Ver Medicao.client_id
+    client_id = db.Column(db.String(36))
+
+    __table_args__ = (
+        db.Index('ix_atividades_usuario_data', 'usuario_id', 'performed_at'),
+        db.Index('ux_atividades_usuario_cliente', 'usuario_id', 'client_id', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<Atividade Usuario={self.usuario_id} Categoria={self.category}>'
+
+# -----------------------
+# RESUMO MENSAL DE ATIVIDADES (ver resumo_atividades.py)
+# -----------------------
+class ResumoAtividadeMes(db.Model):
+    __tablename__ = 'resumo_atividades_mes'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    mes = db.Column(db.String(7), primary_key=True)  # formato YYYY-MM
+    # Meses passados ficam fechados: o resumo nunca mais é reagregado
+    fechado = db.Column(db.Boolean, nullable=False, default=False)
+    por_categoria = db.Column(db.JSON, nullable=False, default=dict)  # {slug: [quantidade, minutos]}
+    por_dia = db.Column(db.JSON, nullable=False, default=dict)  # {YYYY-MM-DD: minutos}
+
+    def __repr__(self):
+        return f'<ResumoAtividadeMes Usuario={self.usuario_id} Mes={self.mes}>'
+
+# -----------------------
+# AGREGADOS DE GLICEMIA (atualizados a cada medição, ver rollups.py)
+# -----------------------
+class AgregadoGlicemiaMixin:
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    soma = db.Column(db.Float, nullable=False, default=0)
+    minimo = db.Column(db.Float)
+    maximo = db.Column(db.Float)
+
+    @property
+    def media(self):
+        return self.soma / self.quantidade if self.quantidade else None
+
+
+class GlicemiaDiaria(AgregadoGlicemiaMixin, db.Model):
+    __tablename__ = 'glicemia_diaria'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+
+    def __repr__(self):
+        return f'<GlicemiaDiaria Usuario={self.usuario_id} Dia={self.dia}>'
+
+
+class GlicemiaMensal(AgregadoGlicemiaMixin, db.Model):
+    __tablename__ = 'glicemia_mensal'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    mes = db.Column(db.String(7), primary_key=True)  # formato YYYY-MM
+
+    def __repr__(self):
+        return f'<GlicemiaMensal Usuario={self.usuario_id} Mes={self.mes}>'
+
+
+class GlicemiaContexto(AgregadoGlicemiaMixin, db.Model):
+    __tablename__ = 'glicemia_contexto'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    mes = db.Column(db.String(7), primary_key=True)
+    measurement_context = db.Column(db.String(20), primary_key=True)
+
+    def __repr__(self):
+        return f'<GlicemiaContexto Usuario={self.usuario_id} Mes={self.mes} Contexto={self.measurement_context}>'
+
+class GlicemiaDiaFaixa(AgregadoGlicemiaMixin, db.Model):
+    """Por dia e contexto: base das janelas móveis de variabilidade e tempo na faixa (ver estatisticas.py)."""
+    __tablename__ = 'glicemia_dia_faixa'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    # Slug de MEASUREMENT_CONTEXTS, ou 'geral' para todas as leituras do dia
+    measurement_context = db.Column(db.String(20), primary_key=True)
+    soma_quadrados = db.Column(db.Float, nullable=False, default=0)
+    abaixo = db.Column(db.Integer, nullable=False, default=0)
+    dentro = db.Column(db.Integer, nullable=False, default=0)
+    acima = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<GlicemiaDiaFaixa Usuario={self.usuario_id} Dia={self.dia} Contexto={self.measurement_context}>'
+
+# -----------------------
+# TENDÊNCIA DE PESO EM CACHE (ver tendencias.py)
+# -----------------------
+class TendenciaPeso(db.Model):
+    __tablename__ = 'tendencias_peso'
+
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False)
+    inclinacao = db.Column(db.Float)  # kg/dia; None com menos de dois dias distintos
+    peso_ajustado = db.Column(db.Float, nullable=False)  # valor da reta na data do último registro
+    ultimo_peso = db.Column(db.Float, nullable=False)
+    ultima_data = db.Column(db.DateTime, nullable=False)
+    calculado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TendenciaPeso Usuario={self.usuario_id} Inclinacao={self.inclinacao}>'
+
+# -----------------------
+# IMPORTAÇÕES DE HISTÓRICO EM SEGUNDO PLANO (ver importacao.py)
+# -----------------------
+class ImportacaoHistorico(db.Model):
+    __tablename__ = 'importacoes_historico'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False, index=True)
+    tipo = db.Column(db.String(20), nullable=False)  # glicemia ou imc
+    arquivo = db.Column(db.String(255), nullable=False)  # CSV salvo no upload
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente/processando/concluida/falhou
+    # Gravados na mesma transação de cada lote: permitem retomar do ponto em que parou
+    linhas_lidas = db.Column(db.Integer, nullable=False, default=0)
+    inseridas = db.Column(db.Integer, nullable=False, default=0)
+    duplicadas = db.Column(db.Integer, nullable=False, default=0)
+    invalidas = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImportacaoHistorico {self.id} Usuario={self.usuario_id} Status={self.status}>'
+
+
+def adicionar_colunas(bind):
+    """Adiciona a tabelas já existentes as colunas declaradas que faltam.
+
+    Assim como `criar_indices`, cobre o que `create_all` não faz em bancos
+    existentes. Colunas NOT NULL precisam de `server_default`.
+    """
+    inspetor = db.inspect(bind)
+    with bind.begin() as conn:
+        for tabela in db.metadata.sorted_tables:
+            if not inspetor.has_table(tabela.name):
+                continue
+            existentes = {c['name'] for c in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in existentes:
+                    continue
+                ddl = f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {coluna.type.compile(bind.dialect)}'
+                if coluna.server_default is not None:
+                    padrao = coluna.server_default.arg
+                    if not isinstance(padrao, str):
+                        padrao = padrao.compile(dialect=bind.dialect)
+                    else:
+                        padrao = f"'{padrao}'"
+                    ddl += f' DEFAULT {padrao}'
+                if not coluna.nullable:
+                    ddl += ' NOT NULL'
+                conn.execute(db.text(ddl))
+
+
+def criar_indices(bind):
+    """Cria índices declarados que ainda não existem em tabelas já criadas.
+
+    `create_all` só cria índices junto com a tabela; bancos existentes
+    precisam deste passo para receber índices novos.
+    """
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(bind, checkfirst=True)
@@ -0,0 +1,83 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import db
+
+# Limites de página aceitos pelas rotas paginadas
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+
+class CursorInvalido(ValueError):
+    """Cursor recebido do cliente não pôde ser decodificado."""
+
+
+def codificar_cursor(*valores):
+    """Gera um cursor opaco (base64 url-safe) a partir da chave da última linha."""
+    bruto = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, *tipos):
+    """Reverte `codificar_cursor`, convertendo cada posição com o tipo informado."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(bruto)
+        if len(valores) != len(tipos):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(v) if tipo is datetime else tipo(v)
+            for v, tipo in zip(valores, tipos)
+        )
+    except (ValueError, TypeError):
+        raise CursorInvalido(cursor)
+
+
+def ler_limite(valor):
+    """Converte o parâmetro `limit` da query string respeitando os limites."""
+    try:
+        limite = int(valor) if valor else LIMITE_PADRAO
+    except ValueError:
+        limite = LIMITE_PADRAO
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def consulta_keyset(stmt, colunas_chave, apos=None, limite=LIMITE_PADRAO):
+    """`stmt` ordenado por `colunas_chave` a partir da chave `apos`, com uma linha a mais.
+
+    A linha extra serve apenas para saber se existe próxima página (ver `fatiar_pagina`).
+    """
+    if apos is not None:
+        stmt = stmt.where(tuple_(*colunas_chave) > tuple_(*apos))
+    return stmt.order_by(*colunas_chave).limit(limite + 1)
+
+
+def fatiar_pagina(linhas, colunas_chave, limite):
+    """(linhas da página, proxima_chave) a partir do resultado de `consulta_keyset`."""
+    if len(linhas) <= limite:
+        return linhas, None
+    linhas = linhas[:limite]
+    ultima = linhas[-1]
+    return linhas, tuple(getattr(ultima, c.key) for c in colunas_chave)
+
+
+def pagina_keyset(stmt, colunas_chave, apos=None, limite=LIMITE_PADRAO):
+    """Executa `stmt` ordenado por `colunas_chave` a partir da chave `apos`.
+
+    Retorna (linhas, proxima_chave); proxima_chave é None na última página.
+    """
+    linhas = db.session.execute(consulta_keyset(stmt, colunas_chave, apos, limite)).all()
+    return fatiar_pagina(linhas, colunas_chave, limite)
+
+
+def iterar_em_fluxo(stmt, lote=1000):
+    """Itera as linhas de `stmt` via cursor do lado do servidor, em lotes."""
+    resultado = db.session.execute(stmt.execution_options(stream_results=True, yield_per=lote))
+    try:
+        for linha in resultado:
+            yield linha
+    finally:
+        resultado.close()
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Atividade, ResumoAtividadeMes
+
+
+def _intervalo(mes):
+    inicio = datetime.strptime(mes, '%Y-%m')
+    fim = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, fim
+
+
+def _agregar(usuario_id, mes):
+    """GROUP BY das atividades do mês; usado só na primeira leitura de um mês."""
+    inicio, fim = _intervalo(mes)
+    filtro = (Atividade.usuario_id == usuario_id,
+              Atividade.performed_at >= inicio,
+              Atividade.performed_at < fim)
+    dia = func.date(Atividade.performed_at)
+
+    por_categoria = {
+        categoria: [quantidade, int(minutos)]
+        for categoria, quantidade, minutos in db.session.execute(
+            select(Atividade.category, func.count(), func.sum(Atividade.duration_minutes))
+            .where(*filtro)
+            .group_by(Atividade.category)
+        )
+    }
+    por_dia = {
+        str(d): int(minutos)
+        for d, minutos in db.session.execute(
+            select(dia, func.sum(Atividade.duration_minutes)).where(*filtro).group_by(dia)
+        )
+    }
+    return ResumoAtividadeMes(usuario_id=usuario_id, mes=mes,
+                              por_categoria=por_categoria, por_dia=por_dia)
+
+
+def obter_resumo(usuario_id, mes, hoje=None):
+    """Resumo do mês lido da tabela de resumos.
+
+    O GROUP BY só roda se o mês ainda não tem resumo; meses anteriores ao
+    atual são marcados como fechados e, a partir daí, apenas lidos. Gravar
+    o resumo na leitura é idempotente: se outra transação gravou o mesmo
+    mês antes, vale o dela.
+    """
+    mes_atual = (hoje or datetime.now()).strftime('%Y-%m')
+    resumo = db.session.get(ResumoAtividadeMes, (usuario_id, mes))
+
+    if resumo is None:
+        resumo = _agregar(usuario_id, mes)
+        resumo.fechado = mes < mes_atual
+        db.session.add(resumo)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outra leitura, ou a primeira atividade do mês, gravou o resumo ao mesmo tempo
+            db.session.rollback()
+            resumo = db.session.get(ResumoAtividadeMes, (usuario_id, mes))
+    elif not resumo.fechado and mes < mes_atual:
+        # Mantido incrementalmente até aqui: basta fechar, sem reagregar
+        resumo.fechado = True
+        db.session.commit()
+    return resumo
+
+
+def registrar_atividade(atividade):
+    """Aplica uma nova atividade ao resumo do seu mês.
+
+    Deve ser chamada na mesma transação em que a atividade é gravada. Uma
+    atividade retroativa em mês fechado também é somada ao resumo, que
+    continua sem ser reagregado.
+    """
+    mes = atividade.performed_at.strftime('%Y-%m')
+    resumo = db.session.get(ResumoAtividadeMes, (atividade.usuario_id, mes), with_for_update=True)
+    if resumo is None:
+        # Primeira atividade vista neste mês: o GROUP BY já inclui a nova linha
+        db.session.flush()
+        try:
+            with db.session.begin_nested():
+                db.session.add(_agregar(atividade.usuario_id, mes))
+            return
+        except IntegrityError:
+            # Outra transação gravou o resumo depois da leitura acima; o GROUP BY
+            # dela não via esta atividade, que ainda não estava gravada: soma-se a ele
+            resumo = db.session.get(ResumoAtividadeMes, (atividade.usuario_id, mes), with_for_update=True)
+
+    por_categoria = dict(resumo.por_categoria)
+    quantidade, minutos = por_categoria.get(atividade.category, [0, 0])
+    por_categoria[atividade.category] = [quantidade + 1, minutos + atividade.duration_minutes]
+
+    por_dia = dict(resumo.por_dia)
+    dia = atividade.performed_at.strftime('%Y-%m-%d')
+    por_dia[dia] = por_dia.get(dia, 0) + atividade.duration_minutes
+
+    # Atribuir novos dicts para o SQLAlchemy detectar a mudança na coluna JSON
+    resumo.por_categoria = por_categoria
+    resumo.por_dia = por_dia
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import estatisticas
+from models import db, Medicao, GlicemiaDiaria, GlicemiaMensal, GlicemiaContexto, GlicemiaDiaFaixa
+
+
+# -----------------------
+# ATUALIZAÇÃO INCREMENTAL
+# -----------------------
+def _acumular(modelo, chave, quantidade, soma, minimo, maximo, **somas):
+    """Soma um lote de valores ao agregado identificado por `chave` (upsert).
+
+    `somas` são colunas extras que também acumulam por adição (ex.: soma_quadrados).
+    """
+    valores = dict(chave, quantidade=quantidade, soma=soma, minimo=minimo, maximo=maximo, **somas)
+    tabela = modelo.__table__
+    dialeto = db.session.get_bind().dialect.name
+
+    if dialeto == 'mysql':
+        stmt = mysql_insert(tabela).values(**valores)
+        stmt = stmt.on_duplicate_key_update(
+            quantidade=tabela.c.quantidade + stmt.inserted.quantidade,
+            soma=tabela.c.soma + stmt.inserted.soma,
+            minimo=func.least(tabela.c.minimo, stmt.inserted.minimo),
+            maximo=func.greatest(tabela.c.maximo, stmt.inserted.maximo),
+            **{c: tabela.c[c] + stmt.inserted[c] for c in somas},
+        )
+        db.session.execute(stmt)
+    elif dialeto == 'sqlite':
+        stmt = sqlite_insert(tabela).values(**valores)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c.name for c in tabela.primary_key.columns],
+            set_={
+                'quantidade': tabela.c.quantidade + stmt.excluded.quantidade,
+                'soma': tabela.c.soma + stmt.excluded.soma,
+                'minimo': func.min(tabela.c.minimo, stmt.excluded.minimo),
+                'maximo': func.max(tabela.c.maximo, stmt.excluded.maximo),
+                **{c: tabela.c[c] + stmt.excluded[c] for c in somas},
+            },
+        )
+        db.session.execute(stmt)
+    else:
+        linha = db.session.get(modelo, chave, with_for_update=True)
+        if linha is None:
+            db.session.add(modelo(**valores))
+        else:
+            linha.quantidade += quantidade
+            linha.soma += soma
+            linha.minimo = min(linha.minimo, minimo)
+            linha.maximo = max(linha.maximo, maximo)
+            for coluna, valor in somas.items():
+                setattr(linha, coluna, getattr(linha, coluna) + valor)
+
+
+def _chaves(usuario_id, dia, contexto):
+    """Agregados tocados por uma leitura: (modelo, chave, usa colunas de faixa)."""
+    mes = dia.strftime('%Y-%m')
+    chaves = [
+        (GlicemiaDiaria, {'usuario_id': usuario_id, 'dia': dia}, False),
+        (GlicemiaMensal, {'usuario_id': usuario_id, 'mes': mes}, False),
+        (GlicemiaDiaFaixa, {'usuario_id': usuario_id, 'dia': dia,
+                            'measurement_context': estatisticas.CONTEXTO_GERAL}, True),
+    ]
+    if contexto:
+        chaves.append((GlicemiaContexto, {'usuario_id': usuario_id, 'mes': mes, 'measurement_context': contexto}, False))
+        chaves.append((GlicemiaDiaFaixa, {'usuario_id': usuario_id, 'dia': dia, 'measurement_context': contexto}, True))
+    return chaves
+
+
+def _somas_faixa(valor, contexto):
+    abaixo, dentro, acima = estatisticas.classificar(valor, contexto)
+    return {'soma_quadrados': valor * valor, 'abaixo': abaixo, 'dentro': dentro, 'acima': acima}
+
+
+def registrar_medicao(medicao):
+    """Atualiza os agregados diário, mensal, por contexto e de faixa com uma nova medição.
+
+    Deve ser chamada na mesma transação em que a medição é gravada.
+    """
+    valor = float(medicao.glucose_level)
+    for modelo, chave, faixa in _chaves(medicao.usuario_id, medicao.measured_at.date(), medicao.measurement_context):
+        somas = _somas_faixa(valor, chave.get('measurement_context')) if faixa else {}
+        _acumular(modelo, chave, 1, valor, valor, valor, **somas)
+
+
+def registrar_medicoes(usuario_id, leituras):
+    """Versão em lote de `registrar_medicao` para importações.
+
+    `leituras` é uma sequência de (valor, measured_at, contexto). Os valores
+    são agrupados antes, então cada agregado recebe um único upsert.
+    """
+    grupos = {}
+    for valor, measured_at, contexto in leituras:
+        for modelo, chave, faixa in _chaves(usuario_id, measured_at.date(), contexto):
+            id_grupo = (modelo, tuple(sorted(chave.items())))
+            grupo = grupos.get(id_grupo)
+            if grupo is None:
+                grupo = grupos[id_grupo] = [chave, 0, 0.0, valor, valor, {}]
+            grupo[1] += 1
+            grupo[2] += valor
+            grupo[3] = min(grupo[3], valor)
+            grupo[4] = max(grupo[4], valor)
+            if faixa:
+                for coluna, v in _somas_faixa(valor, chave['measurement_context']).items():
+                    grupo[5][coluna] = grupo[5].get(coluna, 0) + v
+
+    for (modelo, _), (chave, quantidade, soma, minimo, maximo, somas) in grupos.items():
+        _acumular(modelo, chave, quantidade, soma, minimo, maximo, **somas)
+
+
+# -----------------------
+# LEITURA PARA O DASHBOARD
+# -----------------------
+def _media(linhas):
+    quantidade = sum(l.quantidade for l in linhas)
+    return sum(l.soma for l in linhas) / quantidade if quantidade else None
+
+
+def resumo_glicemia(usuario_id, month_key, hoje=None):
+    """Monta os números do dashboard lendo apenas as tabelas de agregados."""
+    hoje = hoje or datetime.now().date()
+    inicio_mes = datetime.strptime(month_key, '%Y-%m').date()
+    fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+
+    meses = GlicemiaMensal.query.filter_by(usuario_id=usuario_id).all()
+    mes_atual = next((m for m in meses if m.mes == month_key), None)
+
+    ultimos_7d = (GlicemiaDiaria.query
+                  .filter(GlicemiaDiaria.usuario_id == usuario_id,
+                          GlicemiaDiaria.dia > hoje - timedelta(days=7))
+                  .all())
+
+    dias_mes = (GlicemiaDiaria.query
+                .filter(GlicemiaDiaria.usuario_id == usuario_id,
+                        GlicemiaDiaria.dia >= inicio_mes,
+                        GlicemiaDiaria.dia < fim_mes)
+                .order_by(GlicemiaDiaria.dia)
+                .all())
+    contextos = GlicemiaContexto.query.filter_by(usuario_id=usuario_id, mes=month_key).all()
+
+    ultima = (db.session.query(Medicao.glucose_level)
+              .filter(Medicao.usuario_id == usuario_id)
+              .order_by(Medicao.measured_at.desc(), Medicao.id.desc())
+              .limit(1)
+              .scalar())
+
+    return {
+        'latest_value': float(ultima) if ultima is not None else None,
+        'count': sum(m.quantidade for m in meses),
+        'avg_7d': _media(ultimos_7d),
+        'min_val': min((m.minimo for m in meses), default=None),
+        'max_val': max((m.maximo for m in meses), default=None),
+        'month_avg': mes_atual.media if mes_atual else None,
+        'month_min': mes_atual.minimo if mes_atual else None,
+        'month_max': mes_atual.maximo if mes_atual else None,
+        'daily_labels': [d.dia.strftime('%Y-%m-%d') for d in dias_mes],
+        'daily_avgs': [round(d.media, 1) for d in dias_mes],
+        'context_avgs': {c.measurement_context: round(c.media, 1) for c in contextos},
+    }
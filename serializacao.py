@@ -0,0 +1,139 @@
+"""Serialização das respostas das APIs de listagem: JSON rápido ou MessagePack.
+
+As rotas leem só as colunas necessárias (sem montar objetos do ORM) e os
+serializadores abaixo transformam cada linha em dict sem converter Decimal
+nem datas: o codificador cuida disso. Com o pacote opcional `orjson` o JSON
+é gerado em C; sem ele, cai no módulo json da biblioteca padrão com a mesma
+saída. Clientes que enviam `Accept: application/msgpack` recebem
+MessagePack (exige o pacote opcional `msgpack`), bem menor em históricos
+longos.
+
+Datas e horas sem fuso são UTC no banco e saem em ISO 8601 com sufixo Z;
+Decimal sai como número.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, request
+
+from models import DIAS_POR_MASCARA, Alerta, Meta, RegistroIMC
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+# Nome ainda usado por várias bibliotecas cliente
+MSGPACK_ALTERNATIVO = 'application/x-msgpack'
+
+
+def _padrao(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat() + ('Z' if valor.tzinfo is None else '')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f'{type(valor).__name__} não é serializável')
+
+
+def dumps_json(dados):
+    """JSON compacto em bytes."""
+    if orjson is not None:
+        return orjson.dumps(dados, default=_padrao, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+    return json.dumps(dados, default=_padrao, separators=(',', ':')).encode()
+
+
+def dumps_msgpack(dados):
+    return msgpack.packb(dados, default=_padrao, datetime=False)
+
+
+def formato_preferido(aceitos=None):
+    """JSON ou MessagePack, conforme o Accept da requisição (JSON na dúvida).
+
+    `aceitos` é um MIMEAccept já lido; por padrão, o da requisição Flask atual.
+    """
+    if msgpack is None:
+        return JSON
+    aceitos = request.accept_mimetypes if aceitos is None else aceitos
+    oferecidos = [JSON, MSGPACK, MSGPACK_ALTERNATIVO]
+    return MSGPACK if aceitos.best_match(oferecidos, JSON) != JSON else JSON
+
+
+def codificar(dados, formato):
+    """Corpo em bytes de `dados` no formato dado (JSON ou MSGPACK)."""
+    return dumps_msgpack(dados) if formato == MSGPACK else dumps_json(dados)
+
+
+def responder(dados, status=200, formato=None):
+    """Response com `dados` no formato negociado (ou em `formato`)."""
+    formato = formato or formato_preferido()
+    resposta = Response(codificar(dados, formato), status=status, mimetype=formato)
+    resposta.vary.add('Accept')
+    return resposta
+
+
+# -----------------------
+# SERIALIZADORES POR MODELO
+# -----------------------
+# Cada COLUNAS_* é o select usado pela rota; o serializador recebe a Row resultante.
+
+COLUNAS_REGISTRO_IMC = (RegistroIMC.id, RegistroIMC.peso_atual, RegistroIMC.altura,
+                        RegistroIMC.imc, RegistroIMC.data_registro)
+
+
+def registro_imc(r):
+    return {
+        'id': r.id,
+        'peso_atual': r.peso_atual,
+        'altura': r.altura,
+        'imc': r.imc,
+        # Formato curto herdado das primeiras versões da API
+        'data_registro': r.data_registro.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+COLUNAS_META = (Meta.id, Meta.peso_desejado, Meta.data_meta)
+
+
+def meta(r):
+    # peso_desejado sempre foi enviado como texto nesta rota
+    return {'id': r.id, 'peso_desejado': str(r.peso_desejado), 'data_meta': r.data_meta}
+
+
+def usuario(r):
+    """Linha de busca_usuarios.COLUNAS_LISTAGEM."""
+    return {
+        'id': r.id,
+        'nome': r.nome,
+        'email': r.email,
+        'login': r.login,
+        'sexo': r.sexo,
+        'ativo': r.ativo,
+        'data_cadastro': r.data_cadastro,
+    }
+
+
+COLUNAS_ALERTA = (Alerta.id, Alerta.alert_type, Alerta.alert_time, Alerta.dias_mask,
+                  Alerta.alert_date, Alerta.proximo_disparo)
+
+
+def alerta(r, rotulos):
+    """`rotulos` traduz alert_type para o texto exibido (ALERT_TYPE_LABELS do app)."""
+    return {
+        'id': r.id,
+        'alert_type': r.alert_type,
+        'alert_type_label': rotulos.get(r.alert_type, r.alert_type),
+        'alert_time': r.alert_time,
+        'days': DIAS_POR_MASCARA[r.dias_mask or 0],
+        'alert_date': r.alert_date,
+        'next_fire': r.proximo_disparo,
+    }
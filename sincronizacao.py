@@ -0,0 +1,156 @@
+"""Envio em lote das leituras guardadas offline pelo service worker.
+
+Sem sinal, o service worker guarda as medições e atividades no IndexedDB
+do aparelho, cada uma com um client_id (UUID) gerado lá, e quando a conexão
+volta manda tudo numa única requisição para /sincronizar. O client_id é
+único por usuário no banco: reenviar um lote (resposta perdida, duas abas
+sincronizando) não duplica nada, os ids já gravados apenas são confirmados.
+"""
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+import escrita_agrupada
+import resumo_atividades
+import rollups
+from importacao import GLICEMIA_MAX, GLICEMIA_MIN
+from ingestao import LoteInvalido
+from models import db, Atividade, Medicao
+
+# Leituras aceitas por requisição (o service worker envia em pedaços deste tamanho)
+MAX_LOTE = 500
+TAMANHO_CLIENT_ID = 36
+
+
+def _ler_data(valor):
+    # Horário local do aparelho, como no formulário; um fuso eventual é descartado
+    return datetime.fromisoformat(valor).replace(tzinfo=None)
+
+
+def _ler_medicao(item, contextos):
+    nivel = float(item['glucose_level'])
+    contexto = item.get('measurement_context')
+    if not GLICEMIA_MIN <= nivel <= GLICEMIA_MAX or contexto not in contextos:
+        raise ValueError(nivel, contexto)
+    return {
+        'measured_at': _ler_data(item['measured_at']),
+        'glucose_level': round(nivel, 1),
+        'measurement_context': contexto,
+        'notes': (item.get('notes') or '').strip() or None,
+    }
+
+
+def _ler_atividade(item, categorias):
+    duracao = int(item['duration_minutes'])
+    if duracao < 1 or item.get('category') not in categorias:
+        raise ValueError(duracao, item.get('category'))
+    return {
+        'performed_at': _ler_data(item['performed_at']),
+        'category': item['category'],
+        'duration_minutes': duracao,
+    }
+
+
+def _gravar_medicoes(usuario_id, linhas):
+    db.session.execute(insert(Medicao), linhas)
+    rollups.registrar_medicoes(usuario_id, [
+        (l['glucose_level'], l['measured_at'], l['measurement_context']) for l in linhas
+    ])
+
+
+def _gravar_atividades(usuario_id, linhas):
+    # Uma a uma: o resumo do mês pode precisar agregar as anteriores do mesmo lote
+    for linha in linhas:
+        atividade = Atividade(**linha)
+        db.session.add(atividade)
+        resumo_atividades.registrar_atividade(atividade)
+
+
+# chave no JSON -> (modelo, leitor de item, gravação das linhas novas)
+TIPOS = {
+    'medicoes': (Medicao, _ler_medicao, _gravar_medicoes),
+    'atividades': (Atividade, _ler_atividade, _gravar_atividades),
+}
+
+
+def ja_registrado(modelo, usuario_id, client_id):
+    """Se o formulário reenviado pelo service worker já foi gravado."""
+    return db.session.execute(
+        select(modelo.id).where(modelo.usuario_id == usuario_id, modelo.client_id == client_id)
+    ).first() is not None
+
+
+def gravar_formulario(app, modelo, usuario_id, client_id, gravacao):
+    """escrita_agrupada.gravar para o POST de um formulário com `client_id` opcional.
+
+    Dois envios do mesmo formulário (o service worker reenviando enquanto o
+    original ainda grava) podem passar juntos por `ja_registrado`; o segundo
+    esbarra no índice único e é tratado como já gravado, como em `registrar`.
+    """
+    try:
+        return escrita_agrupada.gravar(app, gravacao)
+    except IntegrityError:
+        db.session.rollback()
+        if client_id and ja_registrado(modelo, usuario_id, client_id):
+            return True
+        raise
+
+
+def _ler(dados):
+    if not isinstance(dados, dict) or not all(isinstance(dados.get(t, []), list) for t in TIPOS):
+        raise LoteInvalido('Envie um objeto JSON com as listas "medicoes" e/ou "atividades".')
+    if sum(len(dados.get(t, [])) for t in TIPOS) > MAX_LOTE:
+        raise LoteInvalido(f'O lote aceita no máximo {MAX_LOTE} leituras.')
+
+
+def _registrar(usuario_id, dados, permitidos):
+    resultado = {}
+    for tipo, (modelo, ler, gravar) in TIPOS.items():
+        novos, rejeitados = {}, []
+        for item in dados.get(tipo, []):
+            client_id = item.get('client_id') if isinstance(item, dict) else None
+            if not isinstance(client_id, str) or not 0 < len(client_id) <= TAMANHO_CLIENT_ID:
+                rejeitados.append({'client_id': client_id, 'erro': 'client_id ausente ou inválido.'})
+                continue
+            try:
+                valores = ler(item, permitidos[tipo])
+            except (KeyError, TypeError, ValueError):
+                rejeitados.append({'client_id': client_id, 'erro': 'Campos ausentes ou fora da faixa.'})
+                continue
+            novos.setdefault(client_id, dict(valores, usuario_id=usuario_id, client_id=client_id))
+
+        duplicados = set()
+        if novos:
+            duplicados = set(db.session.execute(
+                select(modelo.client_id).where(modelo.usuario_id == usuario_id, modelo.client_id.in_(list(novos)))
+            ).scalars())
+        linhas = [v for c, v in novos.items() if c not in duplicados]
+        if linhas:
+            gravar(usuario_id, linhas)
+        resultado[tipo] = {
+            'aceitos': list(novos),
+            'gravados': len(linhas),
+            'duplicados': len(duplicados),
+            'rejeitados': rejeitados,
+        }
+    return resultado
+
+
+def registrar(usuario_id, dados, contextos, categorias):
+    """Grava o lote numa transação e retorna, por tipo, os client_ids aceitos e os rejeitados.
+
+    `aceitos` inclui os que já estavam gravados: o cliente pode descartá-los.
+    `rejeitados` nunca serão aceitos e também podem ser descartados.
+    """
+    _ler(dados)
+    permitidos = {'medicoes': contextos, 'atividades': categorias}
+    try:
+        resultado = _registrar(usuario_id, dados, permitidos)
+        db.session.commit()
+    except IntegrityError:
+        # Outro envio do mesmo lote gravou parte dele ao mesmo tempo: os ids dele agora são duplicados
+        db.session.rollback()
+        resultado = _registrar(usuario_id, dados, permitidos)
+        db.session.commit()
+    return resultado
@@ -1,15 +1,125 @@
-const CACHE_NAME = 'Imc-Check';
-const ASSETS_TO_CACHE = [
-  '/',
-  '/features',
-  '/static/styles.css',
-  '/static/logoimc.svg',
-];
+// As duas linhas abaixo são preenchidas por `flask --app app ativos-construir`
+// (ver ativos.py) a partir do manifesto dos arquivos versionados.
+const VERSAO = 'dev';
+const PRECACHE = ['/', '/features', '/static/styles.css', '/static/logoimc.svg'];
+
+const CACHE_NAME = `cuidabem-${VERSAO}`;
+
+// -----------------------
+// Fila offline de medições e atividades
+// -----------------------
+// Sem conexão, o POST dos formulários vira um item no IndexedDB com um
+// client_id gerado aqui; quando a conexão volta, todos vão num só POST para
+// /sincronizar, que ignora ids já gravados (reenviar é seguro).
+const FILA_DB = 'cuidabem-offline';
+const FILA_LOJA = 'pendentes';
+const FILA_TAG = 'enviar-pendentes';
+const LOTE_MAXIMO = 500;  // sincronizacao.MAX_LOTE
+
+// caminho do formulário -> [chave no lote, conversão dos campos do formulário]
+const FORMULARIOS = {
+  '/measurements': ['medicoes', (f) => ({
+    measured_at: `${f.get('date')}T${f.get('time')}`,
+    glucose_level: f.get('level'),
+    measurement_context: f.get('measurement_context'),
+    notes: f.get('notes') || '',
+  })],
+  '/activities': ['atividades', (f) => ({
+    performed_at: `${f.get('date')}T${f.get('time')}`,
+    category: f.get('category'),
+    duration_minutes: f.get('duration'),
+  })],
+};
+
+function abrirFila() {
+  return new Promise((resolve, reject) => {
+    const pedido = indexedDB.open(FILA_DB, 1);
+    pedido.onupgradeneeded = () => pedido.result.createObjectStore(FILA_LOJA, { keyPath: 'client_id' });
+    pedido.onsuccess = () => resolve(pedido.result);
+    pedido.onerror = () => reject(pedido.error);
+  });
+}
+
+function naFila(modo, operacao) {
+  return abrirFila().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction(FILA_LOJA, modo);
+    const pedido = operacao(tx.objectStore(FILA_LOJA));
+    tx.oncomplete = () => resolve(pedido && pedido.result);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+async function enviarPendentes() {
+  const pendentes = await naFila('readonly', (loja) => loja.getAll());
+  for (let i = 0; i < pendentes.length; i += LOTE_MAXIMO) {
+    const lote = { medicoes: [], atividades: [] };
+    for (const item of pendentes.slice(i, i + LOTE_MAXIMO)) {
+      lote[item.tipo].push(Object.assign({ client_id: item.client_id }, item.dados));
+    }
+    const res = await fetch('/sincronizar', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(lote),
+      credentials: 'same-origin',
+    });
+    // Sessão expirada ou servidor fora: mantém a fila para a próxima tentativa
+    if (!res.ok) throw new Error(`sincronizar: HTTP ${res.status}`);
+    const resultado = await res.json();
+    // Aceitos (inclusive os que já estavam gravados) e rejeitados saem da fila
+    const concluidos = Object.values(resultado).flatMap((r) => r.aceitos.concat(r.rejeitados.map((x) => x.client_id)));
+    await naFila('readwrite', (loja) => { concluidos.forEach((id) => loja.delete(id)); });
+  }
+}
+
+function agendarEnvio() {
+  if (self.registration.sync) {
+    return self.registration.sync.register(FILA_TAG).catch(() => enviarPendentes());
+  }
+  return enviarPendentes();
+}
+
+function paginaGuardadoOffline(destino) {
+  const html = `<!doctype html><html lang="pt-br"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1"><title>Sem conexão</title></head>
+<body style="font-family:sans-serif;max-width:32rem;margin:2rem auto;padding:0 1rem">
+<h2>Sem conexão</h2>
+<p>O registro foi guardado neste aparelho e será enviado automaticamente quando a conexão voltar.</p>
+<p><a href="${destino}">Voltar</a></p></body></html>`;
+  return new Response(html, { headers: { 'Content-Type': 'text/html; charset=utf-8' } });
+}
+
+async function enviarFormulario(req, tipo, converter) {
+  const form = await req.formData();
+  const clientId = self.crypto.randomUUID();
+  // O mesmo client_id vai no envio direto e na fila: se a resposta se perder, o servidor não duplica
+  form.set('client_id', clientId);
+  try {
+    return await fetch(req.url, {
+      method: 'POST',
+      body: new URLSearchParams(form),
+      credentials: 'same-origin',
+      redirect: 'manual',
+    });
+  } catch (e) {
+    await naFila('readwrite', (loja) => loja.put({ client_id: clientId, tipo, dados: converter(form) }));
+    agendarEnvio().catch(() => {});
+    return paginaGuardadoOffline(new URL(req.url).pathname);
+  }
+}
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === FILA_TAG) event.waitUntil(enviarPendentes());
+});
+
+// Sem Background Sync (ex.: Safari/Firefox), a página avisa quando volta a ficar online
+self.addEventListener('message', (event) => {
+  if (event.data === FILA_TAG) event.waitUntil(enviarPendentes().catch(() => {}));
+});
 
 self.addEventListener('install', (event) => {
   event.waitUntil(
     caches.open(CACHE_NAME)
-      .then((cache) => cache.addAll(ASSETS_TO_CACHE))
+      .then((cache) => cache.addAll(PRECACHE))
       .then(() => self.skipWaiting())
   );
 });
@@ -24,8 +134,32 @@ self.addEventListener('activate', (event) => {
 
 self.addEventListener('fetch', (event) => {
   const req = event.request;
+  const url = new URL(req.url);
+
+  const formulario = FORMULARIOS[url.pathname];
+  if (req.method === 'POST' && req.mode === 'navigate' && formulario) {
+    event.respondWith(enviarFormulario(req, ...formulario));
+    return;
+  }
   if (req.method !== 'GET') return;
 
+  // Alertas (fluxo SSE e JSON com ETag) vão sempre direto para a rede
+  if (url.pathname.startsWith('/alerts/')) return;
+
+  // Arquivos versionados nunca mudam: o que está no cache vale para sempre
+  if (url.pathname.startsWith('/ativos/')) {
+    event.respondWith(
+      caches.match(req).then((cached) => cached || fetch(req).then((res) => {
+        if (res.ok) {
+          const resClone = res.clone();
+          caches.open(CACHE_NAME).then((cache) => cache.put(req, resClone)).catch(() => {});
+        }
+        return res;
+      }))
+    );
+    return;
+  }
+
   // Navegação: tentar rede; se falhar, cair para '/'
   if (req.mode === 'navigate') {
     event.respondWith(
@@ -46,4 +180,4 @@ self.addEventListener('fetch', (event) => {
       return cached || fromNetwork;
     })
   );
-});
\ No newline at end of file
+});
@@ -0,0 +1,190 @@
+"""Tendência de peso por usuário e projeção das metas.
+
+A tendência é uma reta de mínimos quadrados sobre as leituras de IMC dos
+JANELA_DIAS anteriores ao último registro de cada usuário. Os ajustes são
+feitos em lote (vários usuários por consulta, somas agrupadas com NumPy) e
+guardados em tendencias_peso até chegar uma leitura nova, quando a linha
+do usuário é apagada por `invalidar`. Leituras já arquivadas (arquivo.py)
+também contam, tanto para o último registro quanto para a janela.
+"""
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+import arquivo
+from models import db, Meta, RegistroIMC, TendenciaPeso
+
+JANELA_DIAS = 90
+USUARIOS_POR_LOTE = 1000
+# Diferença (kg) a partir da qual a meta ainda não é considerada atingida
+TOLERANCIA_KG = 0.5
+# Abaixo disto (kg/dia) o peso é tratado como estável
+INCLINACAO_MINIMA = 0.001
+# Projeções além disto (dias) não são exibidas como data prevista
+HORIZONTE_MAXIMO_DIAS = 3650
+
+# Colunas lidas do arquivo: a janela do ajuste e o último registro de quem só tem histórico arquivado
+COLUNAS_JANELA = (RegistroIMC.id, RegistroIMC.data_registro, RegistroIMC.peso_atual)
+COLUNAS_ULTIMO = (RegistroIMC.id, RegistroIMC.usuario_id, RegistroIMC.data_registro, RegistroIMC.peso_atual)
+
+
+def ajustar(usuarios, dias, pesos):
+    """Mínimos quadrados de peso ~ dias para cada usuário, numa só passada.
+
+    `dias` é a distância (negativa) até o último registro do usuário, então o
+    intercepto é o peso ajustado na data do último registro. Retorna
+    {usuario_id: (quantidade, inclinacao, intercepto)}; com menos de dois
+    dias distintos a inclinação é None.
+    """
+    import numpy as np
+
+    ids, grupo = np.unique(usuarios, return_inverse=True)
+    n = np.bincount(grupo).astype(float)
+    st = np.bincount(grupo, weights=dias)
+    sy = np.bincount(grupo, weights=pesos)
+    stt = np.bincount(grupo, weights=dias * dias)
+    sty = np.bincount(grupo, weights=dias * pesos)
+
+    denominador = n * stt - st * st
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inclinacao = (n * sty - st * sy) / denominador
+        intercepto = (sy - inclinacao * st) / n
+    degenerado = np.abs(denominador) < 1e-9
+    media = sy / n
+
+    return {
+        int(u): (int(n[i]), None, float(media[i])) if degenerado[i]
+        else (int(n[i]), float(inclinacao[i]), float(intercepto[i]))
+        for i, u in enumerate(ids)
+    }
+
+
+def _ajustar_lote(ultimos):
+    """Ajusta e grava as tendências de um lote de últimos registros (um por usuário)."""
+    import numpy as np
+
+    referencia = {r.usuario_id: r.data_registro for r in ultimos}
+    corte = min(referencia.values()) - timedelta(days=JANELA_DIAS)
+    linhas = db.session.execute(
+        select(RegistroIMC.id, RegistroIMC.usuario_id, RegistroIMC.data_registro, RegistroIMC.peso_atual)
+        .where(RegistroIMC.usuario_id.in_(list(referencia)), RegistroIMC.data_registro >= corte)
+    ).all()
+    vistas = {l.id for l in linhas}
+    linhas = [(l.usuario_id, l.data_registro, l.peso_atual) for l in linhas]
+
+    lista = arquivo.meses('registros_imc')
+    if lista:
+        # Janelas que começam antes do fim do arquivo; ler() pula os meses anteriores a cada uma.
+        # Uma linha pode estar nos dois lugares durante o arquivamento: vale a da tabela quente
+        for usuario_id, data in referencia.items():
+            desde = (data - timedelta(days=JANELA_DIAS), 0)
+            linhas += [(usuario_id, l.data_registro, l.peso_atual)
+                       for l in arquivo.ler('registros_imc', usuario_id, COLUNAS_JANELA, desde, lista)
+                       if l.id not in vistas]
+
+    usuarios = np.array([u for u, _, _ in linhas])
+    dias = np.array([(d - referencia[u]).total_seconds() / 86400 for u, d, _ in linhas])
+    pesos = np.array([float(p) for _, _, p in linhas])
+    # O corte da consulta é o do usuário com registro mais antigo; aqui vale o de cada um
+    na_janela = dias >= -JANELA_DIAS
+    ajustes = ajustar(usuarios[na_janela], dias[na_janela], pesos[na_janela])
+
+    # Só chegam aqui usuários sem tendência gravada: um INSERT em lote basta
+    db.session.execute(insert(TendenciaPeso), [
+        dict(zip(('quantidade', 'inclinacao', 'peso_ajustado'), ajustes[r.usuario_id]),
+             usuario_id=r.usuario_id, ultimo_peso=float(r.peso_atual), ultima_data=r.data_registro)
+        for r in ultimos
+    ])
+
+
+def atualizar(usuario_ids=None):
+    """Calcula as tendências que faltam (de `usuario_ids` ou de todos) e retorna quantas gravou."""
+    if usuario_ids is None:
+        usuario_ids = db.session.execute(
+            select(RegistroIMC.usuario_id).distinct()
+            .where(RegistroIMC.usuario_id.not_in(select(TendenciaPeso.usuario_id)))
+        ).scalars().all()
+    else:
+        existentes = set(db.session.execute(
+            select(TendenciaPeso.usuario_id).where(TendenciaPeso.usuario_id.in_(usuario_ids))
+        ).scalars())
+        usuario_ids = [u for u in usuario_ids if u not in existentes]
+
+    total = 0
+    for i in range(0, len(usuario_ids), USUARIOS_POR_LOTE):
+        lote = usuario_ids[i:i + USUARIOS_POR_LOTE]
+        ultimos = RegistroIMC.ultimos_por_usuario(lote)
+        # Quem não tem leitura na tabela quente pode ter histórico arquivado
+        sem_quentes = set(lote) - {r.usuario_id for r in ultimos}
+        for usuario_id in sorted(sem_quentes):
+            arquivado = arquivo.mais_recente('registros_imc', usuario_id, None, COLUNAS_ULTIMO)
+            if arquivado is not None:
+                ultimos.append(arquivado)
+        # Usuários com últimos registros próximos no mesmo lote mantêm o corte da consulta estreito
+        ultimos.sort(key=lambda r: r.data_registro)
+        if ultimos:
+            _ajustar_lote(ultimos)
+            db.session.commit()
+            total += len(ultimos)
+    return total
+
+
+def invalidar(usuario_ids):
+    """Descarta a tendência em cache de quem recebeu leituras novas (na transação do chamador)."""
+    db.session.execute(delete(TendenciaPeso).where(TendenciaPeso.usuario_id.in_(list(usuario_ids))))
+
+
+def progresso(meta, tendencia):
+    """Situação de uma meta frente à tendência do usuário (ou None se ele não tem registros)."""
+    alvo = float(meta.peso_desejado)
+    resultado = {
+        'id': meta.id,
+        'peso_desejado': alvo,
+        'data_meta': meta.data_meta.strftime('%Y-%m-%d'),
+        'peso_atual': None,
+        'tendencia_kg_semana': None,
+        'data_prevista': None,
+        'no_ritmo': False,
+        'status': 'sem_registros',
+    }
+    if tendencia is None:
+        return resultado
+
+    resultado['peso_atual'] = tendencia.ultimo_peso
+    if tendencia.inclinacao is not None:
+        resultado['tendencia_kg_semana'] = round(tendencia.inclinacao * 7, 2)
+
+    if abs(tendencia.ultimo_peso - alvo) <= TOLERANCIA_KG:
+        resultado.update(status='atingida', no_ritmo=True)
+    elif tendencia.inclinacao is None or tendencia.quantidade < 3:
+        resultado['status'] = 'dados_insuficientes'
+    elif (abs(tendencia.inclinacao) < INCLINACAO_MINIMA
+          or (alvo - tendencia.peso_ajustado) * tendencia.inclinacao <= 0):
+        # Peso estável ou se afastando do alvo: não há data prevista
+        resultado['status'] = 'fora_do_ritmo'
+    elif (alvo - tendencia.peso_ajustado) / tendencia.inclinacao > HORIZONTE_MAXIMO_DIAS:
+        resultado['status'] = 'fora_do_ritmo'
+    else:
+        dias = (alvo - tendencia.peso_ajustado) / tendencia.inclinacao
+        prevista = (tendencia.ultima_data + timedelta(days=dias)).date()
+        no_ritmo = prevista <= meta.data_meta
+        resultado.update(data_prevista=prevista.strftime('%Y-%m-%d'), no_ritmo=no_ritmo,
+                         status='no_ritmo' if no_ritmo else 'atrasada')
+    return resultado
+
+
+def progresso_metas(usuario_id):
+    """Progresso de todas as metas do usuário; ajusta a tendência só se não houver cache."""
+    metas = Meta.query.filter_by(usuario_id=usuario_id).order_by(Meta.data_meta, Meta.id).all()
+    if not metas:
+        return []
+    tendencia = db.session.get(TendenciaPeso, usuario_id)
+    if tendencia is None:
+        try:
+            atualizar([usuario_id])
+        except IntegrityError:
+            # Outra requisição gravou o mesmo ajuste ao mesmo tempo
+            db.session.rollback()
+        tendencia = db.session.get(TendenciaPeso, usuario_id)
+    return [progresso(m, tendencia) for m in metas]
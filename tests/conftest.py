@@ -0,0 +1,43 @@
+"""Fixtures dos testes: app sobre um SQLite temporário, já dentro do contexto de aplicação.
+
+Rodar com `python -m pytest` na raiz (o pytest fica fora de requirements.txt, que é o da implantação).
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from models import db
+    import autenticacao
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'cuidabem.db'}",
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'ARQUIVO_DIR': str(tmp_path / 'arquivo'),
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    autenticacao.invalidar()
+
+
+@pytest.fixture
+def usuarios(app):
+    """Cria os usuários 1, 2 e 3 e devolve seus ids."""
+    from models import db, Usuario
+
+    ids = [1, 2, 3]
+    for i in ids:
+        db.session.add(Usuario(id=i, nome=f'Usuário {i}', email=f'u{i}@teste', login=f'u{i}', senha='x'))
+    db.session.commit()
+    return ids
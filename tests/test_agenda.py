@@ -0,0 +1,76 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+import agenda
+from models import db, Alerta, mascara_de_dias
+
+
+def _utc(local):
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def test_mascara_de_dias():
+    assert mascara_de_dias(['mon']) == 0b1
+    assert mascara_de_dias(['mon', 'wed', 'sun']) == 0b1000101
+    assert mascara_de_dias(['xyz', '']) == 0
+    assert mascara_de_dias([]) == 0
+
+
+def test_proximo_disparo_semanal():
+    alerta = Alerta(alert_type='medicacao', alert_time='08:00', dias_mask=mascara_de_dias(['mon', 'thu']))
+    # Segunda às 09:00 no fuso dos alertas: a próxima é quinta às 08:00
+    apos = _utc(datetime(2025, 3, 3, 9, 0, tzinfo=agenda.FUSO))
+    esperado = _utc(datetime.combine(date(2025, 3, 6), time(8, 0), agenda.FUSO))
+    assert agenda.calcular_proximo_disparo(alerta, apos) == esperado
+    # Estritamente depois: no próprio horário, vale a ocorrência seguinte
+    assert agenda.calcular_proximo_disparo(alerta, esperado) == _utc(
+        datetime.combine(date(2025, 3, 10), time(8, 0), agenda.FUSO))
+
+
+def test_proximo_disparo_por_data():
+    alerta = Alerta(alert_type='consulta', alert_time='14:30', dias_mask=0, alert_date=date(2025, 5, 20))
+    antes = _utc(datetime(2025, 5, 20, 14, 0, tzinfo=agenda.FUSO))
+    assert agenda.calcular_proximo_disparo(alerta, antes) == _utc(datetime(2025, 5, 20, 14, 30, tzinfo=agenda.FUSO))
+    assert agenda.calcular_proximo_disparo(alerta, antes + timedelta(hours=1)) is None
+
+
+def test_sem_dias_nem_data_nao_agenda():
+    alerta = Alerta(alert_type='medicacao', alert_time='08:00', dias_mask=0)
+    assert agenda.calcular_proximo_disparo(alerta, datetime(2025, 1, 1)) is None
+
+
+def test_avancar_vencidos_uma_vez_so(app, usuarios):
+    agora = datetime(2025, 3, 3, 20, 0)
+    alerta = Alerta(usuario_id=1, alert_type='medicacao', alert_time='08:00', dias_mask=127)
+    agenda.reagendar(alerta, agora - timedelta(days=2))
+    db.session.add(alerta)
+    db.session.commit()
+    vencido = alerta.proximo_disparo
+
+    assert [a.id for a, anterior in agenda.avancar_vencidos(agora)] == [alerta.id]
+    db.session.refresh(alerta)
+    assert alerta.proximo_disparo > agora
+    # Outro worker com a leitura antiga não avança de novo
+    alerta_antigo = Alerta(id=alerta.id, alert_time='08:00', dias_mask=127, proximo_disparo=vencido)
+    assert agenda.avancar([alerta_antigo], agora) == []
+
+
+def test_formulario_com_dias_invalidos_mantem_a_data(app):
+    from app import _ler_alerta_form
+
+    dados = {'alert_type': 'medicacao', 'alert_time': '08:00', 'alert_date': '2030-01-02', 'days': ['xyz']}
+    with app.test_request_context('/alerts', method='POST', data=dados):
+        campos, erro = _ler_alerta_form()
+    assert erro is None
+    assert campos['dias_mask'] == 0
+    assert campos['alert_date'] == date(2030, 1, 2)
+
+
+def test_formulario_com_dias_descarta_a_data(app):
+    from app import _ler_alerta_form
+
+    dados = {'alert_type': 'medicacao', 'alert_time': '08:00', 'alert_date': '2030-01-02', 'days': ['mon']}
+    with app.test_request_context('/alerts', method='POST', data=dados):
+        campos, erro = _ler_alerta_form()
+    assert erro is None
+    assert campos['dias_mask'] == mascara_de_dias(['mon'])
+    assert campos['alert_date'] is None
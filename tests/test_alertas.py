@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+import alertas
+import autenticacao
+from models import db, Alerta, Usuario
+
+
+def _logar(app, usuario_id):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = usuario_id
+        sessao['auth'] = autenticacao.impressao(db.session.get(Usuario, usuario_id).senha)
+    return cliente
+
+
+def _salvar(cliente, **campos):
+    dados = {'alert_type': 'medicacao', 'alert_time': '08:00', 'days': ['mon']}
+    dados.update(campos)
+    return cliente.post('/alerts', data=dados)
+
+
+def _mesmo_segundo():
+    # Como no DATETIME do MySQL, que não guarda frações: as edições caem no mesmo instante
+    db.session.execute(update(Alerta).values(atualizado_em=datetime(2025, 3, 1, 8, 0)))
+    db.session.commit()
+
+
+def test_duas_edicoes_no_mesmo_segundo_mudam_o_etag(app, usuarios):
+    cliente = _logar(app, 1)
+    _salvar(cliente, action='create')
+    _mesmo_segundo()
+    alerta_id = db.session.query(Alerta.id).scalar()
+    etag = cliente.get('/alerts/data').headers['ETag']
+
+    _salvar(cliente, action='update', alert_id=alerta_id, alert_time='09:00')
+    _mesmo_segundo()
+    segunda = cliente.get('/alerts/data', headers={'If-None-Match': etag})
+    assert segunda.status_code == 200
+    _salvar(cliente, action='update', alert_id=alerta_id, alert_time='10:00')
+    _mesmo_segundo()
+    terceira = cliente.get('/alerts/data', headers={'If-None-Match': segunda.headers['ETag']})
+    assert terceira.status_code == 200
+    assert terceira.get_json()['alerts'][0]['alert_time'] == '10:00'
+
+
+def test_versao_muda_na_exclusao_e_e_por_usuario(app, usuarios):
+    cliente = _logar(app, 1)
+    _salvar(cliente, action='create')
+    antes, outro = alertas.versao_alertas(1), alertas.versao_alertas(2)
+    cliente.post(f'/alerts/delete/{db.session.query(Alerta.id).scalar()}')
+    assert alertas.versao_alertas(1) != antes
+    assert alertas.versao_alertas(2) == outro
+
+
+def test_avanco_da_agenda_muda_a_versao(app, usuarios):
+    import agenda
+
+    alerta = Alerta(usuario_id=1, alert_type='medicacao', alert_time='08:00', dias_mask=127)
+    db.session.add(alerta)
+    agenda.reagendar(alerta, datetime(2025, 3, 1))
+    db.session.commit()
+    antes = alertas.versao_alertas(1)
+    assert agenda.avancar_vencidos(datetime(2025, 3, 5))
+    assert alertas.versao_alertas(1) != antes
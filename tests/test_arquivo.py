@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import arquivo
+import paginacao
+from models import db, RegistroIMC
+from serializacao import COLUNAS_REGISTRO_IMC
+
+CHAVE = (RegistroIMC.data_registro, RegistroIMC.id)
+INICIO = datetime(2025, 1, 1)
+
+
+def _registro(usuario_id, data, peso=70):
+    registro = RegistroIMC(usuario_id=usuario_id, peso_atual=peso, altura=1.7, data_registro=data)
+    registro.calcular_imc()
+    db.session.add(registro)
+    return registro
+
+
+def _popular():
+    """Usuários 1 e 2 com leituras de jan a abr/2025 (datas repetidas); o 3 tem a de maior id."""
+    for i in range(120):
+        _registro(1 + i % 2, INICIO + timedelta(days=i // 2, hours=i % 2))
+    _registro(1, INICIO + timedelta(days=10))
+    _registro(3, INICIO)
+    db.session.commit()
+
+
+def _historico(usuario_id):
+    stmt = db.select(*COLUNAS_REGISTRO_IMC).where(RegistroIMC.usuario_id == usuario_id).order_by(*CHAVE)
+    quentes = paginacao.iterar_em_fluxo(stmt)
+    return [tuple(l) for l in arquivo.em_ordem('registros_imc', usuario_id, quentes, COLUNAS_REGISTRO_IMC)]
+
+
+@pytest.mark.parametrize('agora, meses_quentes, esperado', [
+    (datetime(2025, 6, 15), 1, datetime(2025, 6, 1)),
+    (datetime(2025, 6, 15), 6, datetime(2025, 1, 1)),
+    (datetime(2025, 2, 1), 3, datetime(2024, 12, 1)),
+])
+def test_corte(agora, meses_quentes, esperado):
+    assert arquivo.corte(agora, meses_quentes) == esperado
+
+
+def test_historico_igual_antes_e_depois_de_arquivar(app, usuarios):
+    _popular()
+    antes = {u: _historico(u) for u in usuarios}
+
+    movidas = arquivo.arquivar('registros_imc', datetime(2025, 3, 1))
+    assert list(movidas) == ['2025-01', '2025-02']
+    assert arquivo.meses('registros_imc') == ['2025-01', '2025-02']
+    assert db.session.query(RegistroIMC).filter(RegistroIMC.data_registro < datetime(2025, 3, 1)).count() == 1
+
+    assert {u: _historico(u) for u in usuarios} == antes
+
+
+def test_pagina_completada_pelo_arquivo(app, usuarios):
+    _popular()
+    esperado = _historico(1)
+    arquivo.arquivar('registros_imc', datetime(2025, 3, 1))
+
+    stmt = db.select(*COLUNAS_REGISTRO_IMC).where(RegistroIMC.usuario_id == 1)
+    vistos, apos = [], None
+    while True:
+        linhas = db.session.execute(paginacao.consulta_keyset(stmt, CHAVE, apos, 7)).all()
+        linhas = arquivo.completar_pagina('registros_imc', 1, linhas, COLUNAS_REGISTRO_IMC, apos, 7)
+        pagina, apos = paginacao.fatiar_pagina(linhas, CHAVE, 7)
+        vistos += [tuple(l) for l in pagina]
+        if apos is None:
+            break
+    assert vistos == esperado
+
+
+def test_linha_nos_dois_lugares_aparece_uma_vez(app, usuarios):
+    _popular()
+    arquivo.arquivar('registros_imc', datetime(2025, 3, 1))
+    data = COLUNAS_REGISTRO_IMC.index(RegistroIMC.data_registro)
+    arquivada = next(l for l in _historico(2) if l[data] < datetime(2025, 2, 1))
+    # Como entre o os.replace do arquivo e o DELETE da tabela quente
+    db.session.add(RegistroIMC(**dict(zip([c.key for c in COLUNAS_REGISTRO_IMC], arquivada)), usuario_id=2))
+    db.session.commit()
+
+    historico = _historico(2)
+    assert historico.count(arquivada) == 1
+
+
+def test_mais_recente_e_datas_arquivadas(app, usuarios):
+    _popular()
+    arquivo.arquivar('registros_imc', datetime(2025, 5, 1))
+    ultimo = RegistroIMC.ultimo_de(2)
+    assert ultimo is None
+
+    arquivado = arquivo.mais_recente('registros_imc', 2, None, COLUNAS_REGISTRO_IMC)
+    assert arquivado.data_registro == INICIO + timedelta(days=59, hours=1)
+
+    datas = [INICIO + timedelta(days=3, hours=1), INICIO + timedelta(days=3, hours=2)]
+    assert arquivo.datas_arquivadas('registros_imc', 2, datas) == {datas[0]}
+
+
+def test_linha_atrasada_regrava_o_mes(app, usuarios):
+    _popular()
+    arquivo.arquivar('registros_imc', datetime(2025, 3, 1))
+    _registro(1, datetime(2025, 1, 15, 12), peso=99)
+    _registro(3, datetime(2025, 5, 1))
+    db.session.commit()
+    antes = _historico(1)
+
+    assert arquivo.arquivar('registros_imc', datetime(2025, 3, 1)) == {'2025-01': 2}
+    assert _historico(1) == antes
+    assert sum(1 for l in antes if l[COLUNAS_REGISTRO_IMC.index(RegistroIMC.peso_atual)] == 99) == 1
+
+
+def test_expurgar_usuario_excluido(app, usuarios):
+    _popular()
+    arquivo.arquivar('registros_imc', datetime(2025, 5, 1))
+    assert _historico(2)
+
+    assert arquivo.expurgar([2]) == 60
+    assert _historico(2) == []
+    assert len(_historico(1)) == 61
+    assert arquivo.expurgar([2]) == 0
+
+
+def test_arquivamento_concorrente_e_recusado(app):
+    with arquivo._trava():
+        with pytest.raises(arquivo.ArquivamentoEmAndamento):
+            arquivo.arquivar_historico(6)
@@ -0,0 +1,38 @@
+import os
+import shutil
+
+import pytest
+
+import ativos
+
+
+@pytest.fixture
+def manifesto(app, tmp_path, monkeypatch):
+    """Build de ativos numa cópia de static/, sem tocar no static/dist/ do repositório."""
+    # Sem o Chart.js: comprimi-lo a cada teste só deixaria a suíte lenta
+    monkeypatch.setattr(ativos, 'ATIVOS', ('styles.css', 'logoimc.svg'))
+    pasta = tmp_path / 'static'
+    for nome in ativos.ATIVOS + (ativos.SERVICE_WORKER,):
+        os.makedirs((pasta / nome).parent, exist_ok=True)
+        shutil.copy(os.path.join(app.static_folder, nome), pasta / nome)
+    app.static_folder = str(pasta)
+    manifesto = ativos.construir(str(pasta))
+    ativos.init_app(app)
+    return manifesto
+
+
+def test_versionado_tem_cache_imutavel(app, manifesto):
+    resposta = app.test_client().get(f"/ativos/{manifesto['styles.css']}", headers={'Accept-Encoding': 'gzip'})
+    assert resposta.status_code == 200
+    assert resposta.content_encoding == 'gzip'
+    assert resposta.cache_control.immutable
+    assert resposta.cache_control.max_age == ativos.MAX_AGE_IMUTAVEL
+
+
+@pytest.mark.parametrize('nome', [ativos.MANIFESTO, ativos.SERVICE_WORKER, 'inexistente.css'])
+def test_sem_hash_nao_e_servido(app, manifesto, nome):
+    assert app.test_client().get(f'/ativos/{nome}').status_code == 404
+
+
+def test_variante_pedida_diretamente_nao_e_servida(app, manifesto):
+    assert app.test_client().get(f"/ativos/{manifesto['styles.css']}.gz").status_code == 404
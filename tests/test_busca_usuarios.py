@@ -0,0 +1,31 @@
+import busca_usuarios
+from models import db, Usuario
+
+
+def _cadastrar(*nomes):
+    for i, nome in enumerate(nomes, start=10):
+        db.session.add(Usuario(id=i, nome=nome, email=f'u{i}@teste', login=f'u{i}', senha='x'))
+    db.session.commit()
+
+
+def _nomes(termo):
+    usuarios, _ = busca_usuarios.pagina_usuarios(termo, 'nome')
+    return [u.nome for u in usuarios]
+
+
+def test_prefixo(app):
+    _cadastrar('Ana', 'Anabela', 'Bruno', 'Élida')
+    assert _nomes('Ana') == ['Ana', 'Anabela']
+    assert _nomes('Él') == ['Élida']
+
+
+def test_curingas_do_termo_sao_literais(app):
+    _cadastrar('50% off', '50 reais', 'a_b', 'axb', 'a/b')
+    assert _nomes('50%') == ['50% off']
+    assert _nomes('a_') == ['a_b']
+    assert _nomes('a/') == ['a/b']
+
+
+def test_ultimo_caractere_unicode(app):
+    _cadastrar('x\U0010ffff', 'y')
+    assert _nomes('x\U0010ffff') == ['x\U0010ffff']
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+import escrita_agrupada
+from models import db, RegistroIMC
+
+
+@pytest.fixture
+def fila(app, monkeypatch):
+    monkeypatch.setattr(escrita_agrupada, 'ESPERA_RESPOSTA', 0.2)
+    fila = escrita_agrupada.FilaDeEscrita(app, lote_max=10, espera_ms=1)
+    app.extensions['escrita_agrupada'] = fila
+    yield fila
+    fila.drenar(5)
+    del app.extensions['escrita_agrupada']
+
+
+def _gravacao(peso, liberar=None, comecou=None):
+    def gravacao():
+        if comecou is not None:
+            comecou.set()
+        if liberar is not None:
+            liberar.wait(5)
+        registro = RegistroIMC(usuario_id=1, peso_atual=peso, altura=1.8)
+        registro.calcular_imc()
+        db.session.add(registro)
+    return gravacao
+
+
+def _pesos():
+    db.session.expire_all()
+    return sorted(float(p) for p in db.session.scalars(db.select(RegistroIMC.peso_atual)))
+
+
+def test_gravacao_na_fila_e_cancelada_e_feita_na_requisicao(app, usuarios, fila):
+    liberar, comecou = threading.Event(), threading.Event()
+    # Prende a thread da fila: a próxima gravação não chega a entrar num lote
+    primeira = fila.enviar(_gravacao(80, liberar, comecou))
+    assert comecou.wait(5)
+
+    assert escrita_agrupada.gravar(app, _gravacao(81)) is True
+    assert _pesos() == [81]
+
+    liberar.set()
+    assert primeira.result(5) is True
+    fila.drenar(5)
+    # A cancelada não é gravada de novo pela fila
+    assert _pesos() == [80, 81]
+
+
+def test_gravacao_ja_no_lote_e_aceita_sem_erro(app, usuarios, fila):
+    liberar = threading.Event()
+
+    assert escrita_agrupada.gravar(app, _gravacao(80, liberar)) is False
+
+    liberar.set()
+    fila.drenar(5)
+    assert _pesos() == [80]
+
+
+def test_rota_responde_202_se_a_gravacao_ainda_esta_no_lote(app, usuarios, fila, monkeypatch):
+    monkeypatch.setattr(escrita_agrupada, 'gravar', lambda app, gravacao: False)
+    resposta = app.test_client().post('/imc', json={'usuario_id': 1, 'peso_atual': 80, 'altura': 1.8})
+    assert resposta.status_code == 202
+    assert resposta.get_json()['imc'] == 24.69
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import importacao
+import ingestao
+from models import db, ImportacaoHistorico, RegistroIMC
+
+
+def _job(tmp_path, linhas):
+    caminho = tmp_path / 'imc.csv'
+    caminho.write_text('data_registro,peso_atual,altura\n' + ''.join(l + '\n' for l in linhas), encoding='utf-8')
+    job = ImportacaoHistorico(usuario_id=1, tipo='imc', arquivo=str(caminho))
+    db.session.add(job)
+    db.session.commit()
+    importacao.processar(job.id)
+    return db.session.get(ImportacaoHistorico, job.id)
+
+
+def test_deslocamento_convertido_para_utc():
+    assert importacao._ler_data('2025-03-01T07:00:00-03:00') == datetime(2025, 3, 1, 10, 0)
+    assert importacao._ler_data('2025-03-01T10:00:00.250Z') == datetime(2025, 3, 1, 10, 0)
+    assert importacao._ler_data('01/03/2025 07:00') == datetime(2025, 3, 1, 7, 0)
+
+
+def test_reimportar_leitura_do_lote_nao_duplica(app, usuarios, tmp_path):
+    ingestao.registrar_lote_imc([
+        {'usuario_id': 1, 'peso_atual': 80, 'altura': 1.8, 'data_registro': '2025-03-01T10:00:00Z'},
+    ])
+
+    job = _job(tmp_path, ['2025-03-01T07:00:00-03:00,80,1.8', '2025-03-02T07:00:00-03:00,79.5,1.8'])
+
+    assert job.status == 'concluida'
+    assert (job.inseridas, job.duplicadas) == (1, 1)
+    datas = db.session.scalars(db.select(RegistroIMC.data_registro).order_by(RegistroIMC.data_registro)).all()
+    assert datas == [datetime(2025, 3, 1, 10, 0), datetime(2025, 3, 2, 10, 0)]
@@ -0,0 +1,25 @@
+import pytest
+
+import ingestao
+from models import db, RegistroIMC
+
+
+def test_csv_latin1_vira_lote_invalido():
+    corpo = 'usuario_id,peso_atual,altura,observação\n1,80,1.8,pós-treino\n'.encode('latin-1')
+    with pytest.raises(ingestao.LoteInvalido):
+        ingestao.ler_lote(corpo, 'text/csv')
+
+
+def test_rota_responde_400_para_csv_latin1(app, usuarios):
+    corpo = 'usuario_id,peso_atual,altura,observação\n1,80,1.8,pós-treino\n'.encode('latin-1')
+    resposta = app.test_client().post('/imc/batch', data=corpo, content_type='text/csv')
+    assert resposta.status_code == 400
+    assert 'UTF-8' in resposta.get_json()['erro']
+    assert db.session.query(RegistroIMC).count() == 0
+
+
+def test_csv_utf8_com_bom(app, usuarios):
+    corpo = '﻿usuario_id,peso_atual,altura\n1,80,1.8\n'.encode('utf-8')
+    resposta = app.test_client().post('/imc/batch', data=corpo, content_type='text/csv')
+    assert resposta.status_code == 201
+    assert resposta.get_json()['inseridos'] == 1
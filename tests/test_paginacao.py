@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import paginacao
+from models import db, RegistroIMC
+
+
+def test_cursor_ida_e_volta():
+    chave = (datetime(2025, 3, 1, 12, 30, 15, 123456), 42)
+    cursor = paginacao.codificar_cursor(*chave)
+    assert '=' not in cursor
+    assert paginacao.decodificar_cursor(cursor, datetime, int) == chave
+
+
+@pytest.mark.parametrize('cursor', ['', 'nao-e-base64!', paginacao.codificar_cursor(1),
+                                    paginacao.codificar_cursor('ontem', 1)])
+def test_cursor_invalido(cursor):
+    with pytest.raises(paginacao.CursorInvalido):
+        paginacao.decodificar_cursor(cursor, datetime, int)
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    (None, paginacao.LIMITE_PADRAO), ('', paginacao.LIMITE_PADRAO), ('abc', paginacao.LIMITE_PADRAO),
+    ('0', 1), ('-5', 1), ('50', 50), ('999999', paginacao.LIMITE_MAXIMO),
+])
+def test_ler_limite(valor, esperado):
+    assert paginacao.ler_limite(valor) == esperado
+
+
+def test_pagina_keyset_percorre_tudo_uma_vez(app, usuarios):
+    inicio = datetime(2025, 1, 1)
+    for i in range(23):
+        # Pares com a mesma data: o desempate pelo id não pode pular nem repetir linhas
+        registro = RegistroIMC(usuario_id=1, peso_atual=70, altura=1.7, data_registro=inicio + timedelta(days=i // 2))
+        registro.calcular_imc()
+        db.session.add(registro)
+    db.session.commit()
+
+    chave = (RegistroIMC.data_registro, RegistroIMC.id)
+    stmt = db.select(RegistroIMC.id, RegistroIMC.data_registro).where(RegistroIMC.usuario_id == 1)
+    vistos, apos = [], None
+    while True:
+        linhas, apos = paginacao.pagina_keyset(stmt, chave, apos, limite=5)
+        assert len(linhas) <= 5
+        vistos += [(l.data_registro, l.id) for l in linhas]
+        if apos is None:
+            break
+        # A chave devolvida passa pelo cursor como o cliente faria
+        apos = paginacao.decodificar_cursor(paginacao.codificar_cursor(*apos), datetime, int)
+
+    assert vistos == sorted(vistos)
+    assert len(vistos) == len(set(vistos)) == 23
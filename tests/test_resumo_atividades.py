@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import resumo_atividades
+from models import db, Atividade, ResumoAtividadeMes
+
+
+def _atividade(categoria, minutos, quando, usuario_id=1):
+    return Atividade(usuario_id=usuario_id, category=categoria, duration_minutes=minutos, performed_at=quando)
+
+
+def _registrar(atividade):
+    db.session.add(atividade)
+    resumo_atividades.registrar_atividade(atividade)
+    db.session.commit()
+
+
+def test_primeira_leitura_agrega_e_fecha_mes_passado(app, usuarios):
+    db.session.add_all([
+        _atividade('caminhada', 30, datetime(2025, 1, 5, 7)),
+        _atividade('caminhada', 20, datetime(2025, 1, 5, 18)),
+        _atividade('natacao', 45, datetime(2025, 1, 9, 7)),
+        _atividade('natacao', 60, datetime(2025, 2, 1, 7)),
+    ])
+    db.session.commit()
+
+    resumo = resumo_atividades.obter_resumo(1, '2025-01', hoje=datetime(2025, 3, 1))
+    assert resumo.por_categoria == {'caminhada': [2, 50], 'natacao': [1, 45]}
+    assert resumo.por_dia == {'2025-01-05': 50, '2025-01-09': 45}
+    assert resumo.fechado
+
+    atual = resumo_atividades.obter_resumo(1, '2025-02', hoje=datetime(2025, 2, 10))
+    assert not atual.fechado
+
+
+def test_registrar_atividade_soma_ao_resumo(app, usuarios):
+    _registrar(_atividade('caminhada', 30, datetime(2025, 1, 5, 7)))
+    _registrar(_atividade('caminhada', 15, datetime(2025, 1, 5, 19)))
+    _registrar(_atividade('pilates', 50, datetime(2025, 1, 6, 8)))
+
+    resumo = db.session.get(ResumoAtividadeMes, (1, '2025-01'))
+    assert resumo.por_categoria == {'caminhada': [2, 45], 'pilates': [1, 50]}
+    assert resumo.por_dia == {'2025-01-05': 45, '2025-01-06': 50}
+
+
+def _get_perde_a_corrida(monkeypatch):
+    """db.session.get devolve None uma vez, como se outra transação ainda não tivesse gravado o resumo."""
+    original = db.session.get
+    chamadas = []
+
+    def get(modelo, chave, **kwargs):
+        chamadas.append(chave)
+        return None if len(chamadas) == 1 else original(modelo, chave, **kwargs)
+
+    monkeypatch.setattr(db.session, 'get', get)
+    return chamadas
+
+
+def test_leitura_concorrente_usa_o_resumo_gravado(app, usuarios, monkeypatch):
+    _registrar(_atividade('caminhada', 30, datetime(2025, 1, 5, 7)))
+    chamadas = _get_perde_a_corrida(monkeypatch)
+
+    resumo = resumo_atividades.obter_resumo(1, '2025-01', hoje=datetime(2025, 1, 20))
+    assert len(chamadas) == 2
+    assert resumo.por_categoria == {'caminhada': [1, 30]}
+
+
+def test_primeira_atividade_concorrente_soma_ao_resumo_gravado(app, usuarios, monkeypatch):
+    # O resumo já existe (outra transação o gravou), mas esta leu antes: o INSERT colide
+    _registrar(_atividade('caminhada', 30, datetime(2025, 1, 5, 7)))
+    _get_perde_a_corrida(monkeypatch)
+
+    _registrar(_atividade('natacao', 40, datetime(2025, 1, 7, 7)))
+    monkeypatch.undo()
+    db.session.expire_all()
+    resumo = db.session.get(ResumoAtividadeMes, (1, '2025-01'))
+    assert resumo.por_categoria == {'caminhada': [1, 30], 'natacao': [1, 40]}
+    assert db.session.query(Atividade).count() == 2
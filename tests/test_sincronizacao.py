@@ -0,0 +1,126 @@
+import pytest
+
+import sincronizacao
+from ingestao import LoteInvalido
+from models import db, Atividade, Medicao
+
+CONTEXTOS = {'em_jejum': 'Em jejum'}
+CATEGORIAS = {'caminhada': 'Caminhada'}
+
+
+def _lote():
+    return {
+        'medicoes': [
+            {'client_id': 'm-1', 'glucose_level': 98, 'measurement_context': 'em_jejum',
+             'measured_at': '2025-03-01T07:00:00'},
+            {'client_id': 'm-2', 'glucose_level': 140, 'measurement_context': 'em_jejum',
+             'measured_at': '2025-03-02T07:00:00'},
+        ],
+        'atividades': [
+            {'client_id': 'a-1', 'category': 'caminhada', 'duration_minutes': 30,
+             'performed_at': '2025-03-01T18:00:00'},
+        ],
+    }
+
+
+def test_reenvio_do_lote_nao_duplica(app, usuarios):
+    primeiro = sincronizacao.registrar(1, _lote(), CONTEXTOS, CATEGORIAS)
+    assert primeiro['medicoes']['gravados'] == 2
+    assert primeiro['atividades']['gravados'] == 1
+
+    segundo = sincronizacao.registrar(1, _lote(), CONTEXTOS, CATEGORIAS)
+    # Os já gravados continuam aceitos: o cliente pode descartá-los da fila
+    assert sorted(segundo['medicoes']['aceitos']) == ['m-1', 'm-2']
+    assert segundo['medicoes']['gravados'] == 0
+    assert segundo['medicoes']['duplicados'] == 2
+    assert segundo['atividades']['duplicados'] == 1
+    assert db.session.query(Medicao).count() == 2
+    assert db.session.query(Atividade).count() == 1
+
+
+def test_client_id_e_por_usuario(app, usuarios):
+    sincronizacao.registrar(1, _lote(), CONTEXTOS, CATEGORIAS)
+    outro = sincronizacao.registrar(2, _lote(), CONTEXTOS, CATEGORIAS)
+    assert outro['medicoes']['gravados'] == 2
+    assert sincronizacao.ja_registrado(Medicao, 2, 'm-1')
+    assert not sincronizacao.ja_registrado(Medicao, 3, 'm-1')
+
+
+def test_repetido_no_proprio_lote_vale_uma_vez(app, usuarios):
+    lote = _lote()
+    lote['medicoes'].append(dict(lote['medicoes'][0], glucose_level=200))
+    resultado = sincronizacao.registrar(1, lote, CONTEXTOS, CATEGORIAS)
+    assert resultado['medicoes']['gravados'] == 2
+    assert db.session.query(Medicao).filter_by(client_id='m-1').one().glucose_level == 98
+
+
+def test_itens_invalidos_sao_rejeitados(app, usuarios):
+    lote = {'medicoes': [
+        {'glucose_level': 98, 'measurement_context': 'em_jejum', 'measured_at': '2025-03-01T07:00:00'},
+        {'client_id': 'x' * (sincronizacao.TAMANHO_CLIENT_ID + 1), 'glucose_level': 98,
+         'measurement_context': 'em_jejum', 'measured_at': '2025-03-01T07:00:00'},
+        {'client_id': 'm-3', 'glucose_level': 5000, 'measurement_context': 'em_jejum',
+         'measured_at': '2025-03-01T07:00:00'},
+        {'client_id': 'm-4', 'glucose_level': 98, 'measurement_context': 'desconhecido',
+         'measured_at': '2025-03-01T07:00:00'},
+    ]}
+    resultado = sincronizacao.registrar(1, lote, CONTEXTOS, CATEGORIAS)
+    assert len(resultado['medicoes']['rejeitados']) == 4
+    assert resultado['medicoes']['gravados'] == 0
+
+
+@pytest.mark.parametrize('dados', [
+    [],
+    {'medicoes': 'não é lista'},
+    {'medicoes': [{}] * (sincronizacao.MAX_LOTE + 1)},
+])
+def test_lote_mal_formado(app, usuarios, dados):
+    with pytest.raises(LoteInvalido):
+        sincronizacao.registrar(1, dados, CONTEXTOS, CATEGORIAS)
+
+
+@pytest.fixture
+def corrida(monkeypatch):
+    """Faz a checagem do formulário não ver o client_id que outro envio gravou ao mesmo tempo."""
+    real = sincronizacao.ja_registrado
+    vistos = set()
+
+    def ja_registrado(modelo, usuario_id, client_id):
+        if modelo not in vistos:
+            vistos.add(modelo)
+            return False
+        return real(modelo, usuario_id, client_id)
+
+    monkeypatch.setattr(sincronizacao, 'ja_registrado', ja_registrado)
+
+
+@pytest.mark.parametrize('agrupada', [False, True])
+def test_formulario_concorrente_com_mesmo_client_id(app, usuarios, corrida, agrupada):
+    import autenticacao
+    import escrita_agrupada
+    from models import Usuario
+
+    sincronizacao.registrar(1, _lote(), CONTEXTOS, CATEGORIAS)
+    if agrupada:
+        app.extensions['escrita_agrupada'] = escrita_agrupada.FilaDeEscrita(app, 10, 1)
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['user_id'] = 1
+        sessao['auth'] = autenticacao.impressao(db.session.get(Usuario, 1).senha)
+
+    try:
+        medicao = cliente.post('/measurements', data={
+            'date': '2025-03-01', 'time': '07:00', 'level': '98', 'measurement_context': 'em_jejum',
+            'client_id': 'm-1'})
+        atividade = cliente.post('/activities', data={
+            'category': 'caminhada', 'duration': '30', 'date': '2025-03-01', 'time': '18:00',
+            'client_id': 'a-1'})
+    finally:
+        if agrupada:
+            app.extensions.pop('escrita_agrupada').drenar(5)
+
+    assert medicao.status_code == atividade.status_code == 302
+    with cliente.session_transaction() as sessao:
+        assert [categoria for categoria, _ in sessao['_flashes']] == ['success', 'success']
+    assert db.session.query(Medicao).count() == 2
+    assert db.session.query(Atividade).count() == 1